@@ -0,0 +1,244 @@
+"""Full-text search: PDF page text extracted by extract_text, and the
+annotation layer's notes, overlays and discussions (SearchEntry)."""
+from html import escape
+from pathlib import Path
+from typing import Optional
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import transaction
+from django.db.models import Count, F, Max, Value, Window
+from django.db.models.functions import RowNumber
+
+from .models import PdfDocument, PdfPageText, SearchEntry
+from .pools import _run_pooled
+from .rendering import _extract_page_texts
+
+# Postgres text search configuration used for both the vectors and queries.
+TEXT_SEARCH_CONFIG = "english"
+TEXT_SEARCH_PAGE_SIZE = 20
+ANNOTATION_SEARCH_PAGE_SIZE = 20
+# Entries linked as ?reply=<id> inside their thread.
+SEARCH_ENTRY_REPLY_KINDS = {SearchEntry.KIND_ANNOTATION_COMMENT, SearchEntry.KIND_PDF_COMMENT_REPLY}
+# Snippets returned per document, best-ranked pages first.
+TEXT_SEARCH_SNIPPETS = 3
+TEXT_HEADLINE_OPTIONS = {"max_words": 30, "min_words": 12, "max_fragments": 2, "fragment_delimiter": " … "}
+# Page text is untrusted, so headlines mark matches with control characters
+# that become <mark> tags only after the text is escaped.
+HIGHLIGHT_START = "\x01"
+HIGHLIGHT_STOP = "\x02"
+
+
+def _highlight(snippet: str) -> str:
+    return (
+        escape(snippet)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_STOP, "</mark>")
+    )
+
+
+def _extract_pdf_text(doc_id: int, path: str, cache_key: str) -> tuple:
+    """Extract one document's pages, in a pool worker. Returns (doc_id, cache_key, pages, error)."""
+    try:
+        return doc_id, cache_key, _extract_page_texts(Path(path)), ""
+    except Exception as exc:
+        return doc_id, cache_key, [], str(exc) or exc.__class__.__name__
+
+
+def _store_pdf_text(doc_id: int, cache_key: str, pages: list) -> None:
+    """Replace a document's page text and mark it extracted from cache_key."""
+    with transaction.atomic():
+        PdfPageText.objects.filter(pdf_id=doc_id).delete()
+        PdfPageText.objects.bulk_create(
+            [
+                PdfPageText(pdf_id=doc_id, page_num=page_num, text=text, source=source)
+                for page_num, text, source in pages
+            ],
+            batch_size=200,
+        )
+        PdfPageText.objects.filter(pdf_id=doc_id).update(
+            search_vector=SearchVector("text", config=TEXT_SEARCH_CONFIG)
+        )
+        PdfDocument.objects.filter(id=doc_id).update(text_key=cache_key)
+
+
+def _pending_pdf_text(paths: Optional[list] = None):
+    """Documents whose text predates their current cache_key."""
+    docs = PdfDocument.objects.exclude(cache_key="").exclude(text_key=F("cache_key"))
+    if paths is not None:
+        docs = docs.filter(path__in=paths)
+    return docs
+
+
+def _collect_pdf_text(jobs: int = 1, paths: Optional[list] = None, report=None) -> tuple[int, int]:
+    """Extract and store page text for every pending document.
+
+    Like document metadata, a file is only read again once its cache_key
+    changes, and a failed extraction is recorded too so it isn't retried
+    every run. report, if given, is called with (filename, pages, error)
+    per document. Returns (documents, pages).
+    """
+    pending = (
+        _pending_pdf_text(paths)
+        .order_by("id")
+        .values_list("id", "path", "cache_key", "filename")
+        .iterator(chunk_size=2000)
+    )
+    names = {}
+    documents = 0
+    stored = 0
+
+    def collect(result) -> None:
+        nonlocal documents, stored
+        doc_id, cache_key, pages, error = result
+        _store_pdf_text(doc_id, cache_key, pages)
+        documents += 1
+        stored += len(pages)
+        if report is not None:
+            report(names.pop(doc_id), len(pages), error)
+
+    def items():
+        for doc_id, path, cache_key, filename in pending:
+            names[doc_id] = filename
+            yield doc_id, path, cache_key
+
+    _run_pooled(_extract_pdf_text, items(), jobs, collect)
+    return documents, stored
+
+
+def _search_pdf_text(query: str, page_num: int = 1) -> tuple[list[dict], int]:
+    """One page of documents whose text matches a web-style query.
+
+    Documents are ordered by their best page's rank. Each comes with its
+    number of matching pages and up to TEXT_SEARCH_SNIPPETS highlighted
+    snippets (HTML, matches in <mark>); headlines are only computed for
+    the pages returned.
+    Returns (results, total matching documents).
+    """
+    search = SearchQuery(query, config=TEXT_SEARCH_CONFIG, search_type="websearch")
+    matches = PdfPageText.objects.filter(search_vector=search)
+    rank = SearchRank(F("search_vector"), search)
+    total = matches.values("pdf_id").distinct().count()
+    start = (page_num - 1) * TEXT_SEARCH_PAGE_SIZE
+    ranked = list(
+        matches.values("pdf_id")
+        .annotate(
+            rank=Max(rank),
+            matching_pages=Count("id"),
+        )
+        .order_by("-rank", "pdf_id")[start:start + TEXT_SEARCH_PAGE_SIZE]
+    )
+    doc_ids = [row["pdf_id"] for row in ranked]
+    filenames = dict(PdfDocument.objects.filter(id__in=doc_ids).values_list("id", "filename"))
+    # Pick each document's best pages first; headlines are slow, so they're
+    # only computed for those rows.
+    best_pages = (
+        matches.filter(pdf_id__in=doc_ids)
+        .annotate(
+            position=Window(
+                RowNumber(), partition_by=[F("pdf_id")], order_by=[rank.desc(), F("page_num").asc()]
+            )
+        )
+        .filter(position__lte=TEXT_SEARCH_SNIPPETS)
+        .values_list("id", flat=True)
+    )
+    pages = (
+        PdfPageText.objects.filter(id__in=list(best_pages))
+        .annotate(
+            rank=rank,
+            snippet=SearchHeadline(
+                "text",
+                search,
+                config=TEXT_SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                **TEXT_HEADLINE_OPTIONS,
+            ),
+        )
+        .order_by("pdf_id", "-rank", "page_num")
+        .values_list("pdf_id", "page_num", "snippet")
+    )
+    snippets = {doc_id: [] for doc_id in doc_ids}
+    for doc_id, page, snippet in pages:
+        snippets[doc_id].append({"page": page, "snippet": _highlight(snippet)})
+    results = [
+        {
+            "filename": filenames[row["pdf_id"]],
+            "matching_pages": row["matching_pages"],
+            "pages": snippets[row["pdf_id"]],
+        }
+        for row in ranked
+        if row["pdf_id"] in filenames
+    ]
+    return results, total
+
+
+def _search_entry_fields(kind: str, instance) -> dict:
+    """SearchEntry columns for a saved annotation, overlay, comment or reply."""
+    if kind in (SearchEntry.KIND_PDF_COMMENT, SearchEntry.KIND_PDF_COMMENT_REPLY):
+        thread = instance if kind == SearchEntry.KIND_PDF_COMMENT else instance.comment
+        pdf_key = thread.pdf.filename
+    else:
+        thread = instance if kind == SearchEntry.KIND_ANNOTATION else instance.annotation
+        pdf_key = thread.pdf_key
+    if kind == SearchEntry.KIND_ANNOTATION:
+        body = instance.note
+    elif kind == SearchEntry.KIND_TEXT_ITEM:
+        body = instance.text
+    else:
+        body = instance.body
+    # Overlays have no author or timestamp of their own; use their annotation's.
+    author = thread if kind == SearchEntry.KIND_TEXT_ITEM else instance
+    return {
+        "pdf_key": pdf_key,
+        "target_hash": thread.hash,
+        "reply_id": instance.id if kind in SEARCH_ENTRY_REPLY_KINDS else None,
+        "user_id": author.user_id,
+        "body": body,
+        "created_at": author.created_at,
+    }
+
+
+def _index_search_entry(kind: str, instance) -> None:
+    """Upsert the SearchEntry for instance, or drop it once its text is blank."""
+    fields = _search_entry_fields(kind, instance)
+    if not fields["body"].strip():
+        _drop_search_entry(kind, instance.id)
+        return
+    fields["search_vector"] = SearchVector(Value(fields["body"]), config=TEXT_SEARCH_CONFIG)
+    SearchEntry.objects.update_or_create(kind=kind, object_id=instance.id, defaults=fields)
+
+
+def _drop_search_entry(kind: str, object_id: int) -> None:
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def _search_entries(query: str, page_num: int = 1, pdf_key: str = "") -> tuple[list[SearchEntry], int]:
+    """One page of SearchEntry rows matching a web-style query, best first.
+
+    Each row carries a highlighted `snippet` (HTML, matches in <mark>).
+    pdf_key limits the search to one document. Returns (entries, total).
+    """
+    search = SearchQuery(query, config=TEXT_SEARCH_CONFIG, search_type="websearch")
+    matches = SearchEntry.objects.filter(search_vector=search)
+    if pdf_key:
+        matches = matches.filter(pdf_key=pdf_key)
+    total = matches.count()
+    start = (page_num - 1) * ANNOTATION_SEARCH_PAGE_SIZE
+    entries = list(
+        matches.select_related("user")
+        .annotate(
+            rank=SearchRank(F("search_vector"), search),
+            snippet=SearchHeadline(
+                "body",
+                search,
+                config=TEXT_SEARCH_CONFIG,
+                start_sel=HIGHLIGHT_START,
+                stop_sel=HIGHLIGHT_STOP,
+                **TEXT_HEADLINE_OPTIONS,
+            ),
+        )
+        .order_by("-rank", "-created_at", "id")[start:start + ANNOTATION_SEARCH_PAGE_SIZE]
+    )
+    for entry in entries:
+        entry.snippet = _highlight(entry.snippet)
+    return entries, total
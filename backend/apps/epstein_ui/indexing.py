@@ -0,0 +1,638 @@
+"""Incremental sync of the PdfDocument table with the PDFs under DATA_DIR, and its counters."""
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import re
+import select
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F, Q
+from django.db.utils import OperationalError, ProgrammingError
+from django.utils import timezone
+
+from .models import (
+    Annotation,
+    AnnotationComment,
+    PdfComment,
+    PdfDirectory,
+    PdfDocument,
+    PdfVote,
+    SiteStats,
+)
+from .pools import _run_pooled
+from .rendering import (
+    _compute_cache_key,
+    _content_hash,
+    _content_hashing_enabled,
+    _file_identity,
+    _pdf_document_info,
+)
+
+DATA_DIR = Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parents[3] / "data"))
+PDF_IDENTITY_FIELDS = ["file_size", "file_mtime", "file_inode", "content_hash", "cache_key"]
+PDF_METADATA_FIELDS = ["page_count", "producer", "has_text", "metadata_key"]
+# Rows written per bulk statement, and directories buffered between walkers and the DB.
+INDEX_BATCH_SIZE = 1000
+INDEX_QUEUE_SIZE = 256
+INDEX_WALK_WORKERS = int(os.environ.get("PDF_INDEX_WALK_WORKERS", "8"))
+# Documents per counter UPDATE; keeps each statement's row locks short.
+COUNTER_CHUNK_SIZE = 10000
+# `index_pdfs --watch`: rescan interval when polling, and longest a burst of events is held back.
+INDEX_POLL_INTERVAL = float(os.environ.get("PDF_INDEX_POLL_INTERVAL", "30"))
+INDEX_MAX_DEBOUNCE = 30.0
+
+# inotify(7) event bits, from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def _search_name(name: str) -> str:
+    """Normalize a filename or query for search: "DOJ-OGR_0003.pdf" -> "doj ogr 0003".
+
+    Migration 0019 backfills the column with the same rules in SQL.
+    """
+    name = re.sub(r"\.pdf$", "", name, flags=re.IGNORECASE).lower()
+    return re.sub(r"[^a-z0-9]+", " ", name).strip()[:255]
+
+
+def _pdf_identity_fields(pdf_path: Path, stat: Optional[os.stat_result] = None) -> dict:
+    """File identity plus the render cache key derived from it."""
+    fields = _file_identity(pdf_path, stat)
+    fields["content_hash"] = _content_hash(pdf_path) if _content_hashing_enabled() else ""
+    fields["cache_key"] = _compute_cache_key(fields, fields["content_hash"])
+    return fields
+
+
+def _identity_changed(pdf_doc: PdfDocument, identity: dict) -> bool:
+    if not pdf_doc.cache_key:
+        return True
+    if _content_hashing_enabled() and not pdf_doc.content_hash:
+        return True
+    return any(getattr(pdf_doc, field) != value for field, value in identity.items())
+
+
+def _iter_pdfs_on_disk(root: Path = DATA_DIR):
+    """Yield every PDF path under root using scandir (no per-file stat)."""
+    stack = [str(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".pdf") and entry.is_file():
+                        yield Path(entry.path)
+        except OSError:
+            continue
+
+
+def _list_pdfs_on_disk() -> list[Path]:
+    """Return all PDF paths under the shared data directory."""
+    if not DATA_DIR.exists():
+        return []
+    return list(_iter_pdfs_on_disk())
+
+
+def _scan_directory(directory: str, journal: dict, full: bool):
+    """List one directory: (subdirectories, record for the indexer).
+
+    The record is (directory, mtime_ns, files), where files is None when the
+    directory's mtime matches the journal. A directory's mtime changes when
+    entries are added, removed or renamed in it, so only changed directories
+    pay for a stat per PDF.
+    """
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        changed = full or journal.get(directory) != mtime_ns
+        subdirs = []
+        files = [] if changed else None
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif changed and entry.name.endswith(".pdf"):
+                    try:
+                        if entry.is_file():
+                            files.append((entry.path, entry.stat()))
+                    except OSError:
+                        continue
+    except OSError:
+        return [], None
+    return subdirs, (directory, mtime_ns, files)
+
+
+def _walk_subtree(root: str, journal: dict, records: queue.Queue, full: bool) -> None:
+    """Queue a record per directory under root, then None once the walk is done."""
+    try:
+        stack = [root]
+        while stack:
+            subdirs, record = _scan_directory(stack.pop(), journal, full)
+            stack.extend(subdirs)
+            if record is not None:
+                records.put(record)
+    finally:
+        records.put(None)
+
+
+def _insert_new_documents(docs: list) -> int:
+    """Insert documents, skipping paths another indexer got to first.
+
+    Like bulk_create(ignore_conflicts=True), but returns how many rows were
+    actually inserted, which bulk_create can't tell.
+    """
+    fields = [field for field in PdfDocument._meta.concrete_fields if not field.primary_key]
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    row = f"({', '.join(['%s'] * len(fields))})"
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(docs), INDEX_BATCH_SIZE):
+            batch = docs[start:start + INDEX_BATCH_SIZE]
+            params = [
+                field.get_db_prep_save(field.pre_save(doc, True), connection)
+                for doc in batch
+                for field in fields
+            ]
+            cursor.execute(
+                f"INSERT INTO {connection.ops.quote_name(PdfDocument._meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([row] * len(batch))} ON CONFLICT DO NOTHING RETURNING id",
+                params,
+            )
+            inserted += len(cursor.fetchall())
+    return inserted
+
+
+class _IndexWriter:
+    """Applies per-directory diffs to the DB in bounded batches.
+
+    Journal rows are only written after the document changes they cover,
+    so an interrupted run re-scans any directory it didn't finish.
+    """
+
+    def __init__(self, track_paths: bool = False):
+        # Paths of created or re-keyed documents, for callers that pre-render them.
+        self.changed_paths = [] if track_paths else None
+        self.to_create = []
+        self.to_update = []
+        self.to_delete = []
+        self.journal = {}
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+
+    def apply(self, directory: str, mtime_ns: int, files: list) -> None:
+        existing = {
+            doc.path: doc
+            for doc in PdfDocument.objects.filter(directory=directory).only(
+                "id", "path", *PDF_IDENTITY_FIELDS
+            )
+        }
+        for path_str, stat in files:
+            path = Path(path_str)
+            doc = existing.pop(path_str, None)
+            try:
+                if doc is None:
+                    self.to_create.append(PdfDocument(
+                        path=path_str,
+                        filename=path.name,
+                        search_name=_search_name(path.name),
+                        directory=directory,
+                        **_pdf_identity_fields(path, stat),
+                    ))
+                elif _identity_changed(doc, _file_identity(path, stat)):
+                    for field, value in _pdf_identity_fields(path, stat).items():
+                        setattr(doc, field, value)
+                    # New cache key, so none of its pages are rendered yet.
+                    doc.rendered = False
+                    self.to_update.append(doc)
+                else:
+                    continue
+            except OSError:
+                continue
+            if self.changed_paths is not None:
+                self.changed_paths.append(path_str)
+        self.to_delete.extend(doc.id for doc in existing.values())
+        self.journal[directory] = PdfDirectory(path=directory, mtime_ns=mtime_ns)
+        if max(len(self.to_create), len(self.to_update), len(self.to_delete)) >= INDEX_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.to_create:
+            # A concurrent sync may have indexed some of these already; only
+            # the rows inserted here count towards the start page total.
+            inserted = _insert_new_documents(self.to_create)
+            self.created += inserted
+            _bump_site_stats(total_pdfs=inserted)
+            self.to_create = []
+        if self.to_update:
+            PdfDocument.objects.bulk_update(
+                self.to_update, PDF_IDENTITY_FIELDS + ["rendered"], batch_size=INDEX_BATCH_SIZE
+            )
+            self.updated += len(self.to_update)
+            self.to_update = []
+        for start in range(0, len(self.to_delete), INDEX_BATCH_SIZE):
+            batch = self.to_delete[start:start + INDEX_BATCH_SIZE]
+            self.deleted += PdfDocument.objects.filter(id__in=batch).delete()[1].get(
+                PdfDocument._meta.label, 0
+            )
+        self.to_delete = []
+        if self.journal:
+            PdfDirectory.objects.bulk_create(
+                list(self.journal.values()),
+                batch_size=INDEX_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=["path"],
+                update_fields=["mtime_ns"],
+            )
+            self.journal = {}
+
+    def forget_directories(self, directories: list[str]) -> None:
+        """Drop vanished directories and every document indexed under them."""
+        for start in range(0, len(directories), INDEX_BATCH_SIZE):
+            batch = directories[start:start + INDEX_BATCH_SIZE]
+            self.deleted += PdfDocument.objects.filter(directory__in=batch).delete()[1].get(
+                PdfDocument._meta.label, 0
+            )
+            PdfDirectory.objects.filter(path__in=batch).delete()
+
+    def forget_tree(self, directory: str) -> None:
+        """Drop a removed directory, its subdirectories and their documents."""
+        prefix = directory.rstrip(os.sep) + os.sep
+        self.deleted += PdfDocument.objects.filter(
+            Q(directory=directory) | Q(directory__startswith=prefix)
+        ).delete()[1].get(PdfDocument._meta.label, 0)
+        PdfDirectory.objects.filter(Q(path=directory) | Q(path__startswith=prefix)).delete()
+
+    def summary(self, started: float, **counts) -> dict:
+        summary = dict(counts, created=self.created, updated=self.updated, deleted=self.deleted)
+        summary["seconds"] = round(time.monotonic() - started, 2)
+        if self.changed_paths is not None:
+            summary["paths"] = self.changed_paths
+        return summary
+
+
+def _sync_pdf_index(
+    full: bool = False, workers: int = INDEX_WALK_WORKERS, track_paths: bool = False
+) -> dict:
+    """Sync the PdfDocument table with PDFs on disk and return a summary.
+
+    Top-level directories are walked in parallel threads that only touch
+    the filesystem. The calling thread consumes their per-directory records
+    from a bounded queue and owns all DB work. Directories whose mtime
+    matches the PdfDirectory journal are listed but their files are neither
+    stat'ed nor diffed. Pass full=True to re-check every file, which also
+    catches files rewritten in place, and to drop documents from outside
+    the walked tree. With track_paths, the summary lists the paths of
+    created and re-keyed documents under "paths".
+    """
+    started = time.monotonic()
+    counts = {"directories": 0, "changed": 0}
+    writer = _IndexWriter(track_paths)
+    try:
+        journal = dict(PdfDirectory.objects.values_list("path", "mtime_ns"))
+    except (OperationalError, ProgrammingError):
+        return writer.summary(started, **counts)
+    # With no journal yet, documents may predate it; clean up like a full run.
+    full = full or not journal
+
+    records: queue.Queue = queue.Queue(maxsize=INDEX_QUEUE_SIZE)
+    seen = set()
+
+    def consume(record) -> None:
+        directory, mtime_ns, files = record
+        seen.add(directory)
+        counts["directories"] += 1
+        if files is not None:
+            counts["changed"] += 1
+            writer.apply(directory, mtime_ns, files)
+
+    if DATA_DIR.is_dir():
+        subdirs, root_record = _scan_directory(str(DATA_DIR), journal, full)
+        if root_record is not None:
+            consume(root_record)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [
+                pool.submit(_walk_subtree, subdir, journal, records, full) for subdir in subdirs
+            ]
+            # Keep draining after a DB error so walkers blocked on a full queue can finish.
+            running = len(futures)
+            failure = None
+            while running:
+                record = records.get()
+                if record is None:
+                    running -= 1
+                elif failure is None:
+                    try:
+                        consume(record)
+                    except Exception as exc:
+                        failure = exc
+            if failure is not None:
+                raise failure
+            for future in futures:
+                future.result()
+    writer.flush()
+
+    writer.forget_directories([path for path in journal if path not in seen])
+    if full:
+        orphaned = [
+            directory
+            for directory in PdfDocument.objects.values_list("directory", flat=True).distinct()
+            if directory not in seen
+        ]
+        writer.forget_directories(orphaned)
+    return writer.summary(started, **counts)
+
+
+def _sync_pdf_directories(directories) -> dict:
+    """Re-index just the given directories, e.g. after filesystem events.
+
+    Each directory is re-checked file by file regardless of its journal
+    row, so in-place rewrites are caught too. Subdirectories missing from
+    the journal are new and are indexed with it; known ones are left to
+    their own events. Directories that no longer exist are dropped along
+    with everything indexed under them.
+    """
+    started = time.monotonic()
+    counts = {"directories": 0, "changed": 0}
+    writer = _IndexWriter(track_paths=True)
+    journal = dict(PdfDirectory.objects.values_list("path", "mtime_ns"))
+    seen = set()
+    for directory in sorted(directories):
+        if not os.path.isdir(directory):
+            writer.forget_tree(directory)
+            continue
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            subdirs, record = _scan_directory(current, journal, full=True)
+            stack.extend(subdir for subdir in subdirs if subdir not in journal)
+            if record is not None:
+                counts["directories"] += 1
+                counts["changed"] += 1
+                writer.apply(*record)
+    writer.flush()
+    return writer.summary(started, **counts)
+
+
+def _read_pdf_metadata(doc_id: int, path: str, cache_key: str) -> tuple:
+    """Read one document's metadata, in a pool worker. Returns (doc_id, cache_key, info)."""
+    try:
+        info = _pdf_document_info(Path(path))
+    except OSError:
+        info = None
+    return doc_id, cache_key, info or {}
+
+
+def _collect_pdf_metadata(jobs: int = 1, paths: Optional[list] = None) -> int:
+    """Fill page_count, producer and has_text where they predate the file's cache_key.
+
+    Each file is read once; the key it was read under is stored as
+    metadata_key, even when pdfinfo fails, so broken files aren't retried
+    until they change. With jobs > 1 the reads run in spawned processes.
+    Returns the number of documents updated.
+    """
+    docs = PdfDocument.objects.exclude(cache_key="").exclude(metadata_key=F("cache_key"))
+    if paths is not None:
+        docs = docs.filter(path__in=paths)
+    pending = docs.values_list("id", "path", "cache_key").iterator(chunk_size=2000)
+    to_update = []
+    updated = 0
+
+    def collect(result) -> None:
+        nonlocal to_update, updated
+        doc_id, cache_key, info = result
+        to_update.append(PdfDocument(
+            id=doc_id,
+            page_count=info.get("page_count"),
+            producer=info.get("producer", ""),
+            has_text=info.get("has_text"),
+            metadata_key=cache_key,
+        ))
+        if len(to_update) >= INDEX_BATCH_SIZE:
+            PdfDocument.objects.bulk_update(to_update, PDF_METADATA_FIELDS)
+            updated += len(to_update)
+            to_update = []
+
+    _run_pooled(_read_pdf_metadata, pending, jobs, collect)
+    if to_update:
+        PdfDocument.objects.bulk_update(to_update, PDF_METADATA_FIELDS)
+        updated += len(to_update)
+    return updated
+
+
+# Recomputes annotation_count, comment_count and the vote tallies for one id range of documents,
+# with the same definitions as signals.py and votes.py. Each aggregate is limited to the
+# range, through the pdf_key, filename and pdf_id indexes.
+_COUNTER_TOTALS_SQL = """
+WITH chunk AS (
+    SELECT id, filename FROM {document} WHERE id >= %(low)s AND id < %(high)s
+), annotations AS (
+    SELECT pdf_key AS filename, COUNT(*) AS total FROM {annotation}
+    WHERE pdf_key IN (SELECT filename FROM chunk)
+    GROUP BY pdf_key
+), comments AS (
+    SELECT doc.filename, COUNT(*) AS total
+    FROM {comment} AS comment JOIN {document} AS doc ON doc.id = comment.pdf_id
+    WHERE doc.filename IN (SELECT filename FROM chunk)
+    GROUP BY doc.filename
+), pdf_comments AS (
+    SELECT pdf_id, COUNT(*) AS total FROM {comment}
+    WHERE pdf_id >= %(low)s AND pdf_id < %(high)s
+    GROUP BY pdf_id
+), votes AS (
+    SELECT pdf_id,
+        COUNT(*) FILTER (WHERE value = 1) AS up,
+        COUNT(*) FILTER (WHERE value = -1) AS down,
+        SUM(value) AS score
+    FROM {vote}
+    WHERE pdf_id >= %(low)s AND pdf_id < %(high)s
+    GROUP BY pdf_id
+), totals AS (
+    SELECT chunk.id,
+        COALESCE(annotations.total, 0) + COALESCE(comments.total, 0) AS annotation_count,
+        COALESCE(pdf_comments.total, 0) AS comment_count,
+        COALESCE(votes.up, 0) AS upvotes,
+        COALESCE(votes.down, 0) AS downvotes,
+        COALESCE(votes.score, 0) AS vote_score
+    FROM chunk
+    LEFT JOIN annotations ON annotations.filename = chunk.filename
+    LEFT JOIN comments ON comments.filename = chunk.filename
+    LEFT JOIN pdf_comments ON pdf_comments.pdf_id = chunk.id
+    LEFT JOIN votes ON votes.pdf_id = chunk.id
+)
+"""
+_COUNTER_DRIFT = """
+    doc.id = totals.id
+    AND (
+        doc.annotation_count <> totals.annotation_count
+        OR doc.comment_count <> totals.comment_count
+        OR doc.upvotes <> totals.upvotes
+        OR doc.downvotes <> totals.downvotes
+        OR doc.vote_score <> totals.vote_score
+    )
+"""
+_COUNTER_UPDATE_SQL = _COUNTER_TOTALS_SQL + """
+UPDATE {document} AS doc
+SET annotation_count = totals.annotation_count,
+    comment_count = totals.comment_count,
+    upvotes = totals.upvotes,
+    downvotes = totals.downvotes,
+    vote_score = totals.vote_score
+FROM totals WHERE""" + _COUNTER_DRIFT
+_COUNTER_DRIFT_SQL = _COUNTER_TOTALS_SQL + """
+SELECT COUNT(*) FROM {document} AS doc JOIN totals ON""" + _COUNTER_DRIFT
+
+
+def _refresh_pdf_counters(dry_run: bool = False, chunk_size: int = COUNTER_CHUNK_SIZE) -> int:
+    """Recompute per-document counters in set-based statements, one per id range.
+
+    Only rows whose stored values drifted are written. With dry_run, they
+    are counted instead. Returns the number of drifted rows.
+    """
+    tables = {
+        "document": PdfDocument._meta.db_table,
+        "annotation": Annotation._meta.db_table,
+        "comment": PdfComment._meta.db_table,
+        "vote": PdfVote._meta.db_table,
+    }
+    sql = (_COUNTER_DRIFT_SQL if dry_run else _COUNTER_UPDATE_SQL).format(
+        **{name: connection.ops.quote_name(table) for name, table in tables.items()}
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(id), MAX(id) FROM {connection.ops.quote_name(tables['document'])}")
+        low, high = cursor.fetchone()
+        drifted = 0
+        if low is None:
+            return drifted
+        for start in range(low, high + 1, chunk_size):
+            cursor.execute(sql, {"low": start, "high": start + chunk_size})
+            drifted += cursor.fetchone()[0] if dry_run else cursor.rowcount
+    return drifted
+
+
+def _bump_site_stats(**deltas) -> None:
+    """Add deltas to SiteStats counters; a no-op until the row exists."""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        SiteStats.objects.filter(id=SiteStats.ROW_ID).update(**changes)
+
+
+def _refresh_site_stats() -> SiteStats:
+    """Recount every SiteStats total and save the row."""
+    stats = SiteStats(
+        id=SiteStats.ROW_ID,
+        total_pdfs=PdfDocument.objects.count(),
+        annotated_pdfs=PdfDocument.objects.filter(annotation_count__gt=0).count(),
+        total_annotations=Annotation.objects.count(),
+        total_users=get_user_model().objects.count(),
+        total_comments=PdfComment.objects.count() + AnnotationComment.objects.count(),
+        refreshed_at=timezone.now(),
+    )
+    stats.save()
+    return stats
+
+
+class _InotifyWatcher:
+    """Recursive inotify(7) watch over a directory tree, through libc via ctypes.
+
+    Raises OSError where inotify is missing (non-Linux) or when the tree
+    needs more than fs.inotify.max_user_watches. Changes made by other
+    hosts on a network mount are never reported; poll those instead.
+    """
+
+    def __init__(self, root: Path):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise self._last_error()
+        self._paths = {}
+        try:
+            self.watch_tree(str(root))
+        except OSError:
+            self.close()
+            raise
+
+    @staticmethod
+    def _last_error() -> OSError:
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code))
+
+    def watch_tree(self, root: str) -> None:
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), INOTIFY_MASK)
+            if wd < 0:
+                error = self._last_error()
+                if error.errno in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise error
+            self._paths[wd] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    stack.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+
+    def read(self, timeout: Optional[float]) -> Optional[set]:
+        """Directories with PDF changes reported within timeout seconds.
+
+        A directory created or moved in is watched and reported itself; one
+        removed or moved out is reported so its documents can be dropped.
+        Returns None if the kernel queue overflowed and events were lost.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        dirty = set()
+        if not ready:
+            return dirty
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                start = offset + INOTIFY_EVENT.size
+                name = os.fsdecode(data[start:start + length].rstrip(b"\0"))
+                offset = start + length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                elif mask & IN_IGNORED:
+                    self._paths.pop(wd, None)
+                elif wd in self._paths:
+                    path = os.path.join(self._paths[wd], name)
+                    if mask & IN_ISDIR:
+                        if mask & (IN_CREATE | IN_MOVED_TO):
+                            self.watch_tree(path)
+                        dirty.add(path)
+                    elif name.endswith(".pdf"):
+                        dirty.add(self._paths[wd])
+        return None if overflowed else dirty
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
@@ -0,0 +1,68 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.epstein_ui.models import PdfDocument
+from apps.epstein_ui.views import RANDOM_PDF_MODES, _random_pdf_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Time random-pdf picks as the document table grows. Synthetic rows are added "
+        "inside a transaction that is rolled back, so the database is left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,100000",
+            help="Comma-separated synthetic row counts to add, cumulatively.",
+        )
+        parser.add_argument("--samples", type=int, default=200, help="Picks timed per mode and size.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(",") if size.strip())
+        samples = max(1, options["samples"])
+        modes = [""] + list(RANDOM_PDF_MODES)
+        self.stdout.write(f"{'rows':>10}  " + "  ".join(f"{mode or 'any':>20}" for mode in modes))
+        with transaction.atomic():
+            added = 0
+            for size in sizes:
+                self._add_rows(added, size)
+                added = size
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(PdfDocument._meta.db_table)}")
+                total = PdfDocument.objects.count()
+                cells = []
+                for mode in modes:
+                    timings = []
+                    for _ in range(samples):
+                        started = time.perf_counter()
+                        _random_pdf_document(mode)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    cells.append(f"{statistics.median(timings):7.2f} / {p95:7.2f} ms")
+                self.stdout.write(f"{total:>10}  " + "  ".join(f"{cell:>20}" for cell in cells))
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Median / p95 per pick; synthetic rows rolled back."))
+
+    def _add_rows(self, start: int, stop: int) -> None:
+        rng = random.Random(start)
+        batch = []
+        for n in range(start, stop):
+            batch.append(PdfDocument(
+                filename=f"bench-{n:08d}.pdf",
+                search_name=f"bench {n:08d}",
+                path=f"/bench-random-pdf/{n:08d}.pdf",
+                annotation_count=rng.choice((0, 0, 0, 1, 3)),
+                vote_score=rng.choice((-1, 0, 0, 0, 2)),
+                rendered=rng.random() < 0.5,
+            ))
+            if len(batch) == 5000:
+                PdfDocument.objects.bulk_create(batch)
+                batch = []
+        PdfDocument.objects.bulk_create(batch)
@@ -0,0 +1,101 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from apps.epstein_ui.models import PdfDocument
+from apps.epstein_ui.pools import _run_pooled
+from apps.epstein_ui.rendering import _append_thumbnails, _render_thumbnail
+from apps.epstein_ui.views import _pdf_cache_key
+
+
+def _thumbnail_batch(batch: list[tuple[int, str]]) -> list[tuple[int, bytes, str]]:
+    """Render thumbnails in a pool worker. Returns (doc_id, jpeg, error) per document."""
+    results = []
+    for doc_id, path in batch:
+        try:
+            results.append((doc_id, _render_thumbnail(Path(path)), ""))
+        except Exception as exc:
+            results.append((doc_id, b"", str(exc) or exc.__class__.__name__))
+    return results
+
+
+class Command(BaseCommand):
+    help = "Render page-1 thumbnails for the browse grid into packed shard files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=2, help="Parallel render processes.")
+        parser.add_argument("--batch-size", type=int, default=50, help="Documents per worker task.")
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render thumbnails that are already up to date.",
+        )
+
+    def handle(self, *args, **options):
+        jobs = max(1, options["jobs"])
+        batch_size = max(1, options["batch_size"])
+        docs = PdfDocument.objects.only(
+            "id", "path", "cache_key", "file_size", "file_mtime", "file_inode", "content_hash"
+        ).order_by("id")
+        if not options["force"]:
+            # Documents whose thumbnail was rendered from the current file.
+            docs = docs.exclude(thumb_key=F("cache_key"), thumb_length__isnull=False)
+        total = docs.count()
+        self.stdout.write(f"{total} thumbnails to render, {jobs} jobs.")
+
+        keys = {}
+        done = 0
+        failed = 0
+
+        def batches():
+            batch = []
+            for doc in docs.iterator(chunk_size=2000):
+                keys[doc.id] = _pdf_cache_key(doc)
+                batch.append((doc.id, doc.path))
+                if len(batch) == batch_size:
+                    yield (batch,)
+                    batch = []
+            if batch:
+                yield (batch,)
+
+        def store(results) -> None:
+            nonlocal done, failed
+            rendered = [(doc_id, blob) for doc_id, blob, error in results if not error]
+            for doc_id, _, error in results:
+                if error:
+                    failed += 1
+                    keys.pop(doc_id, None)
+                    self.stdout.write(self.style.WARNING(f"Document {doc_id}: {error}"))
+            locations = _append_thumbnails([blob for _, blob in rendered])
+            updates = [
+                PdfDocument(
+                    id=doc_id,
+                    thumb_shard=shard,
+                    thumb_offset=offset,
+                    thumb_length=length,
+                    thumb_key=keys.pop(doc_id),
+                )
+                for (doc_id, _), (shard, offset, length) in zip(rendered, locations)
+            ]
+            PdfDocument.objects.bulk_update(
+                updates,
+                ["thumb_shard", "thumb_offset", "thumb_length", "thumb_key"],
+                batch_size=500,
+            )
+            done += len(results)
+            self.stdout.write(f"[{done}/{total}] {time.monotonic() - started:.1f}s")
+
+        started = time.monotonic()
+        try:
+            _run_pooled(_thumbnail_batch, batches(), jobs, store)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interrupted; re-run to resume."))
+            raise
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {done - failed} thumbnails in {elapsed:.1f}s "
+            f"({(done - failed) / elapsed:.1f}/sec); {failed} failed."
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.epstein_ui.fulltext import _collect_pdf_text, _pending_pdf_text
+
+
+class Command(BaseCommand):
+    help = "Extract page text from indexed PDFs for full-text search (OCR for scanned pages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=2, help="Parallel extraction processes.")
+
+    def handle(self, *args, **options):
+        jobs = max(1, options["jobs"])
+        total = _pending_pdf_text().count()
+        self.stdout.write(f"{total} documents to extract, {jobs} jobs.")
+        self.done = 0
+        self.failed = 0
+
+        def report(filename: str, pages: int, error: str) -> None:
+            self.done += 1
+            position = f"[{self.done}/{total}]"
+            if error:
+                self.failed += 1
+                self.stdout.write(self.style.WARNING(f"{position} {filename}: failed: {error}"))
+            else:
+                self.stdout.write(f"{position} {filename}: {pages} pages with text")
+
+        started = time.monotonic()
+        try:
+            documents, pages = _collect_pdf_text(jobs=jobs, report=report)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interrupted; re-run to resume."))
+            raise
+        self.stdout.write(self.style.SUCCESS(
+            f"Extracted {pages} pages from {documents - self.failed} documents "
+            f"in {time.monotonic() - started:.1f}s; {self.failed} failed."
+        ))
@@ -1,32 +1,215 @@
+import time
+
 from django.core.management.base import BaseCommand
-from django.db.models import Count, Sum
+from django.db import close_old_connections
 
-from apps.epstein_ui.models import Annotation, PdfComment, PdfDocument, PdfVote
-from apps.epstein_ui.views import _sync_pdf_index
+from apps.epstein_ui.models import PdfDocument
+from apps.epstein_ui.indexing import (
+    DATA_DIR,
+    INDEX_MAX_DEBOUNCE,
+    INDEX_POLL_INTERVAL,
+    INDEX_WALK_WORKERS,
+    _InotifyWatcher,
+    _collect_pdf_metadata,
+    _refresh_pdf_counters,
+    _refresh_site_stats,
+    _sync_pdf_directories,
+    _sync_pdf_index,
+)
+from apps.epstein_ui.management.commands.prewarm_pdfs import _prewarm_one
+from apps.epstein_ui.pools import _spawn_pool
+from apps.epstein_ui.suggest import _rebuild_suggest_index
 
 
 class Command(BaseCommand):
-    help = "Index PDFs on disk and refresh per-PDF counters."
+    help = "Index PDFs on disk and refresh per-PDF counters and start page totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-stat every PDF, not just those in directories changed since the last run.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=INDEX_WALK_WORKERS,
+            help="Threads walking top-level directories in parallel.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running and index PDFs as they are added, changed or removed.",
+        )
+        parser.add_argument(
+            "--poll",
+            action="store_true",
+            help="With --watch, rescan on a timer instead of using inotify (for network mounts).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=INDEX_POLL_INTERVAL,
+            help="Seconds between rescans when polling.",
+        )
+        parser.add_argument(
+            "--debounce",
+            type=float,
+            default=2.0,
+            help="With --watch, seconds without events before a burst is indexed.",
+        )
+        parser.add_argument(
+            "--prerender",
+            action="store_true",
+            help="With --watch, pre-render the pages of new and changed PDFs.",
+        )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            default=2,
+            help="Parallel processes for reading document metadata and pre-rendering.",
+        )
+        parser.add_argument(
+            "--counters-only",
+            action="store_true",
+            help="Skip the disk scan and metadata; only recompute counters and start page totals.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many documents' counters have drifted; writes nothing.",
+        )
 
     def handle(self, *args, **options):
-        self.stdout.write("Syncing PDF index...")
-        pdfs = _sync_pdf_index()
-        self.stdout.write(f"Indexed {len(pdfs)} PDFs.")
-
-        self.stdout.write("Refreshing annotation counts...")
-        ann_rows = Annotation.objects.values("pdf_key").annotate(total=Count("id"))
-        ann_map = {row["pdf_key"]: row["total"] for row in ann_rows}
-        comment_rows = PdfComment.objects.values("pdf__filename").annotate(total=Count("id"))
-        comment_map = {row["pdf__filename"]: row["total"] for row in comment_rows}
-
-        self.stdout.write("Refreshing vote scores...")
-        vote_rows = PdfVote.objects.values("pdf_id").annotate(score=Sum("value"))
-        vote_map = {row["pdf_id"]: row["score"] or 0 for row in vote_rows}
-
-        for doc in PdfDocument.objects.all():
-            PdfDocument.objects.filter(id=doc.id).update(
-                annotation_count=ann_map.get(doc.filename, 0) + comment_map.get(doc.filename, 0),
-                vote_score=vote_map.get(doc.id, 0),
+        if options["dry_run"]:
+            started = time.monotonic()
+            drifted = _refresh_pdf_counters(dry_run=True)
+            self.stdout.write(
+                f"{drifted} documents have drifted counters ({time.monotonic() - started:.1f}s)."
             )
-
+            return
+        if not options["counters_only"]:
+            self.stdout.write("Syncing PDF index...")
+            summary = _sync_pdf_index(full=options["full"], workers=options["workers"])
+            self._report(summary, "Scanned")
+            self.stdout.write("Reading document metadata...")
+            started = time.monotonic()
+            read = _collect_pdf_metadata(jobs=options["jobs"])
+            self.stdout.write(f"Read metadata of {read} PDFs ({time.monotonic() - started:.1f}s).")
+            started = time.monotonic()
+            entries = _rebuild_suggest_index()
+            self.stdout.write(
+                f"Built suggestion index of {entries} names ({time.monotonic() - started:.1f}s)."
+            )
+        self.stdout.write("Refreshing annotation and comment counts and vote scores...")
+        started = time.monotonic()
+        drifted = _refresh_pdf_counters()
+        self.stdout.write(f"Corrected {drifted} documents ({time.monotonic() - started:.1f}s).")
+        stats = _refresh_site_stats()
+        self.stdout.write(
+            f"Start page: {stats.total_pdfs} PDFs, {stats.total_annotations} annotations, "
+            f"{stats.total_comments} comments, {stats.total_users} users."
+        )
         self.stdout.write(self.style.SUCCESS("PDF index and counters refreshed."))
+        if options["watch"]:
+            self._watch(options)
+
+    def _report(self, summary: dict, verb: str) -> None:
+        self.stdout.write(
+            f"{verb} {summary['directories']} directories ({summary['changed']} changed) "
+            f"in {summary['seconds']:.1f}s: {summary['created']} added, "
+            f"{summary['updated']} updated, {summary['deleted']} removed."
+        )
+
+    def _watch(self, options) -> None:
+        watcher = None
+        if not options["poll"]:
+            try:
+                watcher = _InotifyWatcher(DATA_DIR)
+            except OSError as exc:
+                self.stdout.write(self.style.WARNING(f"inotify unavailable ({exc}); polling instead."))
+        mode = "inotify" if watcher else f"polling every {options['interval']:.0f}s"
+        self.stdout.write(f"Watching {DATA_DIR} ({mode}). Ctrl-C to stop.")
+
+        self._prerenders = {}
+        self._executor = _spawn_pool(max(1, options["jobs"])) if options["prerender"] else None
+        try:
+            while True:
+                if watcher is not None:
+                    try:
+                        dirty = self._next_batch(watcher, options["debounce"])
+                    except OSError as exc:
+                        self.stdout.write(self.style.WARNING(f"inotify failed ({exc}); polling instead."))
+                        watcher.close()
+                        watcher = None
+                        dirty = None
+                else:
+                    self._sleep(options["interval"])
+                    dirty = None
+                # Long-running: drop connections the server may have timed out.
+                close_old_connections()
+                if dirty is None:
+                    summary = _sync_pdf_index(workers=options["workers"], track_paths=True)
+                else:
+                    summary = _sync_pdf_directories(dirty)
+                if summary["created"] or summary["updated"] or summary["deleted"]:
+                    self._report(summary, f"[{time.strftime('%H:%M:%S')}] Indexed")
+                    # A spawned pool only pays off for large drops.
+                    jobs = options["jobs"] if len(summary["paths"]) > 100 else 1
+                    _collect_pdf_metadata(jobs=jobs, paths=summary["paths"])
+                    _rebuild_suggest_index()
+                    self._queue_prerenders(summary["paths"])
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped watching.")
+        finally:
+            if watcher is not None:
+                watcher.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _next_batch(self, watcher: _InotifyWatcher, debounce: float):
+        """Block until a burst of events has been quiet for `debounce` seconds.
+
+        A steady stream of events is cut off after INDEX_MAX_DEBOUNCE so
+        documents still show up. Returns the changed directories, or None
+        when events were lost and a rescan is needed.
+        """
+        dirty = set()
+        deadline = None
+        while True:
+            events = watcher.read(debounce if dirty else 1.0)
+            if events is None:
+                return None
+            if dirty and not events:
+                return dirty
+            if events:
+                dirty |= events
+                deadline = deadline or time.monotonic() + INDEX_MAX_DEBOUNCE
+                if time.monotonic() >= deadline:
+                    return dirty
+            self._reap_prerenders()
+
+    def _sleep(self, seconds: float) -> None:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
+            self._reap_prerenders()
+
+    def _queue_prerenders(self, paths: list) -> None:
+        if self._executor is None or not paths:
+            return
+        docs = PdfDocument.objects.filter(path__in=paths).only("id", "filename", "path", "cache_key")
+        for doc in docs:
+            future = self._executor.submit(_prewarm_one, doc.id, doc.path, doc.cache_key)
+            self._prerenders[future] = doc.filename
+
+    def _reap_prerenders(self) -> None:
+        for future in [future for future in self._prerenders if future.done()]:
+            filename = self._prerenders.pop(future)
+            doc_id, pages, seconds, error = future.result()
+            if error:
+                self.stdout.write(self.style.WARNING(
+                    f"{filename}: pre-render failed after {seconds:.1f}s: {error}"
+                ))
+            else:
+                self.stdout.write(f"{filename}: pre-rendered {pages} pages in {seconds:.1f}s")
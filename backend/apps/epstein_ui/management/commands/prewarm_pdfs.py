@@ -0,0 +1,113 @@
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.epstein_ui.models import PdfDocument
+from apps.epstein_ui.pools import _run_pooled
+from apps.epstein_ui.rendering import (
+    _manifest_complete_pages,
+    _pdf_cache_dir,
+    _render_pdf_pages,
+)
+from apps.epstein_ui.views import _pdf_cache_key
+
+
+def _prewarm_one(doc_id: int, path: str, cache_key: str) -> tuple:
+    """Render one document in a pool worker. Returns (doc_id, pages, seconds, error)."""
+    started = time.monotonic()
+    try:
+        pages = len(_render_pdf_pages(Path(path), cache_key))
+    except Exception as exc:
+        return doc_id, 0, time.monotonic() - started, str(exc) or exc.__class__.__name__
+    return doc_id, pages, time.monotonic() - started, ""
+
+
+def _parse_since(value: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"Invalid --since date: {value}") from exc
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Pre-render indexed PDFs into the page cache so first visitors don't wait."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--jobs", type=int, default=2, help="Parallel render processes.")
+        parser.add_argument(
+            "--since",
+            help="Only documents whose file changed on or after this ISO date/time.",
+        )
+        parser.add_argument(
+            "--order",
+            choices=["priority", "name"],
+            default="priority",
+            help="priority renders the most voted and annotated documents first.",
+        )
+        parser.add_argument("--limit", type=int, help="Stop after this many documents.")
+
+    def handle(self, *args, **options):
+        jobs = max(1, options["jobs"])
+        docs = PdfDocument.objects.only(
+            "id", "filename", "path", "cache_key", "file_size", "file_mtime", "file_inode", "content_hash"
+        )
+        if options["since"]:
+            docs = docs.filter(file_mtime__gte=_parse_since(options["since"]))
+        if options["order"] == "priority":
+            docs = docs.order_by("-vote_score", "-annotation_count", "filename")
+        else:
+            docs = docs.order_by("filename")
+        if options["limit"]:
+            docs = docs[: options["limit"]]
+
+        total = docs.count()
+        self.stdout.write(f"{total} documents, {jobs} jobs.")
+        self.skipped = 0
+
+        names = {}
+        total_pages = 0
+        failed = 0
+        done = 0
+
+        def pending():
+            # Completed documents are skipped, so an interrupted run resumes where it stopped.
+            for doc in docs.iterator(chunk_size=2000):
+                cache_key = _pdf_cache_key(doc)
+                if _manifest_complete_pages(_pdf_cache_dir(Path(doc.path), cache_key)):
+                    self.skipped += 1
+                    continue
+                names[doc.id] = doc.filename
+                yield doc.id, doc.path, cache_key
+
+        def report(result) -> None:
+            nonlocal total_pages, failed, done
+            doc_id, pages, seconds, error = result
+            filename = names.pop(doc_id)
+            done += 1
+            position = f"[{done + self.skipped}/{total}]"
+            if error:
+                failed += 1
+                self.stdout.write(self.style.WARNING(
+                    f"{position} {filename}: failed after {seconds:.1f}s: {error}"
+                ))
+                return
+            total_pages += pages
+            self.stdout.write(f"{position} {filename}: {pages} pages in {seconds:.1f}s")
+
+        started = time.monotonic()
+        try:
+            _run_pooled(_prewarm_one, pending(), jobs, report)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interrupted; re-run to resume."))
+            raise
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {done - failed} documents ({total_pages} pages) in {elapsed:.1f}s, "
+            f"{total_pages / elapsed:.1f} pages/sec; {self.skipped} already cached, {failed} failed."
+        ))
@@ -0,0 +1,148 @@
+import shutil
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from apps.epstein_ui.rendering import (
+    MANIFEST_NAME,
+    PAGE_CONTENT_TYPES,
+    _cache_entries,
+    _cache_eviction_policy,
+    _cache_max_bytes,
+    _parse_byte_size,
+    _read_page_manifest,
+    _render_admission_stats,
+    _render_stats,
+    _reset_render_stats,
+    _trim_render_cache,
+)
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Command(BaseCommand):
+    help = "Report on, trim or verify the rendered page cache under MEDIA_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["report", "trim", "verify", "reset-stats"])
+        parser.add_argument(
+            "--max-bytes",
+            help="Byte budget for trim, e.g. 20G (defaults to PDF_CACHE_MAX_BYTES).",
+        )
+        parser.add_argument(
+            "--policy",
+            choices=["lru", "lfu"],
+            help="Eviction policy for trim (defaults to PDF_CACHE_EVICTION).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Show what trim would evict.")
+        parser.add_argument("--fix", action="store_true", help="Let verify delete broken entries.")
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if action == "report":
+            self._report()
+        elif action == "trim":
+            self._trim(options)
+        elif action == "verify":
+            self._verify(options["fix"])
+        else:
+            _reset_render_stats()
+            self.stdout.write(self.style.SUCCESS("Render cache counters reset."))
+
+    def _report(self):
+        entries = _cache_entries()
+        total = sum(entry["bytes"] for entry in entries)
+        budget = _cache_max_bytes()
+        stats = _render_stats()
+        self.stdout.write(f"Cached PDFs: {len(entries)}")
+        self.stdout.write(f"Cache size: {_format_bytes(total)}")
+        self.stdout.write(
+            f"Budget: {_format_bytes(budget) if budget else 'unlimited'} ({_cache_eviction_policy()})"
+        )
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Evictions: {stats['evictions']}  Hit ratio: {stats['hit_ratio']:.1%}"
+        )
+        admission = _render_admission_stats()
+        self.stdout.write(
+            f"Render slots: {admission['running']}/{admission['slots']} busy  "
+            f"Queued: {admission['queued']}/{admission['queue_depth']}  "
+            f"Rejected: {stats['rejected']}  "
+            f"Wait avg/max: {admission['wait_avg']:.2f}s/{admission['wait_max']:.2f}s"
+        )
+        largest = sorted(entries, key=lambda entry: entry["bytes"], reverse=True)[:10]
+        if largest:
+            self.stdout.write("Largest entries:")
+            for entry in largest:
+                self.stdout.write(
+                    f"  {entry['path'].name}  {_format_bytes(entry['bytes'])}  hits={entry['hits']}"
+                )
+
+    def _trim(self, options):
+        max_bytes = None
+        if options["max_bytes"]:
+            try:
+                max_bytes = _parse_byte_size(options["max_bytes"])
+            except ValueError as exc:
+                raise CommandError(f"Invalid --max-bytes: {options['max_bytes']}") from exc
+        if max_bytes is None and not _cache_max_bytes():
+            raise CommandError("No budget: pass --max-bytes or set PDF_CACHE_MAX_BYTES.")
+        summary = _trim_render_cache(
+            max_bytes=max_bytes,
+            policy=options["policy"],
+            dry_run=options["dry_run"],
+        )
+        verb = "Would evict" if options["dry_run"] else "Evicted"
+        self.stdout.write(
+            f"{verb} {summary['evicted']} of {summary['entries']} cached PDFs "
+            f"({_format_bytes(summary['evicted_bytes'])}); "
+            f"cache is now {_format_bytes(summary['bytes'])}."
+        )
+
+    def _verify(self, fix: bool):
+        problems = 0
+        for entry in _cache_entries():
+            out_dir: Path = entry["path"]
+            broken = []
+            manifest = _read_page_manifest(out_dir)
+            if manifest is None and (out_dir / MANIFEST_NAME).exists():
+                broken.append(f"unreadable {MANIFEST_NAME}")
+            elif manifest is not None:
+                listed = [page for page in manifest["pages"] if page["file"]]
+                missing = [page for page in listed if not (out_dir / page["file"]).exists()]
+                if missing:
+                    broken.append(f"{len(missing)} pages listed in {MANIFEST_NAME} are missing")
+                resized = [
+                    page for page in listed
+                    if page not in missing and (out_dir / page["file"]).stat().st_size != page["bytes"]
+                ]
+                if resized:
+                    broken.append(f"{len(resized)} pages differ in size from {MANIFEST_NAME}")
+            page_files = [path for path in out_dir.iterdir() if path.suffix in PAGE_CONTENT_TYPES]
+            for image_path in sorted(page_files):
+                try:
+                    with Image.open(image_path) as img:
+                        img.verify()
+                except Exception:
+                    broken.append(f"unreadable image {image_path.name}")
+            if not broken:
+                continue
+            problems += 1
+            for problem in broken:
+                self.stdout.write(self.style.WARNING(f"{out_dir.name}: {problem}"))
+            if fix:
+                # Pages re-render on demand and the manifest is rebuilt with them.
+                shutil.rmtree(out_dir, ignore_errors=True)
+
+        if problems:
+            action = "repaired" if fix else "found (re-run with --fix to repair)"
+            self.stdout.write(self.style.WARNING(f"{problems} broken cache entries {action}."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Render cache verified."))
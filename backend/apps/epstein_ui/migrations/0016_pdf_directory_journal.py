@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0015_pdfdocument_thumbnail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfDirectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.TextField(unique=True)),
+                ('mtime_ns', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='directory',
+            field=models.TextField(blank=True, db_index=True),
+        ),
+        # Parent directory of every indexed path, in one statement.
+        migrations.RunSQL(
+            "UPDATE epstein_ui_pdfdocument SET directory = regexp_replace(path, '/[^/]*$', '') "
+            "WHERE path LIKE '%/%'",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0016_pdf_directory_journal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='has_text',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='metadata_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='page_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='producer',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('page_count'), descending=True, nulls_last=True), models.F('filename'), name='pdfdoc_longest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('file_size'), descending=True, nulls_last=True), models.F('filename'), name='pdfdoc_largest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('file_mtime'), descending=True, nulls_last=True), models.F('filename'), name='pdfdoc_newest_idx'),
+        ),
+    ]
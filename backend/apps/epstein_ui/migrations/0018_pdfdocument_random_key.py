@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:20
+
+import apps.epstein_ui.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0017_pdfdocument_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='random_key',
+            field=models.FloatField(default=apps.epstein_ui.models._random_key),
+        ),
+        # AddField evaluates the default once for all existing rows.
+        migrations.RunSQL(
+            "UPDATE epstein_ui_pdfdocument SET random_key = random()",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='rendered',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['random_key'], name='pdfdoc_random_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(condition=models.Q(('annotation_count', 0)), fields=['random_key'], name='pdfdoc_random_unannotated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(condition=models.Q(('vote_score__gt', 0)), fields=['random_key'], name='pdfdoc_random_promising_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(condition=models.Q(('rendered', False)), fields=['random_key'], name='pdfdoc_random_unrendered_idx'),
+        ),
+    ]
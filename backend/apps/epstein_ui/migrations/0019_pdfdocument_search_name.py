@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:25
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0018_pdfdocument_random_key'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='search_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        # Same normalization as indexing._search_name.
+        migrations.RunSQL(
+            r"""
+            UPDATE epstein_ui_pdfdocument SET search_name = left(btrim(regexp_replace(
+                lower(regexp_replace(filename, '\.pdf$', '', 'i')), '[^a-z0-9]+', ' ', 'g'
+            )), 255)
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_name'], name='pdfdoc_search_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
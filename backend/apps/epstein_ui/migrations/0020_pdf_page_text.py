@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:33
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0019_pdfdocument_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='text_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='PdfPageText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_num', models.IntegerField()),
+                ('text', models.TextField()),
+                ('source', models.CharField(max_length=8)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('pdf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='page_texts', to='epstein_ui.pdfdocument')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='pdfpage_search_idx')],
+                'unique_together': {('pdf', 'page_num')},
+            },
+        ),
+    ]
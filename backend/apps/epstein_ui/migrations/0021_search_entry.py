@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Indexes everything written before the signals in signals.py existed, with
+# the same columns and text search config as fulltext._index_search_entry.
+BACKFILL_SQL = """
+INSERT INTO epstein_ui_searchentry
+    (kind, object_id, pdf_key, target_hash, reply_id, user_id, body, search_vector, created_at)
+SELECT kind, object_id, pdf_key, target_hash, reply_id, user_id, body,
+    to_tsvector('english', body), created_at
+FROM (
+    SELECT 'annotation' AS kind, a.id AS object_id, a.pdf_key, a.hash AS target_hash,
+        NULL::bigint AS reply_id, a.user_id, a.note AS body, a.created_at
+    FROM epstein_ui_annotation AS a
+    UNION ALL
+    SELECT 'text_item', t.id, a.pdf_key, a.hash, NULL, a.user_id, t.text, a.created_at
+    FROM epstein_ui_textitem AS t JOIN epstein_ui_annotation AS a ON a.id = t.annotation_id
+    UNION ALL
+    SELECT 'annotation_comment', c.id, a.pdf_key, a.hash, c.id, c.user_id, c.body, c.created_at
+    FROM epstein_ui_annotationcomment AS c JOIN epstein_ui_annotation AS a ON a.id = c.annotation_id
+    UNION ALL
+    SELECT 'pdf_comment', c.id, d.filename, c.hash, NULL, c.user_id, c.body, c.created_at
+    FROM epstein_ui_pdfcomment AS c JOIN epstein_ui_pdfdocument AS d ON d.id = c.pdf_id
+    UNION ALL
+    SELECT 'pdf_comment_reply', r.id, d.filename, c.hash, r.id, r.user_id, r.body, r.created_at
+    FROM epstein_ui_pdfcommentreply AS r
+    JOIN epstein_ui_pdfcomment AS c ON c.id = r.comment_id
+    JOIN epstein_ui_pdfdocument AS d ON d.id = c.pdf_id
+) AS entries
+WHERE body ~ '[^[:space:]]'
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0020_pdf_page_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('annotation', 'Annotation'), ('text_item', 'Text Overlay'), ('annotation_comment', 'Annotation Comment'), ('pdf_comment', 'PDF Comment'), ('pdf_comment_reply', 'PDF Comment Reply')], max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('pdf_key', models.CharField(db_index=True, max_length=255)),
+                ('target_hash', models.UUIDField(blank=True, null=True)),
+                ('reply_id', models.BigIntegerField(blank=True, null=True)),
+                ('body', models.TextField()),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='searchentry_vector_idx')],
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
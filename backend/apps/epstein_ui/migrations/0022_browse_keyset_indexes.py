@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0021_search_entry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pdfdocument',
+            name='pdfdoc_longest_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pdfdocument',
+            name='pdfdoc_largest_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pdfdocument',
+            name='pdfdoc_newest_idx',
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['filename', 'id'], name='pdfdoc_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('vote_score'), descending=True), models.F('filename'), models.F('id'), name='pdfdoc_promising_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['vote_score', 'filename', 'id'], name='pdfdoc_least_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('annotation_count'), descending=True), models.F('filename'), models.F('id'), name='pdfdoc_ann_most_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['annotation_count', 'filename', 'id'], name='pdfdoc_ann_least_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('page_count'), descending=True, nulls_last=True), models.F('filename'), models.F('id'), name='pdfdoc_longest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('file_size'), descending=True, nulls_last=True), models.F('filename'), models.F('id'), name='pdfdoc_largest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('file_mtime'), descending=True, nulls_last=True), models.F('filename'), models.F('id'), name='pdfdoc_newest_idx'),
+        ),
+    ]
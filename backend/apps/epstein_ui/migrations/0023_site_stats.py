@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0022_browse_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_pdfs', models.IntegerField(default=0)),
+                ('annotated_pdfs', models.IntegerField(default=0)),
+                ('total_annotations', models.IntegerField(default=0)),
+                ('total_users', models.IntegerField(default=0)),
+                ('total_comments', models.IntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        # comment_count was never maintained before; signals.py now keeps it.
+        migrations.RunSQL(
+            """
+            UPDATE epstein_ui_pdfdocument AS doc SET comment_count = counts.total
+            FROM (
+                SELECT pdf_id, COUNT(*) AS total FROM epstein_ui_pdfcomment GROUP BY pdf_id
+            ) AS counts
+            WHERE counts.pdf_id = doc.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(models.OrderBy(models.F('comment_count'), descending=True), models.F('filename'), condition=models.Q(('comment_count__gt', 0)), name='pdfdoc_discussed_idx'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:43
+
+from django.db import migrations, models
+
+# Counts the votes cast before votes._toggle_vote kept the tallies.
+BACKFILL_SQL = [
+    f"""
+    UPDATE epstein_ui_{target} AS target
+    SET upvotes = tallies.up, downvotes = tallies.down
+    FROM (
+        SELECT {column} AS target_id,
+            COUNT(*) FILTER (WHERE value = 1) AS up,
+            COUNT(*) FILTER (WHERE value = -1) AS down
+        FROM epstein_ui_{vote}
+        GROUP BY {column}
+    ) AS tallies
+    WHERE target.id = tallies.target_id
+    """
+    for target, vote, column in [
+        ("annotation", "annotationvote", "annotation_id"),
+        ("annotationcomment", "commentvote", "comment_id"),
+        ("pdfdocument", "pdfvote", "pdf_id"),
+        ("pdfcomment", "pdfcommentvote", "comment_id"),
+        ("pdfcommentreply", "pdfcommentreplyvote", "reply_id"),
+    ]
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('epstein_ui', '0023_site_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='annotation',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='annotationcomment',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='annotationcomment',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfcomment',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfcomment',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfcommentreply',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfcommentreply',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,9 +1,16 @@
 """Database models for per-PDF annotation data."""
+import random
 import uuid
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
+def _random_key() -> float:
+    return random.random()
+
+
 class Annotation(models.Model):
     """Top-level annotation anchor tied to a PDF and user."""
     hash = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
@@ -13,6 +20,9 @@ class Annotation(models.Model):
     x = models.FloatField()
     y = models.FloatField()
     note = models.TextField(blank=True)
+    # Vote tallies, maintained by votes._toggle_vote.
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -48,15 +58,171 @@ class ArrowItem(models.Model):
 class PdfDocument(models.Model):
     """Indexed PDF available for annotation."""
     filename = models.CharField(max_length=255, db_index=True)
+    # Lowercased filename without ".pdf", punctuation runs as single spaces;
+    # see indexing._search_name. Trigram-indexed for search.
+    search_name = models.CharField(max_length=255, blank=True)
     path = models.TextField(unique=True)
+    # Parent directory of path; the incremental indexer diffs one directory at a time.
+    directory = models.TextField(blank=True, db_index=True)
     annotation_count = models.IntegerField(default=0)
     comment_count = models.IntegerField(default=0)
+    # Vote tallies, maintained by votes._toggle_vote; vote_score is their difference.
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
     vote_score = models.IntegerField(default=0)
+    # File identity recorded at index time; cache_key names the render cache dir.
+    file_size = models.BigIntegerField(null=True, blank=True)
+    file_mtime = models.DateTimeField(null=True, blank=True)
+    file_inode = models.BigIntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)
+    # Page-1 thumbnail packed into a shard file under MEDIA_ROOT/thumbs;
+    # thumb_key is the cache_key it was rendered from.
+    thumb_shard = models.CharField(max_length=32, blank=True)
+    thumb_offset = models.BigIntegerField(null=True, blank=True)
+    thumb_length = models.IntegerField(null=True, blank=True)
+    thumb_key = models.CharField(max_length=64, blank=True)
+    # Document metadata read by index_pdfs (pdfinfo/pdftotext); metadata_key
+    # is the cache_key it was read from. has_text is None until checked.
+    page_count = models.IntegerField(null=True, blank=True)
+    producer = models.CharField(max_length=255, blank=True)
+    has_text = models.BooleanField(null=True, blank=True)
+    metadata_key = models.CharField(max_length=64, blank=True)
+    # Uniform sort key for random picks; rendered is set once the document's
+    # pages have been opened or pre-rendered, and cleared when it is re-keyed.
+    random_key = models.FloatField(default=_random_key)
+    rendered = models.BooleanField(default=False)
+    # cache_key the PdfPageText rows were extracted from; blank until extract_text runs.
+    text_key = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        # Browse sorts (BROWSE_SORTS in views.py); filename and id break ties,
+        # so a (key, filename, id) cursor resumes with one index seek.
+        indexes = [
+            models.Index(fields=["filename", "id"], name="pdfdoc_name_idx"),
+            models.Index(models.F("vote_score").desc(), "filename", "id", name="pdfdoc_promising_idx"),
+            models.Index(fields=["vote_score", "filename", "id"], name="pdfdoc_least_idx"),
+            models.Index(
+                models.F("annotation_count").desc(), "filename", "id", name="pdfdoc_ann_most_idx"
+            ),
+            models.Index(fields=["annotation_count", "filename", "id"], name="pdfdoc_ann_least_idx"),
+            models.Index(
+                models.F("page_count").desc(nulls_last=True), "filename", "id", name="pdfdoc_longest_idx"
+            ),
+            models.Index(
+                models.F("file_size").desc(nulls_last=True), "filename", "id", name="pdfdoc_largest_idx"
+            ),
+            models.Index(
+                models.F("file_mtime").desc(nulls_last=True), "filename", "id", name="pdfdoc_newest_idx"
+            ),
+            # Start page "most discussed" leaderboard.
+            models.Index(
+                models.F("comment_count").desc(),
+                "filename",
+                condition=models.Q(comment_count__gt=0),
+                name="pdfdoc_discussed_idx",
+            ),
+            # random_pdf modes; conditions must match RANDOM_PDF_MODES in views.py.
+            models.Index(fields=["random_key"], name="pdfdoc_random_idx"),
+            models.Index(
+                fields=["random_key"],
+                condition=models.Q(annotation_count=0),
+                name="pdfdoc_random_unannotated_idx",
+            ),
+            models.Index(
+                fields=["random_key"],
+                condition=models.Q(vote_score__gt=0),
+                name="pdfdoc_random_promising_idx",
+            ),
+            models.Index(
+                fields=["random_key"],
+                condition=models.Q(rendered=False),
+                name="pdfdoc_random_unrendered_idx",
+            ),
+            # pg_trgm: serves both LIKE '%term%' and word-similarity lookups.
+            GinIndex(fields=["search_name"], opclasses=["gin_trgm_ops"], name="pdfdoc_search_trgm_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.filename
 
 
+class PdfDirectory(models.Model):
+    """Directory mtime journal; unchanged directories are skipped when indexing."""
+    path = models.TextField(unique=True)
+    mtime_ns = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return self.path
+
+
+class SiteStats(models.Model):
+    """Start page totals, in the single row ROW_ID.
+
+    signals.py applies deltas as rows come and go; index_pdfs recounts
+    everything, so drift never outlives the next run.
+    """
+    ROW_ID = 1
+
+    total_pdfs = models.IntegerField(default=0)
+    annotated_pdfs = models.IntegerField(default=0)
+    total_annotations = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    total_comments = models.IntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+
+class PdfPageText(models.Model):
+    """Extracted text of one PDF page, for full-text search."""
+    pdf = models.ForeignKey(PdfDocument, on_delete=models.CASCADE, related_name="page_texts")
+    page_num = models.IntegerField()
+    text = models.TextField()
+    # "text" from the PDF's text layer, "ocr" from Tesseract.
+    source = models.CharField(max_length=8)
+    search_vector = SearchVectorField(null=True)
+
+    class Meta:
+        unique_together = ("pdf", "page_num")
+        indexes = [GinIndex(fields=["search_vector"], name="pdfpage_search_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.pdf_id}:{self.page_num}"
+
+
+class SearchEntry(models.Model):
+    """Searchable copy of an annotation note, text overlay or discussion post.
+
+    Kept current by signals.py; pdf_key, target_hash and reply_id build the
+    same /<slug>/<hash>/?reply=<id> links as notifications.
+    """
+    KIND_ANNOTATION = "annotation"
+    KIND_TEXT_ITEM = "text_item"
+    KIND_ANNOTATION_COMMENT = "annotation_comment"
+    KIND_PDF_COMMENT = "pdf_comment"
+    KIND_PDF_COMMENT_REPLY = "pdf_comment_reply"
+    KIND_CHOICES = [
+        (KIND_ANNOTATION, "Annotation"),
+        (KIND_TEXT_ITEM, "Text Overlay"),
+        (KIND_ANNOTATION_COMMENT, "Annotation Comment"),
+        (KIND_PDF_COMMENT, "PDF Comment"),
+        (KIND_PDF_COMMENT_REPLY, "PDF Comment Reply"),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    pdf_key = models.CharField(max_length=255, db_index=True)
+    target_hash = models.UUIDField(null=True, blank=True)
+    reply_id = models.BigIntegerField(null=True, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    body = models.TextField()
+    search_vector = SearchVectorField(null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("kind", "object_id")
+        indexes = [GinIndex(fields=["search_vector"], name="searchentry_vector_idx")]
+
+
 class AnnotationVote(models.Model):
     """Single user vote (+1 or -1) for an annotation."""
     annotation = models.ForeignKey(Annotation, on_delete=models.CASCADE, related_name="votes")
@@ -73,6 +239,8 @@ class AnnotationComment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies")
     body = models.TextField()
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -102,6 +270,8 @@ class PdfComment(models.Model):
     pdf = models.ForeignKey(PdfDocument, on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     body = models.TextField()
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -111,6 +281,8 @@ class PdfCommentReply(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     parent = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="children")
     body = models.TextField()
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
@@ -0,0 +1,52 @@
+"""Process pools for the batch commands' per-document work."""
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable
+
+import django
+
+
+def _spawn_pool(jobs: int) -> ProcessPoolExecutor:
+    """A pool of jobs worker processes.
+
+    Workers are spawned, not forked, so children never inherit the DB
+    connection; each sets Django up on start.
+    """
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+
+
+def _run_pooled(fn: Callable, items: Iterable[tuple], jobs: int, on_result: Callable) -> None:
+    """Call fn(*item) for every item, and on_result with each result.
+
+    With jobs > 1 the calls run in a _spawn_pool, with at most 2 * jobs
+    submitted at a time, so items is read lazily and can be a generator
+    over a large queryset. on_result always runs in this process, as
+    results finish. An interrupt cancels the calls not yet started.
+    """
+    if jobs <= 1:
+        for item in items:
+            on_result(fn(*item))
+        return
+    executor = _spawn_pool(jobs)
+    items = iter(items)
+    in_flight = set()
+    try:
+        while True:
+            while len(in_flight) < jobs * 2:
+                item = next(items, None)
+                if item is None:
+                    break
+                in_flight.add(executor.submit(fn, *item))
+            if not in_flight:
+                break
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                on_result(future.result())
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
@@ -0,0 +1,1393 @@
+"""PDF page rendering backed by the MEDIA_ROOT page cache."""
+import fcntl
+import hashlib
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.utils import OperationalError, ProgrammingError
+from PIL import Image, ImageChops, features
+
+from .models import PdfDocument
+
+RENDER_DPI = 150
+# US Letter at RENDER_DPI; used when pdfinfo cannot report a page size.
+PLACEHOLDER_PAGE_SIZE = (1275, 1650)
+# pdfinfo clamps -l to the real page count, so this just means "all pages".
+_PDFINFO_LAST_PAGE = 100000
+# Pages pdftotext reads at index time to decide whether a document has a text layer.
+TEXT_PROBE_PAGES = 3
+# Full-text extraction: Tesseract input resolution and language, and the
+# longest page text that is stored.
+OCR_DPI = 300
+OCR_LANGUAGE = os.environ.get("PDF_OCR_LANGUAGE", "eng")
+PAGE_TEXT_MAX_CHARS = 200000
+# Page files are pdftoppm PNGs or, for scanned pages, the embedded JPEG as-is;
+# zoom tiles are WebP (PNG if Pillow lacks WebP).
+PAGE_CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".webp": "image/webp"}
+# Zoom pyramid: fixed-size tiles rendered per page at each of these DPIs.
+TILE_SIZE = 512
+TILE_DPIS = (75, 150, 300, 600)
+TILE_WEBP_QUALITY = 85
+# Document, manifest, page and tile renders lock one of a fixed set of
+# stripes per kind instead of one file per document, page or tile.
+RENDER_LOCK_STRIPES = 64
+# Browse thumbnails: page 1 as a small JPEG, appended to shard files.
+THUMB_DPI = 24
+THUMB_JPEG_QUALITY = 70
+THUMB_SHARD_MAX_BYTES = 64 * 1024 ** 2
+# Embedded images browsers can display directly (pdfimages -list "enc"/"color").
+PASSTHROUGH_ENCODINGS = {"jpeg"}
+PASSTHROUGH_COLORS = {"gray", "rgb", "icc"}
+FULL_PAGE_TOLERANCE = 0.02
+# A scan is only passed through if a grayscale render of its page at
+# SCAN_CHECK_DPI matches the JPEG: averaged over SCAN_CHECK_BLOCK pixel
+# squares, which evens out resampling differences, no block may differ by
+# more than SCAN_CHECK_MAX_DIFF levels.
+SCAN_CHECK_DPI = 50
+SCAN_CHECK_BLOCK = 4
+SCAN_CHECK_MAX_DIFF = 24
+# Per-document page list (count, sizes, files, renderer); see _page_manifest().
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# Appended to on every cache hit; drives LRU/LFU eviction.
+ACCESS_LOG = ".access"
+RENDER_STATS = ("hits", "misses", "evictions", "rejected")
+RENDER_WAIT_STATS = "render_wait.json"
+# Seconds between automatic trims, and before an abandoned scratch dir is removed.
+CACHE_TRIM_INTERVAL = int(os.environ.get("PDF_CACHE_TRIM_INTERVAL", "300"))
+SCRATCH_MAX_AGE = 3600
+_BYTE_SUFFIXES = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+_last_trim = 0.0
+# Running background page renders in this process, by cache directory name.
+_page_renders = {}
+_page_renders_lock = threading.Lock()
+CACHE_KEY_LENGTH = 16
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Admission control: renders allowed at once on this host, requests allowed to
+# wait for one, and how long they wait before being turned away.
+RENDER_SLOTS = int(os.environ.get("PDF_RENDER_SLOTS", "2"))
+# Slots batch work (prewarm, thumbnails, OCR) never takes, so page requests
+# always have one; with a single slot nothing can be reserved.
+RENDER_RESERVED_SLOTS = int(os.environ.get("PDF_RENDER_RESERVED_SLOTS", "1"))
+RENDER_QUEUE_DEPTH = int(os.environ.get("PDF_RENDER_QUEUE_DEPTH", "8"))
+RENDER_QUEUE_WAIT = float(os.environ.get("PDF_RENDER_QUEUE_WAIT", "10"))
+RENDER_RETRY_AFTER = int(os.environ.get("PDF_RENDER_RETRY_AFTER", "5"))
+# Documents a worker process renders in the background for ?stream=1 at once.
+STREAM_RENDER_THREADS = int(os.environ.get("PDF_STREAM_RENDER_THREADS", "2"))
+# Per-process limits for poppler tools: wall clock (seconds) and CPU (seconds),
+# plus this many seconds of each for every page after the first in a
+# multi-page run.
+RENDER_TIMEOUT = int(os.environ.get("PDF_RENDER_TIMEOUT", "60"))
+RENDER_CPU_LIMIT = int(os.environ.get("PDF_RENDER_CPU_LIMIT", "60"))
+RENDER_PAGE_TIMEOUT = int(os.environ.get("PDF_RENDER_PAGE_TIMEOUT", "10"))
+_SLOT_POLL_INTERVAL = 0.05
+# How often a streamed page list looks for newly rendered pages.
+_STREAM_POLL_INTERVAL = 0.05
+
+
+class RenderBusy(Exception):
+    """Every render slot is taken and the wait queue is full or timed out."""
+
+    def __init__(self, retry_after: int = RENDER_RETRY_AFTER):
+        super().__init__("Renderer busy")
+        self.retry_after = retry_after
+
+
+def _run_tool(cmd: list[str], pages: int = 1) -> subprocess.CompletedProcess:
+    """Run a poppler tool under the wall-clock and CPU limits.
+
+    Both limits grow by RENDER_PAGE_TIMEOUT for each page past the first, so
+    whole-document runs on long files are not cut off. The CPU limit is
+    applied by `ulimit -t` in a wrapping shell rather than preexec_fn, which
+    is unsafe in threaded gunicorn workers. A timed out run comes back as a
+    failed CompletedProcess, so callers' error handling covers it.
+    """
+    extra = RENDER_PAGE_TIMEOUT * max(0, pages - 1)
+    timeout = RENDER_TIMEOUT + extra
+    wrapped = ["sh", "-c", f'ulimit -t {RENDER_CPU_LIMIT + extra}; exec "$@"', "sh", *cmd]
+    try:
+        return subprocess.run(
+            wrapped,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(
+            cmd, -9, "", f"{Path(cmd[0]).name} timed out after {timeout}s"
+        )
+
+
+def _pdf_document_info(pdf_path: Path) -> Optional[dict]:
+    """Page count, producer and whether the first pages carry text.
+
+    Runs pdfinfo once and pdftotext over TEXT_PROBE_PAGES pages; has_text
+    is None when pdftotext is unavailable. Returns None when pdfinfo is
+    missing or fails.
+    """
+    pdfinfo = shutil.which("pdfinfo")
+    if pdfinfo is None:
+        return None
+    result = _run_tool([pdfinfo, str(pdf_path)])
+    if result.returncode != 0:
+        return None
+    info = {"page_count": None, "producer": "", "has_text": None}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(":")
+        key = key.strip().lower()
+        if key == "pages":
+            try:
+                info["page_count"] = int(value.strip())
+            except ValueError:
+                pass
+        elif key == "producer":
+            info["producer"] = value.strip()[:255]
+
+    pdftotext = shutil.which("pdftotext")
+    if pdftotext is not None:
+        result = _run_tool(
+            [pdftotext, "-q", "-f", "1", "-l", str(TEXT_PROBE_PAGES), str(pdf_path), "-"]
+        )
+        if result.returncode == 0:
+            info["has_text"] = any(char.isalnum() for char in result.stdout)
+    return info
+
+
+def _pdfinfo_pages(
+    pdf_path: Path, first: int = 1, last: int = _PDFINFO_LAST_PAGE
+) -> Optional[tuple[int, dict, dict]]:
+    """Run pdfinfo over a page range.
+
+    Returns (page count, {page: (width_pts, height_pts)}, {page: rotation}),
+    or None when pdfinfo is missing or fails.
+    """
+    pdfinfo = shutil.which("pdfinfo")
+    if pdfinfo is None:
+        return None
+    result = _run_tool([pdfinfo, "-f", str(first), "-l", str(last), str(pdf_path)])
+    if result.returncode != 0:
+        return None
+
+    page_count = 1
+    sizes: dict[int, tuple[float, float]] = {}
+    rotations: dict[int, int] = {}
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(":")
+        key = key.strip().lower()
+        value = value.strip()
+        if key == "pages":
+            try:
+                page_count = max(1, int(value))
+            except ValueError:
+                pass
+            continue
+        parts = key.split()
+        if len(parts) != 3 or parts[0] != "page" or not parts[1].isdigit():
+            continue
+        page_num = int(parts[1])
+        try:
+            if parts[2] == "size":
+                dims = value.split()
+                sizes[page_num] = (float(dims[0]), float(dims[2]))
+            elif parts[2] == "rot":
+                rotations[page_num] = int(float(value)) % 360
+        except (IndexError, ValueError):
+            continue
+    return page_count, sizes, rotations
+
+
+def _page_pixel_size(width_pts: float, height_pts: float, rotation: int) -> tuple[int, int]:
+    if rotation in (90, 270):
+        width_pts, height_pts = height_pts, width_pts
+    return (
+        math.ceil(width_pts * RENDER_DPI / 72),
+        math.ceil(height_pts * RENDER_DPI / 72),
+    )
+
+
+def _get_pdf_page_sizes(pdf_path: Path) -> list[tuple[int, int]]:
+    """Pixel size of every page at RENDER_DPI, from a single pdfinfo call.
+
+    Pages pdfinfo cannot size get PLACEHOLDER_PAGE_SIZE, so the result always
+    has one entry per page.
+    """
+    info = _pdfinfo_pages(pdf_path)
+    if info is None:
+        return [PLACEHOLDER_PAGE_SIZE]
+    page_count, sizes, rotations = info
+    return [
+        _page_pixel_size(*sizes[page_num], rotations.get(page_num, 0))
+        if page_num in sizes
+        else PLACEHOLDER_PAGE_SIZE
+        for page_num in range(1, page_count + 1)
+    ]
+
+
+def _cache_disabled() -> bool:
+    return os.environ.get("DISABLE_PDF_CACHE", "").strip().lower() in {"1", "true", "yes"}
+
+
+def _content_hashing_enabled() -> bool:
+    return os.environ.get("PDF_CACHE_CONTENT_HASH", "").strip().lower() in {"1", "true", "yes"}
+
+
+def _file_identity(pdf_path: Path, stat: Optional[os.stat_result] = None) -> dict:
+    """Cheap identity of a file's current contents: size, mtime and inode.
+
+    Pass stat when the caller already has it (e.g. from a scandir walk).
+    """
+    if stat is None:
+        stat = os.stat(pdf_path)
+    mtime_us = stat.st_mtime_ns // 1000
+    return {
+        "file_size": stat.st_size,
+        "file_mtime": _EPOCH + timedelta(microseconds=mtime_us),
+        "file_inode": stat.st_ino,
+    }
+
+
+def _content_hash(pdf_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _compute_cache_key(identity: dict, content_hash: str = "") -> str:
+    """Cache key for a file version.
+
+    With a content hash, byte-identical copies share one key (and one set of
+    rendered pages). Otherwise the key follows size, mtime and inode, so a file
+    replaced in place gets a new key while hard links and bind mounts of the
+    same file still share one.
+    """
+    if content_hash:
+        return content_hash[:CACHE_KEY_LENGTH]
+    mtime_us = (identity["file_mtime"] - _EPOCH) // timedelta(microseconds=1)
+    raw = f"{identity['file_inode']}:{identity['file_size']}:{mtime_us}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:CACHE_KEY_LENGTH]
+
+
+def _cache_key_for_path(pdf_path: Path) -> str:
+    """Cache key for a PDF that has no PdfDocument row to remember it."""
+    content_hash = _content_hash(pdf_path) if _content_hashing_enabled() else ""
+    return _compute_cache_key(_file_identity(pdf_path), content_hash)
+
+
+def _pdf_cache_dir(pdf_path: Path, cache_key: Optional[str] = None) -> Path:
+    """Return (and create) the MEDIA_ROOT cache directory for a PDF version."""
+    media_dir = Path(settings.MEDIA_ROOT)
+    media_dir.mkdir(parents=True, exist_ok=True)
+    if not cache_key:
+        cache_key = _cache_key_for_path(pdf_path)
+    out_dir = media_dir / f"pdf_{cache_key[:CACHE_KEY_LENGTH]}"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir
+
+
+def _reset_pdf_cache(out_dir: Path) -> None:
+    """DISABLE_PDF_CACHE mode: drop every other cached PDF and this one's files."""
+    for cached in out_dir.parent.glob("pdf_*"):
+        if cached == out_dir:
+            continue
+        shutil.rmtree(cached, ignore_errors=True)
+    for cached_file in out_dir.iterdir():
+        if cached_file.is_file():
+            cached_file.unlink()
+
+
+def _page_file_name(page_num: int, page_count: int, suffix: str = ".png") -> str:
+    """Match pdftoppm's naming, which zero-pads to the digits of the page count."""
+    return f"page-{page_num:0{len(str(page_count))}d}{suffix}"
+
+
+def _find_cached_page(out_dir: Path, page_num: int) -> Optional[Path]:
+    """Locate an already rendered page without knowing the document's page count."""
+    for width in range(len(str(page_num)), len(str(_PDFINFO_LAST_PAGE)) + 1):
+        for suffix in PAGE_CONTENT_TYPES:
+            candidate = out_dir / f"page-{page_num:0{width}d}{suffix}"
+            if candidate.exists():
+                return candidate
+    return None
+
+
+def _list_pdf_images(pdf_path: Path, first: int, last: int) -> list[dict]:
+    """Parse `pdfimages -list` for a page range ([] if pdfimages is unavailable)."""
+    pdfimages = shutil.which("pdfimages")
+    if pdfimages is None:
+        return []
+    result = _run_tool(
+        [pdfimages, "-list", "-f", str(first), "-l", str(last), str(pdf_path)],
+        pages=last - first + 1 if last != _PDFINFO_LAST_PAGE else 1,
+    )
+    if result.returncode != 0:
+        return []
+    images = []
+    # Columns: page num type width height color comp bpc enc interp object ID x-ppi y-ppi ...
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) < 14 or not fields[0].isdigit():
+            continue
+        try:
+            images.append({
+                "page": int(fields[0]),
+                "type": fields[2],
+                "width": int(fields[3]),
+                "height": int(fields[4]),
+                "color": fields[5],
+                "comp": int(fields[6]),
+                "enc": fields[8],
+                "x_ppi": float(fields[12]),
+                "y_ppi": float(fields[13]),
+            })
+        except ValueError:
+            continue
+    return images
+
+
+def _scan_pages(pdf_path: Path, first: int = 1, last: int = _PDFINFO_LAST_PAGE) -> dict[int, tuple[int, int]]:
+    """Pages that are nothing but one full-page JPEG, mapped to their layout size.
+
+    Such pages can be served as the embedded JPEG bytes, once
+    _extract_scan_images has checked nothing is drawn over them. Everything else,
+    including JBIG2/CCITT/JPX scans that browsers can't display, CMYK JPEGs,
+    rotated pages and pages with more than one image, goes through pdftoppm.
+    """
+    images = _list_pdf_images(pdf_path, first, last)
+    if not images:
+        return {}
+    info = _pdfinfo_pages(pdf_path, first, last)
+    if info is None:
+        return {}
+    _, sizes, rotations = info
+
+    per_page: dict[int, list[dict]] = {}
+    for image in images:
+        per_page.setdefault(image["page"], []).append(image)
+
+    scans = {}
+    for page_num, page_images in per_page.items():
+        if len(page_images) != 1 or page_num not in sizes or rotations.get(page_num, 0):
+            continue
+        image = page_images[0]
+        if (
+            image["type"] != "image"
+            or image["enc"] not in PASSTHROUGH_ENCODINGS
+            or image["color"] not in PASSTHROUGH_COLORS
+            or image["comp"] not in (1, 3)
+            or image["x_ppi"] <= 0
+            or image["y_ppi"] <= 0
+        ):
+            continue
+        width, height = _page_pixel_size(*sizes[page_num], 0)
+        # The image, at the resolution it is drawn with, must cover the page.
+        drawn_width = image["width"] * RENDER_DPI / image["x_ppi"]
+        drawn_height = image["height"] * RENDER_DPI / image["y_ppi"]
+        if (
+            abs(drawn_width - width) > width * FULL_PAGE_TOLERANCE
+            or abs(drawn_height - height) > height * FULL_PAGE_TOLERANCE
+        ):
+            continue
+        scans[page_num] = (width, height)
+    return scans
+
+
+def _page_ranges(page_nums) -> list[tuple[int, int]]:
+    """Collapse page numbers into sorted (first, last) runs."""
+    ranges: list[tuple[int, int]] = []
+    for page_num in sorted(page_nums):
+        if ranges and ranges[-1][1] == page_num - 1:
+            ranges[-1] = (ranges[-1][0], page_num)
+        else:
+            ranges.append((page_num, page_num))
+    return ranges
+
+
+def _scan_matches_render(jpeg_path: Path, render_path: Path) -> bool:
+    """Whether a low-DPI render of a page shows nothing but its embedded JPEG.
+
+    Text or vector content drawn over a scan (redaction boxes, Bates stamps,
+    annotations) makes the two differ, and the bare JPEG would show what
+    the rendered page hides.
+    """
+    try:
+        with Image.open(render_path) as render, Image.open(jpeg_path) as scan:
+            render = render.convert("L")
+            scan.draft("L", render.size)
+            scan = scan.convert("L").resize(render.size, Image.BOX)
+    except OSError:
+        return False
+    diff = ImageChops.difference(render.reduce(SCAN_CHECK_BLOCK), scan.reduce(SCAN_CHECK_BLOCK))
+    return diff.getextrema()[1] <= SCAN_CHECK_MAX_DIFF
+
+
+def _scan_check_renders(pdf_path: Path, out_dir: Path, page_nums) -> dict[int, Path]:
+    """Grayscale SCAN_CHECK_DPI renders of the given pages, as {page: path}."""
+    for first, last in _page_ranges(page_nums):
+        cmd = [
+            "pdftoppm",
+            "-r",
+            str(SCAN_CHECK_DPI),
+            "-gray",
+            "-png",
+            "-f",
+            str(first),
+            "-l",
+            str(last),
+            str(pdf_path),
+            str(out_dir / "check"),
+        ]
+        _run_tool(cmd, pages=last - first + 1)
+    return {int(path.stem.split("-")[1]): path for path in out_dir.glob("check-*.png")}
+
+
+def _extract_scan_images(pdf_path: Path, out_dir: Path, page_nums) -> dict[int, Path]:
+    """Extract the embedded JPEG of each scan page without re-encoding it.
+
+    Returns {page: path} for the pages that produced exactly one JPEG and
+    whose render shows nothing else (see _scan_matches_render); any other
+    page is left for pdftoppm.
+    """
+    extracted = {}
+    for first, last in _page_ranges(page_nums):
+        cmd = [
+            "pdfimages",
+            "-all",
+            "-p",
+            "-f",
+            str(first),
+            "-l",
+            str(last),
+            str(pdf_path),
+            str(out_dir / "img"),
+        ]
+        result = _run_tool(cmd, pages=last - first + 1)
+        if result.returncode != 0:
+            continue
+        for page_num in range(first, last + 1):
+            found = list(out_dir.glob(f"img-{page_num:03d}-*.jpg"))
+            if len(found) == 1:
+                extracted[page_num] = found[0]
+    if not extracted:
+        return extracted
+    checks = _scan_check_renders(pdf_path, out_dir, extracted)
+    return {
+        page_num: path
+        for page_num, path in extracted.items()
+        if page_num in checks and _scan_matches_render(path, checks[page_num])
+    }
+
+
+def _pdftoppm_pages(pdf_path: Path, out_dir: Path, first: int, last: int) -> None:
+    cmd = [
+        "pdftoppm",
+        "-r",
+        str(RENDER_DPI),
+        "-png",
+        "-f",
+        str(first),
+        "-l",
+        str(last),
+        str(pdf_path),
+        str(out_dir / "page"),
+    ]
+    result = _run_tool(cmd, pages=last - first + 1 if last != _PDFINFO_LAST_PAGE else 1)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
+
+
+@contextmanager
+def _render_lock(name: str, blocking: bool = True):
+    """Exclusive lock shared by every worker process and thread on this host.
+
+    flock() locks belong to the open file description, so separate threads
+    opening the same lock file exclude each other just like separate processes.
+    Lock files live under MEDIA_ROOT/.locks and are never removed, so eviction
+    of a cache directory can't break a lock somebody is waiting on. Per-item
+    locks go through _lock_stripe, so the set of files stays fixed.
+
+    Yields whether the lock was acquired, which is always True when blocking.
+    """
+    lock_dir = Path(settings.MEDIA_ROOT) / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    with open(lock_dir / f"{name}.lock", "a+") as handle:
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _lock_stripe(kind: str, key: str) -> str:
+    """Name of the RENDER_LOCK_STRIPES lock of this kind that guards key.
+
+    Unrelated keys may share a stripe; they then just wait for each other.
+    A thread must never hold two stripes of one kind at once.
+    """
+    return f"{kind}-{zlib.crc32(key.encode()) % RENDER_LOCK_STRIPES}"
+
+
+def _try_lock_any(names: list[str]):
+    """Lock the first free lock file among names without blocking.
+
+    Returns the open handle (closing it releases the lock), or None if every
+    one is held.
+    """
+    lock_dir = Path(settings.MEDIA_ROOT) / ".locks"
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        handle = open(lock_dir / f"{name}.lock", "a+")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            continue
+        return handle
+    return None
+
+
+@contextmanager
+def _render_slot(wait: bool = False):
+    """Hold one of RENDER_SLOTS render slots shared by every process on the host.
+
+    A slot and a queue ticket are each one of a fixed set of flock files, so
+    the cap holds across gunicorn workers and threads and a crashed holder
+    frees its slot automatically. Requests wait for a slot holding a queue
+    ticket; with no ticket free, or after RENDER_QUEUE_WAIT seconds, they get
+    RenderBusy. Batch commands pass wait=True to wait as long as it takes
+    without taking a ticket. They only take the first RENDER_SLOTS -
+    RENDER_RESERVED_SLOTS slots, and requests try the reserved ones first.
+    """
+    started = time.monotonic()
+    if wait:
+        slots = [f"render-slot-{n}" for n in range(max(1, RENDER_SLOTS - RENDER_RESERVED_SLOTS))]
+    else:
+        slots = [f"render-slot-{n}" for n in reversed(range(RENDER_SLOTS))]
+    ticket = None
+    if not wait:
+        ticket = _try_lock_any([f"render-queue-{n}" for n in range(RENDER_QUEUE_DEPTH)])
+        if ticket is None:
+            _bump_render_stat("rejected")
+            raise RenderBusy()
+    try:
+        while True:
+            slot = _try_lock_any(slots)
+            if slot is not None:
+                break
+            if not wait and time.monotonic() - started >= RENDER_QUEUE_WAIT:
+                _bump_render_stat("rejected")
+                raise RenderBusy()
+            time.sleep(_SLOT_POLL_INTERVAL)
+    finally:
+        if ticket is not None:
+            ticket.close()
+    _record_render_wait(time.monotonic() - started)
+    try:
+        yield
+    finally:
+        slot.close()
+
+
+def _count_held_locks(names: list[str]) -> int:
+    held = 0
+    for name in names:
+        handle = _try_lock_any([name])
+        if handle is None:
+            held += 1
+        else:
+            handle.close()
+    return held
+
+
+def _render_scratch_dir(out_dir: Path) -> Path:
+    """Private temp dir on the cache filesystem so results can be renamed into place."""
+    return Path(tempfile.mkdtemp(prefix=f".tmp-{out_dir.name}-", dir=out_dir.parent))
+
+
+def _read_page_manifest(out_dir: Path) -> Optional[dict]:
+    try:
+        with open(out_dir / MANIFEST_NAME, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _write_page_manifest(out_dir: Path, manifest: dict) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_dir / f"{MANIFEST_NAME}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, separators=(",", ":"))
+    os.replace(tmp_path, out_dir / MANIFEST_NAME)
+
+
+def _new_page_manifest(page_sizes: list[tuple[int, int]]) -> dict:
+    """Manifest for a document with no rendered pages yet; sizes are pdfinfo's."""
+    return {
+        "version": MANIFEST_VERSION,
+        "dpi": RENDER_DPI,
+        "page_count": len(page_sizes),
+        "pages": [
+            {"file": None, "width": width, "height": height, "bytes": None, "renderer": None}
+            for width, height in page_sizes
+        ],
+    }
+
+
+def _manifest_page_entry(image_path: Path, renderer: str) -> dict:
+    """Describe a rendered page file; runs once, when the page is written."""
+    with Image.open(image_path) as img:
+        width, height = img.size
+    return {
+        "file": image_path.name,
+        "width": width,
+        "height": height,
+        "bytes": image_path.stat().st_size,
+        "renderer": renderer,
+    }
+
+
+def _page_manifest(pdf_path: Path, out_dir: Path) -> dict:
+    """Load the document's page manifest, creating it from pdfinfo on first use.
+
+    Page metadata requests are answered from this file alone, so a warm
+    document costs one small JSON read instead of a glob and an image header
+    parse per page.
+    """
+    manifest = _read_page_manifest(out_dir)
+    if manifest is not None:
+        return manifest
+    with _render_lock(_lock_stripe("manifest", out_dir.name)):
+        manifest = _read_page_manifest(out_dir)
+        if manifest is None:
+            manifest = _new_page_manifest(_get_pdf_page_sizes(pdf_path))
+            _write_page_manifest(out_dir, manifest)
+    return manifest
+
+
+def _mark_pdf_rendered(cache_key: Optional[str]) -> None:
+    """Set PdfDocument.rendered once a render of this cache_key has finished."""
+    if not cache_key:
+        return
+    try:
+        PdfDocument.objects.filter(cache_key=cache_key, rendered=False).update(rendered=True)
+    except (OperationalError, ProgrammingError):
+        pass
+
+
+def _record_rendered_page(pdf_path: Path, out_dir: Path, page_num: int, entry: dict) -> None:
+    with _render_lock(_lock_stripe("manifest", out_dir.name)):
+        manifest = _read_page_manifest(out_dir)
+        if manifest is None:
+            manifest = _new_page_manifest(_get_pdf_page_sizes(pdf_path))
+        if 1 <= page_num <= manifest["page_count"]:
+            manifest["pages"][page_num - 1] = entry
+            _write_page_manifest(out_dir, manifest)
+
+
+def _manifest_complete_pages(out_dir: Path) -> list[Path]:
+    """Pages of a fully rendered document, or [] while any page is missing."""
+    manifest = _read_page_manifest(out_dir)
+    if manifest is None or any(page["file"] is None for page in manifest["pages"]):
+        return []
+    return [out_dir / page["file"] for page in manifest["pages"]]
+
+
+def _parse_byte_size(value: str) -> int:
+    """Parse sizes like "500M" or "20G" (plain numbers are bytes)."""
+    value = value.strip().upper().removesuffix("B")
+    if not value:
+        return 0
+    multiplier = 1
+    if value[-1] in _BYTE_SUFFIXES:
+        multiplier = _BYTE_SUFFIXES[value[-1]]
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def _cache_max_bytes() -> int:
+    """Byte budget for the render cache from PDF_CACHE_MAX_BYTES (0 = unlimited)."""
+    try:
+        return _parse_byte_size(os.environ.get("PDF_CACHE_MAX_BYTES", ""))
+    except ValueError:
+        return 0
+
+
+def _cache_eviction_policy() -> str:
+    policy = os.environ.get("PDF_CACHE_EVICTION", "lru").strip().lower()
+    return policy if policy in {"lru", "lfu"} else "lru"
+
+
+def _bump_render_stat(name: str) -> None:
+    """Count an event in a cross-process counter.
+
+    Each counter is an append-only file whose size is the count: an O_APPEND
+    write of one byte is atomic, so no lock or read-modify-write is needed.
+    """
+    stats_dir = Path(settings.MEDIA_ROOT) / ".stats"
+    try:
+        stats_dir.mkdir(parents=True, exist_ok=True)
+        with open(stats_dir / name, "ab") as handle:
+            handle.write(b".")
+    except OSError:
+        pass
+
+
+def _render_stats() -> dict:
+    """Current hit/miss/eviction counters."""
+    stats_dir = Path(settings.MEDIA_ROOT) / ".stats"
+    counters = {}
+    for name in RENDER_STATS:
+        try:
+            counters[name] = (stats_dir / name).stat().st_size
+        except OSError:
+            counters[name] = 0
+    lookups = counters["hits"] + counters["misses"]
+    counters["hit_ratio"] = round(counters["hits"] / lookups, 4) if lookups else 0.0
+    return counters
+
+
+def _reset_render_stats() -> None:
+    stats_dir = Path(settings.MEDIA_ROOT) / ".stats"
+    for name in (*RENDER_STATS, RENDER_WAIT_STATS):
+        (stats_dir / name).unlink(missing_ok=True)
+
+
+def _read_render_wait(stats_dir: Path) -> dict:
+    try:
+        with open(stats_dir / RENDER_WAIT_STATS, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {"admitted": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+
+def _record_render_wait(seconds: float) -> None:
+    """Add one admitted render's queue wait to the shared totals."""
+    stats_dir = Path(settings.MEDIA_ROOT) / ".stats"
+    try:
+        stats_dir.mkdir(parents=True, exist_ok=True)
+        with _render_lock("render-wait"):
+            totals = _read_render_wait(stats_dir)
+            totals["admitted"] += 1
+            totals["wait_total"] += seconds
+            totals["wait_max"] = max(totals["wait_max"], seconds)
+            tmp_path = stats_dir / f"{RENDER_WAIT_STATS}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(totals, handle)
+            os.replace(tmp_path, stats_dir / RENDER_WAIT_STATS)
+    except OSError:
+        pass
+
+
+def _render_admission_stats() -> dict:
+    """Render slots in use, requests queued for one, and queue wait times."""
+    totals = _read_render_wait(Path(settings.MEDIA_ROOT) / ".stats")
+    admitted = totals["admitted"]
+    return {
+        "slots": RENDER_SLOTS,
+        "running": _count_held_locks([f"render-slot-{n}" for n in range(RENDER_SLOTS)]),
+        "queue_depth": RENDER_QUEUE_DEPTH,
+        "queued": _count_held_locks([f"render-queue-{n}" for n in range(RENDER_QUEUE_DEPTH)]),
+        "admitted": admitted,
+        "wait_avg": round(totals["wait_total"] / admitted, 4) if admitted else 0.0,
+        "wait_max": round(totals["wait_max"], 4),
+    }
+
+
+def _record_cache_access(out_dir: Path) -> None:
+    """Note a cache hit for eviction: ACCESS_LOG's mtime is the last access
+    (LRU) and its size the number of hits (LFU)."""
+    try:
+        with open(out_dir / ACCESS_LOG, "ab") as handle:
+            handle.write(b".")
+    except OSError:
+        pass
+
+
+def _cache_entries() -> list[dict]:
+    """Describe every cached PDF directory: size, last access and hit count."""
+    media_dir = Path(settings.MEDIA_ROOT)
+    if not media_dir.exists():
+        return []
+    entries = []
+    for entry in os.scandir(media_dir):
+        if not entry.name.startswith("pdf_") or not entry.is_dir(follow_symlinks=False):
+            continue
+        size = 0
+        last_access = 0.0
+        hits = 0
+        try:
+            last_access = entry.stat().st_mtime
+            for child in os.scandir(entry.path):
+                child_stat = child.stat(follow_symlinks=False)
+                size += child_stat.st_size
+                if child.name == ACCESS_LOG:
+                    hits = child_stat.st_size
+                    last_access = max(last_access, child_stat.st_mtime)
+        except FileNotFoundError:
+            continue
+        entries.append({
+            "path": Path(entry.path),
+            "bytes": size,
+            "last_access": last_access,
+            "hits": hits,
+        })
+    return entries
+
+
+def _evict_cache_dir(out_dir: Path) -> bool:
+    """Remove one cached PDF unless a whole-document render holds its lock stripe."""
+    with _render_lock(_lock_stripe("pdf", out_dir.name), blocking=False) as acquired:
+        if not acquired:
+            return False
+        # Drop the manifest first so nobody trusts a page list that is going away.
+        (out_dir / MANIFEST_NAME).unlink(missing_ok=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+    _bump_render_stat("evictions")
+    return True
+
+
+def _trim_render_cache(
+    max_bytes: Optional[int] = None,
+    policy: Optional[str] = None,
+    dry_run: bool = False,
+) -> dict:
+    """Evict cached PDFs until the cache fits its byte budget.
+
+    LRU evicts the least recently accessed directory first; LFU the one with
+    the fewest hits (ties broken by age). Abandoned scratch dirs are removed too.
+    """
+    if max_bytes is None:
+        max_bytes = _cache_max_bytes()
+    if policy is None:
+        policy = _cache_eviction_policy()
+
+    media_dir = Path(settings.MEDIA_ROOT)
+    now = time.time()
+    if media_dir.exists() and not dry_run:
+        for scratch in media_dir.glob(".tmp-*"):
+            try:
+                if now - scratch.stat().st_mtime > SCRATCH_MAX_AGE:
+                    shutil.rmtree(scratch, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+        # Per-document and per-page lock files from before _lock_stripe.
+        for legacy in (media_dir / ".locks").glob("pdf_*.lock"):
+            legacy.unlink(missing_ok=True)
+
+    entries = _cache_entries()
+    total = sum(entry["bytes"] for entry in entries)
+    summary = {"entries": len(entries), "bytes": total, "evicted": 0, "evicted_bytes": 0}
+    if not max_bytes or total <= max_bytes:
+        return summary
+
+    if policy == "lfu":
+        entries.sort(key=lambda entry: (entry["hits"], entry["last_access"]))
+    else:
+        entries.sort(key=lambda entry: entry["last_access"])
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        if not dry_run and not _evict_cache_dir(entry["path"]):
+            continue
+        total -= entry["bytes"]
+        summary["evicted"] += 1
+        summary["evicted_bytes"] += entry["bytes"]
+    summary["bytes"] = total
+    return summary
+
+
+def _maybe_trim_render_cache() -> None:
+    """Trim in the background after a render, at most once per interval per host."""
+    global _last_trim
+    if not _cache_max_bytes():
+        return
+    now = time.monotonic()
+    if now - _last_trim < CACHE_TRIM_INTERVAL:
+        return
+    _last_trim = now
+
+    def _trim():
+        with _render_lock("trim", blocking=False) as acquired:
+            if acquired:
+                _trim_render_cache()
+
+    threading.Thread(target=_trim, daemon=True).start()
+
+
+def _render_pdf_pages(pdf_path: Path, cache_key: Optional[str] = None) -> list[Path]:
+    """Render PDF pages into the page cache under MEDIA_ROOT.
+
+    Scanned pages are stored as their embedded JPEG (see _scan_pages); the
+    rest are rendered to PNG by pdftoppm.
+
+    Only one worker renders a given PDF at a time; others wait on the lock and
+    then reuse its result. Output is produced in a scratch directory and renamed
+    into the cache, and the manifest listing every page is written last, so a
+    concurrent reader never sees a half-written page set.
+    """
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    if not _cache_disabled():
+        finished = _manifest_complete_pages(out_dir)
+        if finished:
+            _record_cache_access(out_dir)
+            _bump_render_stat("hits")
+            _mark_pdf_rendered(cache_key)
+            return finished
+
+    with _render_lock(_lock_stripe("pdf", out_dir.name)):
+        if _cache_disabled():
+            _reset_pdf_cache(out_dir)
+        else:
+            finished = _manifest_complete_pages(out_dir)
+            if finished:
+                _record_cache_access(out_dir)
+                _bump_render_stat("hits")
+                _mark_pdf_rendered(cache_key)
+                return finished
+
+        with _render_slot(wait=True):
+            scratch = _render_scratch_dir(out_dir)
+            try:
+                # A known page count scales the tools' time limits to the document.
+                info = _pdfinfo_pages(pdf_path, last=1)
+                last_page = info[0] if info else _PDFINFO_LAST_PAGE
+                scans = _scan_pages(pdf_path, last=last_page)
+                extracted = _extract_scan_images(pdf_path, scratch, scans)
+                page_count = None
+                ranges = [(1, last_page)]
+                if extracted:
+                    page_count = len(_get_pdf_page_sizes(pdf_path))
+                    ranges = _page_ranges(n for n in range(1, page_count + 1) if n not in extracted)
+                for first, last in ranges:
+                    _pdftoppm_pages(pdf_path, scratch, first, last)
+                rendered = {
+                    int(path.stem.split("-")[1]): (path, "pdftoppm")
+                    for path in scratch.glob("page-*.png")
+                }
+                rendered.update((n, (path, "pdfimages")) for n, path in extracted.items())
+                if not rendered:
+                    raise RuntimeError("pdftoppm produced no pages")
+                _bump_render_stat("misses")
+
+                page_count = page_count or max(rendered)
+                out_dir.mkdir(parents=True, exist_ok=True)
+                entries = []
+                pages = []
+                for page_num in range(1, page_count + 1):
+                    if page_num not in rendered:
+                        raise RuntimeError(f"Page {page_num} was not rendered")
+                    path, renderer = rendered[page_num]
+                    target = out_dir / _page_file_name(page_num, page_count, path.suffix)
+                    entry = _manifest_page_entry(path, renderer)
+                    entry["file"] = target.name
+                    if page_num in extracted:
+                        # Scans keep the page's layout size; the browser scales the JPEG.
+                        entry["width"], entry["height"] = scans[page_num]
+                    os.replace(path, target)
+                    entries.append(entry)
+                    pages.append(target)
+                with _render_lock(_lock_stripe("manifest", out_dir.name)):
+                    manifest = _new_page_manifest([])
+                    manifest["page_count"] = page_count
+                    manifest["pages"] = entries
+                    _write_page_manifest(out_dir, manifest)
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+    _mark_pdf_rendered(cache_key)
+    _maybe_trim_render_cache()
+    return pages
+
+
+def _render_pdf_page(
+    pdf_path: Path, page_num: int, cache_key: Optional[str] = None, wait: bool = False
+) -> Path:
+    """Render a single page into the PDF's cache directory on first request.
+
+    Concurrent requests for the same page share one render. A scanned page is
+    stored as its embedded JPEG, anything else as a pdftoppm PNG. wait=True
+    takes a batch render slot (see _render_slot) instead of queueing with
+    page requests.
+    """
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    cached = _find_cached_page(out_dir, page_num)
+    if cached is not None:
+        _record_cache_access(out_dir)
+        _bump_render_stat("hits")
+        return cached
+
+    with _render_lock(_lock_stripe("page", f"{out_dir.name}/{page_num}")):
+        cached = _find_cached_page(out_dir, page_num)
+        if cached is not None:
+            _record_cache_access(out_dir)
+            _bump_render_stat("hits")
+            return cached
+
+        page_count = _page_manifest(pdf_path, out_dir)["page_count"]
+        if page_num < 1 or page_num > page_count:
+            raise ValueError(f"Page {page_num} out of range")
+
+        with _render_slot(wait=wait):
+            scratch = _render_scratch_dir(out_dir)
+            try:
+                scans = _scan_pages(pdf_path, page_num, page_num)
+                extracted = _extract_scan_images(pdf_path, scratch, scans)
+                if page_num in extracted:
+                    rendered, renderer = extracted[page_num], "pdfimages"
+                else:
+                    cmd = [
+                        "pdftoppm",
+                        "-r",
+                        str(RENDER_DPI),
+                        "-png",
+                        "-f",
+                        str(page_num),
+                        "-l",
+                        str(page_num),
+                        "-singlefile",
+                        str(pdf_path),
+                        str(scratch / "page"),
+                    ]
+                    result = _run_tool(cmd)
+                    if result.returncode != 0:
+                        raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
+                    rendered, renderer = scratch / "page.png", "pdftoppm"
+                    if not rendered.exists():
+                        raise RuntimeError("pdftoppm produced no page")
+                _bump_render_stat("misses")
+                out_path = out_dir / _page_file_name(page_num, page_count, rendered.suffix)
+                entry = _manifest_page_entry(rendered, renderer)
+                entry["file"] = out_path.name
+                if page_num in extracted:
+                    entry["width"], entry["height"] = scans[page_num]
+                out_dir.mkdir(parents=True, exist_ok=True)
+                os.replace(rendered, out_path)
+                _record_rendered_page(pdf_path, out_dir, page_num, entry)
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+    _mark_pdf_rendered(cache_key)
+    _maybe_trim_render_cache()
+    return out_path
+
+
+def _start_page_renders(pdf_path: Path, cache_key: Optional[str] = None) -> dict:
+    """Render a document's pages in order in a background thread.
+
+    Each page lands in the manifest as it finishes (see _render_pdf_page).
+    Pages wait for a batch render slot, so these renders never take the
+    queue or reserved slot of page requests, and the thread carries on
+    whether or not anyone is still waiting. Callers in this process share
+    one thread per document; raises RenderBusy when STREAM_RENDER_THREADS
+    other documents are already rendering. Returns the thread's state:
+    "thread", and "error" once a page failed.
+    """
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    with _page_renders_lock:
+        state = _page_renders.get(out_dir.name)
+        if state is not None:
+            return state
+        if len(_page_renders) >= STREAM_RENDER_THREADS:
+            raise RenderBusy()
+        state = _page_renders[out_dir.name] = {"error": None}
+
+        def _render():
+            try:
+                page_count = _page_manifest(pdf_path, out_dir)["page_count"]
+                for page_num in range(1, page_count + 1):
+                    _render_pdf_page(pdf_path, page_num, cache_key=cache_key, wait=True)
+            except Exception as exc:
+                state["error"] = exc
+            finally:
+                with _page_renders_lock:
+                    del _page_renders[out_dir.name]
+                connection.close()
+
+        state["thread"] = threading.Thread(target=_render, daemon=True)
+        state["thread"].start()
+    return state
+
+
+def _iter_rendered_pages(pdf_path: Path, cache_key: Optional[str] = None):
+    """Yield (page_num, manifest entry) in page order as pages are rendered.
+
+    Pages are rendered by _start_page_renders, so a caller that stops
+    reading doesn't stop the render. Raises the render's error at the first
+    page it couldn't produce, or RenderBusy if no render could be started.
+    """
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    state = None if _manifest_complete_pages(out_dir) else _start_page_renders(pdf_path, cache_key)
+    page_num = 1
+    while True:
+        # Checked before reading, so the last pages written are not missed.
+        stopped = state is None or not state["thread"].is_alive()
+        manifest = _read_page_manifest(out_dir)
+        pages = manifest["pages"] if manifest is not None else []
+        while page_num <= len(pages) and pages[page_num - 1]["file"] is not None:
+            yield page_num, pages[page_num - 1]
+            page_num += 1
+        if manifest is not None and page_num > manifest["page_count"]:
+            return
+        if stopped:
+            error = state["error"] if state is not None else None
+            raise error or RuntimeError(f"Page {page_num} was not rendered")
+        time.sleep(_STREAM_POLL_INTERVAL)
+
+
+def _tile_format() -> tuple[str, str]:
+    """Pillow format and file suffix for zoom tiles."""
+    if features.check("webp"):
+        return "WEBP", ".webp"
+    return "PNG", ".png"
+
+
+def _tile_grid(width: int, height: int, dpi: int) -> tuple[int, int, int, int]:
+    """Pixel size, columns and rows of a page (layout size at RENDER_DPI) at dpi."""
+    level_width = math.ceil(width * dpi / RENDER_DPI)
+    level_height = math.ceil(height * dpi / RENDER_DPI)
+    return (
+        level_width,
+        level_height,
+        math.ceil(level_width / TILE_SIZE),
+        math.ceil(level_height / TILE_SIZE),
+    )
+
+
+def _render_page_tile(
+    pdf_path: Path,
+    page_num: int,
+    dpi: int,
+    col: int,
+    row: int,
+    cache_key: Optional[str] = None,
+) -> Path:
+    """Render one tile of a page's zoom pyramid on first request.
+
+    pdftoppm crops the page at the level's DPI, so a tile costs one page
+    parse but only rasterizes TILE_SIZE x TILE_SIZE pixels. Tiles live next
+    to the page files in the document's cache directory and are evicted
+    with it.
+    """
+    if dpi not in TILE_DPIS:
+        raise ValueError(f"No tile level at {dpi} DPI")
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    tile_format, suffix = _tile_format()
+    out_path = out_dir / f"tile-{dpi}-{page_num}-{col}-{row}{suffix}"
+    if out_path.exists():
+        _record_cache_access(out_dir)
+        _bump_render_stat("hits")
+        return out_path
+
+    with _render_lock(_lock_stripe("tile", f"{out_dir.name}/{out_path.name}")):
+        if out_path.exists():
+            _record_cache_access(out_dir)
+            _bump_render_stat("hits")
+            return out_path
+
+        manifest = _page_manifest(pdf_path, out_dir)
+        if page_num < 1 or page_num > manifest["page_count"]:
+            raise ValueError(f"Page {page_num} out of range")
+        page = manifest["pages"][page_num - 1]
+        level_width, level_height, cols, rows = _tile_grid(page["width"], page["height"], dpi)
+        if not (0 <= col < cols and 0 <= row < rows):
+            raise ValueError(f"Tile {col},{row} out of range")
+
+        x, y = col * TILE_SIZE, row * TILE_SIZE
+        with _render_slot():
+            scratch = _render_scratch_dir(out_dir)
+            try:
+                cmd = [
+                    "pdftoppm",
+                    "-r",
+                    str(dpi),
+                    "-x",
+                    str(x),
+                    "-y",
+                    str(y),
+                    "-W",
+                    str(min(TILE_SIZE, level_width - x)),
+                    "-H",
+                    str(min(TILE_SIZE, level_height - y)),
+                    "-png",
+                    "-f",
+                    str(page_num),
+                    "-l",
+                    str(page_num),
+                    "-singlefile",
+                    str(pdf_path),
+                    str(scratch / "tile"),
+                ]
+                result = _run_tool(cmd)
+                if result.returncode != 0:
+                    raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
+                rendered = scratch / "tile.png"
+                if not rendered.exists():
+                    raise RuntimeError("pdftoppm produced no tile")
+                if tile_format != "PNG":
+                    encoded = scratch / f"tile{suffix}"
+                    with Image.open(rendered) as img:
+                        img.save(encoded, tile_format, quality=TILE_WEBP_QUALITY)
+                    rendered = encoded
+                _bump_render_stat("misses")
+                out_dir.mkdir(parents=True, exist_ok=True)
+                os.replace(rendered, out_path)
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+    _maybe_trim_render_cache()
+    return out_path
+
+
+def _thumbs_dir() -> Path:
+    return Path(settings.MEDIA_ROOT) / "thumbs"
+
+
+def _render_thumbnail(pdf_path: Path) -> bytes:
+    """Page 1 of a PDF as a small JPEG, rendered by pdftoppm at THUMB_DPI."""
+    with _render_slot(wait=True), tempfile.TemporaryDirectory(prefix="thumb-") as scratch:
+        cmd = [
+            "pdftoppm",
+            "-r",
+            str(THUMB_DPI),
+            "-jpeg",
+            "-jpegopt",
+            f"quality={THUMB_JPEG_QUALITY}",
+            "-f",
+            "1",
+            "-l",
+            "1",
+            "-singlefile",
+            str(pdf_path),
+            str(Path(scratch) / "thumb"),
+        ]
+        result = _run_tool(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
+        try:
+            return (Path(scratch) / "thumb.jpg").read_bytes()
+        except FileNotFoundError:
+            raise RuntimeError("pdftoppm produced no thumbnail") from None
+
+
+def _ocr_page(pdf_path: Path, page_num: int) -> str:
+    """Text of one page by Tesseract, from a grayscale render at OCR_DPI."""
+    with _render_slot(wait=True), tempfile.TemporaryDirectory(prefix="ocr-") as scratch:
+        image_base = Path(scratch) / "page"
+        result = _run_tool([
+            "pdftoppm",
+            "-r",
+            str(OCR_DPI),
+            "-gray",
+            "-png",
+            "-f",
+            str(page_num),
+            "-l",
+            str(page_num),
+            "-singlefile",
+            str(pdf_path),
+            str(image_base),
+        ])
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
+        result = _run_tool(
+            ["tesseract", str(image_base.with_suffix(".png")), "stdout", "-l", OCR_LANGUAGE]
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or "tesseract failed")
+        return result.stdout
+
+
+def _extract_page_texts(pdf_path: Path) -> list[tuple[int, str, str]]:
+    """(page, text, source) for every page of a PDF that has any text.
+
+    One pdftotext run covers the whole document; pages it finds no text on
+    are OCR'd one at a time when tesseract is installed. source is "text"
+    or "ocr". Pages without text in either are left out.
+    """
+    info = _pdfinfo_pages(pdf_path, last=1)
+    result = _run_tool(
+        ["pdftotext", "-q", "-enc", "UTF-8", str(pdf_path), "-"],
+        pages=info[0] if info else 1,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "pdftotext failed")
+    # pdftotext ends every page with a form feed.
+    pages = result.stdout.split("\f")[:-1]
+    ocr = shutil.which("tesseract") is not None
+    texts = []
+    for page_num, text in enumerate(pages, start=1):
+        source = "text"
+        if not any(char.isalnum() for char in text):
+            if not ocr:
+                continue
+            text = _ocr_page(pdf_path, page_num)
+            source = "ocr"
+            if not any(char.isalnum() for char in text):
+                continue
+        # Postgres text can't hold NUL, and tsvector is capped at 1 MB.
+        texts.append((page_num, text.replace("\x00", "")[:PAGE_TEXT_MAX_CHARS], source))
+    return texts
+
+
+def _append_thumbnails(blobs: list[bytes]) -> list[tuple[str, int, int]]:
+    """Append thumbnails to the current shard, returning (shard, offset, length) each.
+
+    Thumbnails are packed into a few large files instead of one file per
+    document. Shards are append-only and roll over at THUMB_SHARD_MAX_BYTES,
+    so an offset handed out stays valid for as long as the shard exists.
+    """
+    if not blobs:
+        return []
+    thumbs_dir = _thumbs_dir()
+    thumbs_dir.mkdir(parents=True, exist_ok=True)
+    locations = []
+    with _render_lock("thumbs"):
+        shards = sorted(thumbs_dir.glob("shard-*.bin"))
+        shard = shards[-1] if shards else thumbs_dir / "shard-0000.bin"
+        handle = open(shard, "ab")
+        try:
+            for blob in blobs:
+                if handle.tell() and handle.tell() + len(blob) > THUMB_SHARD_MAX_BYTES:
+                    handle.close()
+                    shard = thumbs_dir / f"shard-{int(shard.stem.split('-')[1]) + 1:04d}.bin"
+                    handle = open(shard, "ab")
+                locations.append((shard.name, handle.tell(), len(blob)))
+                handle.write(blob)
+            handle.flush()
+            os.fsync(handle.fileno())
+        finally:
+            handle.close()
+    return locations
+
+
+def _read_thumbnail(shard: str, offset: int, length: int) -> bytes:
+    if Path(shard).name != shard:
+        raise ValueError("Invalid shard name")
+    fd = os.open(_thumbs_dir() / shard, os.O_RDONLY)
+    try:
+        data = os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+    if len(data) != length:
+        raise ValueError("Truncated thumbnail")
+    return data
@@ -1,8 +1,27 @@
-from django.db.models import Sum
-from django.db.models.signals import post_delete, post_save
+import threading
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Annotation, PdfComment, PdfDocument, PdfVote
+from .fulltext import _drop_search_entry, _index_search_entry
+from .indexing import _bump_site_stats
+from .models import (
+    Annotation,
+    AnnotationComment,
+    AnnotationVote,
+    CommentVote,
+    PdfComment,
+    PdfCommentReply,
+    PdfCommentReplyVote,
+    PdfCommentVote,
+    PdfDocument,
+    PdfVote,
+    SearchEntry,
+    TextItem,
+)
+from .votes import VOTE_TARGETS, _bump_vote_tally
 
 
 def _refresh_annotation_count(pdf_key: str) -> None:
@@ -10,43 +29,149 @@ def _refresh_annotation_count(pdf_key: str) -> None:
         return
     count = Annotation.objects.filter(pdf_key=pdf_key).count()
     count += PdfComment.objects.filter(pdf__filename=pdf_key).count()
-    PdfDocument.objects.filter(filename=pdf_key).update(annotation_count=count)
-
-
-def _refresh_vote_score(pdf_id: int) -> None:
-    if not pdf_id:
-        return
-    score = PdfVote.objects.filter(pdf_id=pdf_id).aggregate(total=Sum("value")).get("total") or 0
-    PdfDocument.objects.filter(id=pdf_id).update(vote_score=score)
+    docs = PdfDocument.objects.filter(filename=pdf_key)
+    previous = list(docs.values_list("annotation_count", flat=True))
+    docs.update(annotation_count=count)
+    # Documents gaining their first or losing their last annotation.
+    _bump_site_stats(annotated_pdfs=sum((count > 0) - (old > 0) for old in previous))
 
 
 @receiver(post_save, sender=Annotation)
-def _annotation_saved(sender, instance, **kwargs):
+def _annotation_saved(sender, instance, created=False, **kwargs):
     _refresh_annotation_count(instance.pdf_key)
+    if created:
+        _bump_site_stats(total_annotations=1)
+    _index_search_entry(SearchEntry.KIND_ANNOTATION, instance)
 
 
 @receiver(post_delete, sender=Annotation)
 def _annotation_deleted(sender, instance, **kwargs):
     _refresh_annotation_count(instance.pdf_key)
+    _bump_site_stats(total_annotations=-1)
+    _drop_search_entry(SearchEntry.KIND_ANNOTATION, instance.id)
 
 
 @receiver(post_save, sender=PdfComment)
-def _pdf_comment_saved(sender, instance, **kwargs):
+def _pdf_comment_saved(sender, instance, created=False, **kwargs):
+    if created:
+        PdfDocument.objects.filter(id=instance.pdf_id).update(comment_count=F("comment_count") + 1)
+        _bump_site_stats(total_comments=1)
     if instance.pdf_id:
         _refresh_annotation_count(instance.pdf.filename)
+        _index_search_entry(SearchEntry.KIND_PDF_COMMENT, instance)
 
 
 @receiver(post_delete, sender=PdfComment)
 def _pdf_comment_deleted(sender, instance, **kwargs):
+    PdfDocument.objects.filter(id=instance.pdf_id).update(comment_count=F("comment_count") - 1)
+    _bump_site_stats(total_comments=-1)
     if instance.pdf_id:
         _refresh_annotation_count(instance.pdf.filename)
+    _drop_search_entry(SearchEntry.KIND_PDF_COMMENT, instance.id)
+
+
+# Search index for the remaining annotation-layer text; deletes cascade
+# through these receivers too.
+@receiver(post_save, sender=TextItem)
+def _text_item_saved(sender, instance, update_fields=None, **kwargs):
+    # Moving or restyling an overlay leaves its search text as it is.
+    if update_fields is not None and "text" not in update_fields:
+        return
+    _index_search_entry(SearchEntry.KIND_TEXT_ITEM, instance)
+
+
+@receiver(post_delete, sender=TextItem)
+def _text_item_deleted(sender, instance, **kwargs):
+    _drop_search_entry(SearchEntry.KIND_TEXT_ITEM, instance.id)
+
+
+@receiver(post_save, sender=AnnotationComment)
+def _annotation_comment_saved(sender, instance, created=False, **kwargs):
+    _index_search_entry(SearchEntry.KIND_ANNOTATION_COMMENT, instance)
+    if created:
+        _bump_site_stats(total_comments=1)
+
+
+@receiver(post_delete, sender=AnnotationComment)
+def _annotation_comment_deleted(sender, instance, **kwargs):
+    _drop_search_entry(SearchEntry.KIND_ANNOTATION_COMMENT, instance.id)
+    _bump_site_stats(total_comments=-1)
+
+
+@receiver(post_save, sender=PdfCommentReply)
+def _pdf_comment_reply_saved(sender, instance, **kwargs):
+    _index_search_entry(SearchEntry.KIND_PDF_COMMENT_REPLY, instance)
+
+
+@receiver(post_delete, sender=PdfCommentReply)
+def _pdf_comment_reply_deleted(sender, instance, **kwargs):
+    _drop_search_entry(SearchEntry.KIND_PDF_COMMENT_REPLY, instance.id)
 
 
-@receiver(post_save, sender=PdfVote)
-def _pdf_vote_saved(sender, instance, **kwargs):
-    _refresh_vote_score(instance.pdf_id)
+# Vote targets of the delete running on this thread, as (model, pk). The
+# collector sends every pre_delete before it deletes anything, so this
+# covers instance and queryset deletes and cascades of any depth.
+_deleting = threading.local()
 
 
+def _vote_targets_deleting() -> set:
+    if not hasattr(_deleting, "targets"):
+        _deleting.targets = set()
+    return _deleting.targets
+
+
+@receiver(pre_delete, sender=Annotation)
+@receiver(pre_delete, sender=AnnotationComment)
+@receiver(pre_delete, sender=PdfDocument)
+@receiver(pre_delete, sender=PdfComment)
+@receiver(pre_delete, sender=PdfCommentReply)
+def _vote_target_deleting(sender, instance, **kwargs):
+    _vote_targets_deleting().add((sender, instance.pk))
+
+
+@receiver(post_delete, sender=Annotation)
+@receiver(post_delete, sender=AnnotationComment)
+@receiver(post_delete, sender=PdfDocument)
+@receiver(post_delete, sender=PdfComment)
+@receiver(post_delete, sender=PdfCommentReply)
+def _vote_target_deleted(sender, instance, **kwargs):
+    # Targets are deleted after the votes pointing at them.
+    _vote_targets_deleting().discard((sender, instance.pk))
+
+
+# votes._toggle_vote keeps tallies in SQL and sends no signals; this covers
+# votes deleted through the ORM, e.g. along with their user.
+@receiver(post_delete, sender=AnnotationVote)
+@receiver(post_delete, sender=CommentVote)
 @receiver(post_delete, sender=PdfVote)
-def _pdf_vote_deleted(sender, instance, **kwargs):
-    _refresh_vote_score(instance.pdf_id)
+@receiver(post_delete, sender=PdfCommentVote)
+@receiver(post_delete, sender=PdfCommentReplyVote)
+def _vote_deleted(sender, instance, **kwargs):
+    field = sender._meta.get_field(VOTE_TARGETS[sender])
+    # Votes cascading from their own target go away with it.
+    if (field.related_model, getattr(instance, field.attname)) in _vote_targets_deleting():
+        return
+    _bump_vote_tally(sender, getattr(instance, field.attname), instance.value, 0)
+
+
+# Start page totals; the indexer's bulk inserts bump total_pdfs themselves.
+@receiver(post_save, sender=PdfDocument)
+def _pdf_document_saved(sender, instance, created=False, **kwargs):
+    if created:
+        _bump_site_stats(total_pdfs=1, annotated_pdfs=int(instance.annotation_count > 0))
+
+
+@receiver(post_delete, sender=PdfDocument)
+def _pdf_document_deleted(sender, instance, **kwargs):
+    _bump_site_stats(total_pdfs=-1, annotated_pdfs=-int(instance.annotation_count > 0))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _user_saved(sender, instance, created=False, **kwargs):
+    if created:
+        _bump_site_stats(total_users=1)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def _user_deleted(sender, instance, **kwargs):
+    _bump_site_stats(total_users=-1)
@@ -127,6 +127,10 @@ let hintDrag = null;
 let currentPdfKey = null;
 const pdfState = new Map();
 let pagesMeta = [];
+// Zoom tiles: scheme from the page metadata response, plus per-page tile layers.
+let tileScheme = null;
+let pageTiles = [];
+let tileUpdateQueued = false;
 let autoPanActive = false;
 let contextTarget = null;
 let annotationCreateMode = false;
@@ -1824,6 +1828,84 @@ function setViewportTransform() {
   updateMinimapViewport();
   updateHeatmapTransform();
   updateAllAnchorSizes();
+  queueTileUpdate();
+}
+
+// --- Zoom tiles: sharper imagery for the visible part of pages when zoomed in ---
+function queueTileUpdate() {
+  if (tileUpdateQueued) return;
+  tileUpdateQueued = true;
+  window.requestAnimationFrame(() => {
+    tileUpdateQueued = false;
+    updateTiles();
+  });
+}
+
+function pickTileDpi() {
+  if (!tileScheme) return null;
+  const ctm = viewport.getScreenCTM();
+  if (!ctm) return null;
+  const wanted = tileScheme.layout_dpi * ctm.a * (window.devicePixelRatio || 1);
+  // Below this the page image itself is sharp enough.
+  if (wanted <= tileScheme.layout_dpi * 1.25) return null;
+  const dpis = tileScheme.dpis;
+  return dpis.find((dpi) => dpi >= wanted) || dpis[dpis.length - 1];
+}
+
+function clearTiles(page) {
+  page.tiles.forEach((tile) => tile.remove());
+  page.tiles.clear();
+}
+
+function updateTiles() {
+  const dpi = pickTileDpi();
+  const bounds = getViewBounds();
+  pageTiles.forEach((page) => {
+    const visible = dpi && page.offsetY < bounds.bottom && page.offsetY + page.height > bounds.top;
+    if (!visible || page.dpi !== dpi) {
+      clearTiles(page);
+      page.dpi = visible ? dpi : null;
+    }
+    if (!visible) return;
+    // Layout units covered by one tile at this level.
+    const span = (tileScheme.size * tileScheme.layout_dpi) / dpi;
+    const cols = Math.ceil(Math.ceil((page.width * dpi) / tileScheme.layout_dpi) / tileScheme.size);
+    const rows = Math.ceil(Math.ceil((page.height * dpi) / tileScheme.layout_dpi) / tileScheme.size);
+    const firstCol = Math.max(0, Math.floor(bounds.left / span));
+    const lastCol = Math.min(cols - 1, Math.floor(bounds.right / span));
+    const firstRow = Math.max(0, Math.floor((bounds.top - page.offsetY) / span));
+    const lastRow = Math.min(rows - 1, Math.floor((bounds.bottom - page.offsetY) / span));
+    const wanted = new Set();
+    for (let row = firstRow; row <= lastRow; row += 1) {
+      for (let col = firstCol; col <= lastCol; col += 1) {
+        const key = `${col}-${row}`;
+        wanted.add(key);
+        if (page.tiles.has(key)) continue;
+        const tile = document.createElementNS("http://www.w3.org/2000/svg", "image");
+        tile.setAttribute(
+          "href",
+          tileScheme.url
+            .replace("{page}", page.number)
+            .replace("{dpi}", dpi)
+            .replace("{col}", col)
+            .replace("{row}", row)
+        );
+        tile.setAttribute("x", col * span);
+        tile.setAttribute("y", page.offsetY + row * span);
+        tile.setAttribute("width", Math.min(span, page.width - col * span));
+        tile.setAttribute("height", Math.min(span, page.height - row * span));
+        tile.setAttribute("preserveAspectRatio", "none");
+        page.layer.appendChild(tile);
+        page.tiles.set(key, tile);
+      }
+    }
+    page.tiles.forEach((tile, key) => {
+      if (!wanted.has(key)) {
+        tile.remove();
+        page.tiles.delete(key);
+      }
+    });
+  });
 }
 
 // --- Heatmap: build in PDF coordinate space, then draw into viewport transform ---
@@ -3072,6 +3154,9 @@ function buildPageImages(container, pages, withLabels = false) {
   let offsetY = 0;
   let maxWidth = 0;
   pagesMeta = [];
+  if (!withLabels) {
+    pageTiles = [];
+  }
   pages.forEach((page, index) => {
     const pageGroup = document.createElementNS("http://www.w3.org/2000/svg", "g");
     const img = document.createElementNS("http://www.w3.org/2000/svg", "image");
@@ -3081,6 +3166,19 @@ function buildPageImages(container, pages, withLabels = false) {
     img.setAttribute("width", page.width);
     img.setAttribute("height", page.height);
     pageGroup.appendChild(img);
+    if (!withLabels) {
+      const tileLayer = document.createElementNS("http://www.w3.org/2000/svg", "g");
+      pageGroup.appendChild(tileLayer);
+      pageTiles.push({
+        number: index + 1,
+        offsetY,
+        width: page.width,
+        height: page.height,
+        layer: tileLayer,
+        tiles: new Map(),
+        dpi: null,
+      });
+    }
     if (withLabels) {
       const labelRect = document.createElementNS("http://www.w3.org/2000/svg", "rect");
       const labelText = document.createElementNS("http://www.w3.org/2000/svg", "text");
@@ -3156,6 +3254,7 @@ async function fetchRandomPdf() {
     }
     const data = await response.json();
     if (data.pages && data.pages.length) {
+      tileScheme = data.tiles || null;
       syncPages(data.pages, data.pdf || "");
       loadAnnotationsForPdf(data.pdf || "");
     }
@@ -3185,6 +3284,7 @@ async function searchPdf() {
     }
     const data = await response.json();
     if (data.pages && data.pages.length) {
+      tileScheme = data.tiles || null;
       syncPages(data.pages, data.pdf || "");
       loadAnnotationsForPdf(data.pdf || "");
     }
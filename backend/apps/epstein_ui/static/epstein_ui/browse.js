@@ -1,6 +1,7 @@
 const list = document.getElementById("browseList");
 const moreBtn = document.getElementById("browseMore");
 const sortSelect = document.getElementById("browseSort");
+const filterSelect = document.getElementById("browseFilter");
 const notificationDots = document.querySelectorAll(".notif-dot");
 const randomBtn = document.getElementById("browseRandom");
 const searchInput = document.getElementById("browseSearch");
@@ -12,11 +13,12 @@ function uiIconPath(filename) {
   return `${staticUiBase}icons/${filename}`;
 }
 
-let page = 1;
+let cursor = "";
 let loading = false;
 let hasMore = true;
 let currentSort = sortSelect ? sortSelect.value : "name";
 let currentQuery = "";
+let currentText = filterSelect ? filterSelect.value : "";
 
 function setLoading(state) {
   loading = state;
@@ -30,6 +32,14 @@ function appendCard(item) {
   const link = document.createElement("a");
   link.className = "browse-card";
   link.href = `/${encodeURIComponent(item.slug || item.filename.replace(/\.pdf$/i, ""))}`;
+  if (item.thumb) {
+    const thumb = document.createElement("img");
+    thumb.className = "browse-thumb";
+    thumb.src = item.thumb;
+    thumb.alt = "";
+    thumb.loading = "lazy";
+    link.appendChild(thumb);
+  }
   const name = document.createElement("span");
   name.textContent = item.filename;
   const meta = document.createElement("div");
@@ -56,6 +66,12 @@ function appendCard(item) {
 
   meta.appendChild(voteWrap);
   meta.appendChild(annWrap);
+  if (typeof item.pages === "number") {
+    const pagesWrap = document.createElement("span");
+    pagesWrap.className = "browse-meta-item";
+    pagesWrap.textContent = `${item.pages} ${item.pages === 1 ? "page" : "pages"}`;
+    meta.appendChild(pagesWrap);
+  }
   link.appendChild(name);
   link.appendChild(meta);
   list.appendChild(link);
@@ -65,19 +81,26 @@ async function loadPage() {
   if (loading || !hasMore) return;
   setLoading(true);
   try {
-    const response = await fetch(
-      `/browse-list/?page=${page}&sort=${encodeURIComponent(currentSort)}&q=${encodeURIComponent(currentQuery)}`
-    );
+    const params = new URLSearchParams({ sort: currentSort, q: currentQuery, text: currentText });
+    // Only the first page asks for the total; later pages just follow the cursor.
+    if (cursor) {
+      params.set("cursor", cursor);
+    } else {
+      params.set("count", "1");
+    }
+    const response = await fetch(`/browse-list/?${params}`);
     if (!response.ok) {
       throw new Error("Failed to load");
     }
     const data = await response.json();
     (data.items || []).forEach(appendCard);
     hasMore = Boolean(data.has_more);
+    cursor = data.next_cursor || "";
     if (browseCount && typeof data.total === "number") {
-      browseCount.textContent = `(${data.total})`;
+      browseCount.textContent = data.total_approximate
+        ? `(~${data.total.toLocaleString()})`
+        : `(${data.total})`;
     }
-    page += 1;
     if (!hasMore && moreBtn) {
       moreBtn.classList.add("hidden");
     }
@@ -92,14 +115,25 @@ if (moreBtn) {
   moreBtn.addEventListener("click", loadPage);
 }
 
+function reloadList() {
+  cursor = "";
+  hasMore = true;
+  list.innerHTML = "";
+  if (moreBtn) moreBtn.classList.remove("hidden");
+  loadPage();
+}
+
 if (sortSelect) {
   sortSelect.addEventListener("change", () => {
     currentSort = sortSelect.value;
-    page = 1;
-    hasMore = true;
-    list.innerHTML = "";
-    if (moreBtn) moreBtn.classList.remove("hidden");
-    loadPage();
+    reloadList();
+  });
+}
+
+if (filterSelect) {
+  filterSelect.addEventListener("change", () => {
+    currentText = filterSelect.value;
+    reloadList();
   });
 }
 
@@ -126,11 +160,7 @@ if (randomBtn) {
 
 function triggerSearch() {
   currentQuery = searchInput ? searchInput.value.trim() : "";
-  page = 1;
-  hasMore = true;
-  list.innerHTML = "";
-  if (moreBtn) moreBtn.classList.remove("hidden");
-  loadPage();
+  reloadList();
 }
 
 if (searchBtn) {
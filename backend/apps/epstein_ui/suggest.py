@@ -0,0 +1,211 @@
+"""Memory-mapped filename autocomplete index, built by index_pdfs."""
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db.models.functions import Collate
+
+from .models import PdfDocument
+
+SUGGEST_MAGIC = b"PDFSUGG1"
+# magic, version stamp, entries, grams, string bytes, postings
+SUGGEST_HEADER = struct.Struct("<8sQIIII")
+# trigram, posting offset, posting count
+SUGGEST_GRAM = struct.Struct("<3sxII")
+# How often a worker checks whether index_pdfs replaced the file.
+SUGGEST_RELOAD_INTERVAL = 2.0
+# Trigram lists intersected per substring lookup; longer lists cost more than they prune.
+SUGGEST_INTERSECT_LISTS = 3
+
+_loaded = None
+_loaded_lock = threading.Lock()
+_checked_at = 0.0
+
+
+def _suggest_index_path() -> Path:
+    return Path(settings.MEDIA_ROOT) / "search" / "suggest.idx"
+
+
+def _trigrams(name: bytes) -> set:
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+def _build_suggest_index(rows) -> int:
+    """Write the index for (search_name, filename) rows sorted by search_name.
+
+    Layout after the header: entry offsets (u32, one past the end too),
+    "search_name\\0filename" strings, the sorted trigram table, and each
+    trigram's ascending entry ids. Entries are in search_name order, so a
+    prefix is one binary search and posting order is alphabetical. The
+    file is replaced atomically; returns the number of entries.
+    """
+    offsets = array("I", [0])
+    strings = bytearray()
+    postings = {}
+    for entry_id, (search_name, filename) in enumerate(rows):
+        name = search_name.encode()
+        strings += name + b"\0" + filename.encode()
+        offsets.append(len(strings))
+        for gram in _trigrams(name):
+            postings.setdefault(gram, array("I")).append(entry_id)
+    strings += b"\0" * (-len(strings) % 4)
+
+    grams = sorted(postings)
+    table = bytearray()
+    flat = array("I")
+    for gram in grams:
+        table += SUGGEST_GRAM.pack(gram, len(flat), len(postings[gram]))
+        flat.extend(postings[gram])
+
+    path = _suggest_index_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, "wb") as handle:
+        handle.write(SUGGEST_HEADER.pack(
+            SUGGEST_MAGIC, time.time_ns(), len(offsets) - 1, len(grams), len(strings), len(flat)
+        ))
+        handle.write(offsets.tobytes())
+        handle.write(strings)
+        handle.write(table)
+        handle.write(flat.tobytes())
+    os.replace(tmp_path, path)
+    return len(offsets) - 1
+
+
+def _rebuild_suggest_index() -> int:
+    """Rebuild the index from PdfDocument; returns the number of entries."""
+    # Byte order ("C" collation), to match the binary search in lookup().
+    rows = (
+        PdfDocument.objects.order_by(Collate("search_name", "C"), "filename")
+        .values_list("search_name", "filename")
+        .iterator(chunk_size=5000)
+    )
+    return _build_suggest_index(rows)
+
+
+class _SuggestIndex:
+    """Read-only view of one index file.
+
+    The file is mmap'd, so every gunicorn worker shares the same page-cache
+    pages and nothing is copied onto the Python heap.
+    """
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, entries, grams, string_bytes, posting_count = (
+            SUGGEST_HEADER.unpack_from(self._map)
+        )
+        if magic != SUGGEST_MAGIC:
+            raise ValueError(f"{path} is not a suggestion index")
+        view = memoryview(self._map)
+        start = SUGGEST_HEADER.size
+        self._offsets = view[start:start + (entries + 1) * 4].cast("I")
+        start += (entries + 1) * 4
+        self._strings = view[start:start + string_bytes]
+        start += string_bytes
+        self._grams = view[start:start + grams * SUGGEST_GRAM.size]
+        self._gram_count = grams
+        start += grams * SUGGEST_GRAM.size
+        self._postings = view[start:start + posting_count * 4].cast("I")
+        self.entries = entries
+
+    def _entry(self, entry_id: int) -> tuple[bytes, bytes]:
+        name, _, filename = bytes(
+            self._strings[self._offsets[entry_id]:self._offsets[entry_id + 1]]
+        ).partition(b"\0")
+        return name, filename
+
+    def _lower_bound(self, term: bytes) -> int:
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _posting(self, gram: bytes) -> Optional[memoryview]:
+        low, high = 0, self._gram_count
+        while low < high:
+            middle = (low + high) // 2
+            key, offset, count = SUGGEST_GRAM.unpack_from(self._grams, middle * SUGGEST_GRAM.size)
+            if key == gram:
+                return self._postings[offset:offset + count]
+            if key < gram:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup(self, term: str, limit: int) -> list[str]:
+        """Filenames whose search_name contains term: exact, prefixes, then substrings.
+
+        term must already be normalized with indexing._search_name.
+        """
+        needle = term.encode()
+        found = []
+        seen = set()
+        entry_id = self._lower_bound(needle)
+        while entry_id < self.entries and len(found) < limit:
+            name, filename = self._entry(entry_id)
+            if not name.startswith(needle):
+                break
+            found.append(filename.decode())
+            seen.add(entry_id)
+            entry_id += 1
+        if len(found) >= limit or len(needle) < 3:
+            return found
+
+        # Every substring match is in all of the term's trigram lists.
+        # Intersect the shortest few, then confirm candidates by substring test.
+        postings = [self._posting(gram) for gram in _trigrams(needle)]
+        if any(posting is None for posting in postings):
+            return found
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:SUGGEST_INTERSECT_LISTS]:
+            candidates.intersection_update(posting)
+        for entry_id in sorted(candidates - seen):
+            name, filename = self._entry(entry_id)
+            if needle in name:
+                found.append(filename.decode())
+                if len(found) >= limit:
+                    break
+        return found
+
+
+def _suggest_index() -> Optional[_SuggestIndex]:
+    """This process's view of the index, reopened when index_pdfs rebuilds it.
+
+    At most every SUGGEST_RELOAD_INTERVAL seconds the file's header is
+    read, and a new version stamp means a rebuild. Returns None when no
+    index has been built yet.
+    """
+    global _loaded, _checked_at
+    now = time.monotonic()
+    if _loaded is not None and now - _checked_at < SUGGEST_RELOAD_INTERVAL:
+        return _loaded
+    with _loaded_lock:
+        if _loaded is not None and now - _checked_at < SUGGEST_RELOAD_INTERVAL:
+            return _loaded
+        _checked_at = now
+        try:
+            with open(_suggest_index_path(), "rb") as handle:
+                version = SUGGEST_HEADER.unpack(handle.read(SUGGEST_HEADER.size))[1]
+        except (OSError, struct.error):
+            _loaded = None
+            return None
+        if _loaded is None or _loaded.version != version:
+            try:
+                _loaded = _SuggestIndex(_suggest_index_path())
+            except (OSError, ValueError, struct.error):
+                _loaded = None
+        return _loaded
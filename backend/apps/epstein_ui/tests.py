@@ -1,3 +1,384 @@
-from django.test import TestCase
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from . import rendering, signals, views
+from .indexing import _IndexWriter, _refresh_site_stats
+from .models import PdfComment, PdfCommentVote, PdfDocument, PdfVote, SearchEntry, SiteStats, TextItem
+from .votes import _toggle_vote
+
+
+class ToggleVoteConcurrencyTests(TransactionTestCase):
+    """Racing clicks through votes._toggle_vote, each on its own connection."""
+
+    ROUNDS = 5
+
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user("owner")
+        self.voters = [User.objects.create_user(f"voter{i}") for i in range(4)]
+        self.doc = PdfDocument.objects.create(filename="race.pdf", path="/race.pdf")
+        self.comment = PdfComment.objects.create(pdf=self.doc, user=self.owner, body="race")
+
+    def _race(self, clicks):
+        """Start every (vote_model, target, user, value) click at the same moment."""
+        barrier = threading.Barrier(len(clicks))
+        errors = []
+
+        def click(args):
+            try:
+                barrier.wait()
+                _toggle_vote(*args)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click, args=(args,)) for args in clicks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assertTalliesExact(self, vote_model, target, field):
+        target.refresh_from_db()
+        votes = vote_model.objects.filter(**{field: target})
+        self.assertEqual(target.upvotes, votes.filter(value=1).count())
+        self.assertEqual(target.downvotes, votes.filter(value=-1).count())
+
+    def test_identical_clicks(self):
+        voter = self.voters[0]
+        for _ in range(self.ROUNDS):
+            self._race([(PdfCommentVote, self.comment, voter, 1)] * 8)
+            self.assertLessEqual(PdfCommentVote.objects.filter(user=voter).count(), 1)
+            self.assertTalliesExact(PdfCommentVote, self.comment, "comment")
+
+    def test_opposite_clicks(self):
+        voter = self.voters[0]
+        for _ in range(self.ROUNDS):
+            self._race([(PdfCommentVote, self.comment, voter, value) for value in (1, -1) * 4])
+            self.assertLessEqual(PdfCommentVote.objects.filter(user=voter).count(), 1)
+            self.assertTalliesExact(PdfCommentVote, self.comment, "comment")
+
+    def test_many_users_keep_vote_score(self):
+        clicks = [
+            (PdfVote, self.doc, voter, value)
+            for voter in self.voters
+            for value in (1, -1, 1)
+        ]
+        for _ in range(self.ROUNDS):
+            self._race(clicks)
+            self.assertTalliesExact(PdfVote, self.doc, "pdf")
+            self.assertEqual(self.doc.vote_score, self.doc.upvotes - self.doc.downvotes)
+
+    def test_deleted_target(self):
+        comment_id = self.comment.id
+        PdfComment.objects.filter(id=comment_id).delete()
+        self.assertIsNone(_toggle_vote(PdfCommentVote, self.comment, self.voters[0], 1))
+        self.client.force_login(self.voters[0])
+        response = self.client.post(
+            "/pdf-comment-votes/",
+            {"comment_id": comment_id, "value": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class VoteDeleteSignalTests(TestCase):
+    """Tallies when votes are deleted through the ORM rather than _toggle_vote."""
+
+    def setUp(self):
+        User = get_user_model()
+        self.voter = User.objects.create_user("voter")
+        self.doc = PdfDocument.objects.create(filename="cascade.pdf", path="/cascade.pdf")
+        self.comment = PdfComment.objects.create(pdf=self.doc, user=self.voter, body="cascade")
+        _toggle_vote(PdfVote, self.doc, self.voter, 1)
+        _toggle_vote(PdfCommentVote, self.comment, self.voter, -1)
+
+    def assertNoTallyUpdates(self, delete):
+        with CaptureQueriesContext(connection) as queries:
+            delete()
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE") and "votes" in q["sql"]]
+        self.assertEqual(updates, [])
+        self.assertFalse(PdfCommentVote.objects.exists())
+
+    def test_instance_delete(self):
+        self.assertNoTallyUpdates(self.doc.delete)
+
+    def test_queryset_delete(self):
+        self.assertNoTallyUpdates(PdfDocument.objects.filter(id=self.doc.id).delete)
+
+    def test_queryset_delete_of_the_target(self):
+        self.assertNoTallyUpdates(PdfComment.objects.filter(id=self.comment.id).delete)
+
+    def test_user_delete_updates_tallies(self):
+        owner = get_user_model().objects.create_user("owner")
+        PdfComment.objects.filter(id=self.comment.id).update(user=owner)
+        self.voter.delete()
+        self.doc.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual((self.doc.upvotes, self.doc.vote_score), (0, 0))
+        self.assertEqual(self.comment.downvotes, 0)
+
+
+class StreamPdfPagesTests(TestCase):
+    """random-pdf/?stream=1 with a fake renderer that holds pages 2 and up."""
+
+    PAGES = 3
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.pdf_path = Path(media) / "stream.pdf"
+        self.pdf_path.write_bytes(b"%PDF-1.4\n")
+        PdfDocument.objects.create(filename=self.pdf_path.name, path=str(self.pdf_path))
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        for name, fake in (
+            ("_get_pdf_page_sizes", lambda pdf_path: [(1275, 1650)] * self.PAGES),
+            ("_render_pdf_page", self._render_page),
+        ):
+            patcher = mock.patch.object(rendering, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _render_page(self, pdf_path, page_num, cache_key=None, wait=False):
+        self.assertTrue(wait)
+        if page_num > 1:
+            self.release.wait(10)
+        out_dir = rendering._pdf_cache_dir(pdf_path, cache_key)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"page-{page_num}.png"
+        Image.new("L", (1275, 1650), 255).save(path)
+        entry = rendering._manifest_page_entry(path, "pdftoppm")
+        rendering._record_rendered_page(pdf_path, out_dir, page_num, entry)
+        return path
+
+    def _stream(self):
+        response = self.client.get("/random-pdf/", {"stream": 1})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return response, (json.loads(line) for line in response.streaming_content)
+
+    def test_first_page_before_the_rest_render(self):
+        response, lines = self._stream()
+        self.assertEqual(next(lines)["page_count"], self.PAGES)
+        self.assertEqual(next(lines)["page"], 1)
+        self.assertFalse(self.release.is_set())
+        self.release.set()
+        self.assertEqual([line["page"] for line in lines], [2, 3])
+
+    def test_background_renders_are_capped(self):
+        other = self.pdf_path.with_name("other.pdf")
+        other.write_bytes(b"%PDF-1.4\n")
+        with mock.patch.object(rendering, "STREAM_RENDER_THREADS", 1):
+            response, lines = self._stream()
+            next(lines)
+            self.assertEqual(next(lines)["page"], 1)
+            with self.assertRaises(rendering.RenderBusy):
+                next(rendering._iter_rendered_pages(other))
+
+    def test_render_continues_after_the_client_leaves(self):
+        response, lines = self._stream()
+        next(lines)
+        self.assertEqual(next(lines)["page"], 1)
+        out_dir = rendering._pdf_cache_dir(self.pdf_path, PdfDocument.objects.get().cache_key)
+        response.close()
+        self.release.set()
+        deadline = time.monotonic() + 10
+        while not rendering._manifest_complete_pages(out_dir) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(rendering._manifest_complete_pages(out_dir)), self.PAGES)
+
+
+class SingleFlightRenderTests(SimpleTestCase):
+    """Parallel _render_pdf_page calls against a slow fake pdftoppm."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.media = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=str(self.media))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.runs = []
+        for name, fake in (
+            ("_get_pdf_page_sizes", lambda pdf_path: [(1275, 1650)] * 3),
+            ("_scan_pages", lambda pdf_path, first=1, last=None: {}),
+            ("_run_tool", self._run_tool),
+        ):
+            patcher = mock.patch.object(rendering, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _run_tool(self, cmd, pages=1):
+        self.runs.append(cmd)
+        time.sleep(0.2)
+        Image.new("L", (1275, 1650), 255).save(f"{cmd[-1]}.png")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    def _pdf(self, name):
+        pdf_path = self.media / name
+        pdf_path.write_bytes(b"%PDF-1.4\n")
+        return pdf_path
+
+    def _race(self, calls):
+        barrier = threading.Barrier(len(calls))
+        results = []
+
+        def call(args):
+            barrier.wait()
+            results.append(rendering._render_pdf_page(*args))
+
+        threads = [threading.Thread(target=call, args=(args,)) for args in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_parallel_requests_render_once(self):
+        pdf_path = self._pdf("single.pdf")
+        results = self._race([(pdf_path, 1)] * self.THREADS)
+        self.assertEqual(len(self.runs), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(results[0].exists())
+
+    def test_lock_files_stay_bounded(self):
+        for n in range(4):
+            pdf_path = self._pdf(f"doc{n}.pdf")
+            for page_num in (1, 2, 3):
+                rendering._render_pdf_page(pdf_path, page_num)
+        self.assertEqual(len(self.runs), 12)
+        locks = [path.stem for path in (self.media / ".locks").glob("*.lock")]
+        self.assertFalse([name for name in locks if name.startswith("pdf_")])
+
+
+class BrowseTotalTests(TestCase):
+    """views._browse_total with the planner's estimate mocked, and for real."""
+
+    def setUp(self):
+        for n in range(3):
+            PdfDocument.objects.create(filename=f"total{n}.pdf", path=f"/total{n}.pdf")
+
+    def _explain(self, plan):
+        return mock.patch.object(QuerySet, "explain", return_value=json.dumps(plan))
+
+    def test_large_estimate_is_approximate(self):
+        plan = {"Plan": {"Plan Rows": 250000}}
+        for shape in (plan, [plan]):
+            with self._explain(shape), self.assertNumQueries(0):
+                self.assertEqual(views._browse_total(PdfDocument.objects.all()), (250000, True))
+
+    def test_small_estimate_is_counted(self):
+        with self._explain({"Plan": {"Plan Rows": 12}}):
+            self.assertEqual(views._browse_total(PdfDocument.objects.all()), (3, False))
+
+    def test_driver_plan_shape(self):
+        with mock.patch.object(views, "BROWSE_EXACT_COUNT_LIMIT", 1):
+            total, approximate = views._browse_total(PdfDocument.objects.all())
+        self.assertTrue(approximate)
+        self.assertGreaterEqual(total, 1)
+
+
+class ResolvePdfTests(TestCase):
+    """Page and tile URLs for names that aren't in the index."""
+
+    def test_unknown_name_is_404_without_a_disk_scan(self):
+        with mock.patch.object(views, "_list_pdfs_on_disk", side_effect=AssertionError("disk scan")):
+            for url in ("/pdf/missing/page/1.png", "/pdf/missing/page/1/tile/150/0/0"):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_disk_scan_when_the_index_is_unreadable(self):
+        with mock.patch.object(views, "_list_pdfs_on_disk", return_value=[]) as scan:
+            with mock.patch.object(PdfDocument.objects, "filter", side_effect=views.ProgrammingError):
+                self.assertIsNone(views._resolve_pdf("missing.pdf"))
+        scan.assert_called_once()
+
+
+class IndexWriterTests(TestCase):
+    """_IndexWriter.flush racing another sync that indexed a path first."""
+
+    def test_total_counts_only_inserted_rows(self):
+        PdfDocument.objects.create(filename="taken.pdf", path="/data/taken.pdf")
+        before = _refresh_site_stats().total_pdfs
+        writer = _IndexWriter()
+        writer.to_create = [
+            PdfDocument(filename=name, path=f"/data/{name}", directory="/data")
+            for name in ("taken.pdf", "new.pdf")
+        ]
+        writer.flush()
+        self.assertEqual(writer.created, 1)
+        self.assertEqual(SiteStats.objects.get().total_pdfs, before + 1)
+
+
+class RenderCacheStatsTests(TestCase):
+    """Who may read /render-cache-stats/."""
+
+    URL = "/render-cache-stats/"
+
+    def test_anonymous_and_regular_users_are_refused(self):
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user("reader"))
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+
+    def test_staff(self):
+        self.client.force_login(get_user_model().objects.create_user("ops", is_staff=True))
+        self.assertIn("admission", self.client.get(self.URL).json())
+
+    def test_token(self):
+        with mock.patch.dict("os.environ", {"PDF_CACHE_STATS_TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get(self.URL, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(self.client.get(self.URL, HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+
+
+class AnnotationSaveTextItemTests(TestCase):
+    """Re-saving an annotation only re-indexes overlays whose text changed."""
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user("annotator"))
+        self.items = [{"x": 10, "y": 20, "text": "flight log"}, {"x": 30, "y": 40, "text": "ledger"}]
+        self.hash = "6f1c2f4e-8a4b-4c1e-9a55-2f0b9d3c7e11"
+
+    def _save(self, items):
+        annotation = {"id": "c1", "hash": self.hash, "x": 1, "y": 2, "note": "", "textItems": items}
+        with mock.patch.object(signals, "_index_search_entry", wraps=signals._index_search_entry) as index:
+            response = self.client.post(
+                "/annotations/",
+                {"pdf": "items.pdf", "annotations": [annotation]},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        return [call.args[1].text for call in index.call_args_list if call.args[0] == SearchEntry.KIND_TEXT_ITEM]
+
+    def test_unchanged_and_moved_items_are_not_reindexed(self):
+        self.assertEqual(self._save(self.items), ["flight log", "ledger"])
+        ids = list(TextItem.objects.order_by("id").values_list("id", flat=True))
+        self.assertEqual(self._save(self.items), [])
+        self.assertEqual(self._save([{**self.items[0], "x": 15}, self.items[1]]), [])
+        self.assertEqual(list(TextItem.objects.order_by("id").values_list("id", flat=True)), ids)
+        self.assertEqual(TextItem.objects.get(id=ids[0]).x, 15)
+
+    def test_text_changes_and_removals(self):
+        self._save(self.items)
+        self.assertEqual(self._save([{**self.items[0], "text": "flight logs"}]), ["flight logs"])
+        self.assertEqual(
+            list(SearchEntry.objects.filter(kind=SearchEntry.KIND_TEXT_ITEM).values_list("body", flat=True)),
+            ["flight logs"],
+        )
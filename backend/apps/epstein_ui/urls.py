@@ -6,6 +6,16 @@ urlpatterns = [
     path("", views.start_page, name="start"),
     path("random-pdf/", views.random_pdf, name="random_pdf"),
     path("search-pdf/", views.search_pdf, name="search_pdf"),
+    path("search-text/", views.search_text, name="search_text"),
+    path("search-annotations/", views.search_annotations, name="search_annotations"),
+    path("pdf/<str:pdf_slug>/page/<int:page_num>.png", views.pdf_page, name="pdf_page"),
+    path(
+        "pdf/<str:pdf_slug>/page/<int:page_num>/tile/<int:dpi>/<int:col>/<int:row>",
+        views.pdf_page_tile,
+        name="pdf_page_tile",
+    ),
+    path("pdf/<str:pdf_slug>/thumb.jpg", views.pdf_thumbnail, name="pdf_thumbnail"),
+    path("render-cache-stats/", views.render_cache_stats, name="render_cache_stats"),
     path("search-suggestions/", views.search_suggestions, name="search_suggestions"),
     path("browse/", views.browse, name="browse"),
     path("browse-list/", views.browse_list, name="browse_list"),
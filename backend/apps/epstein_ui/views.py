@@ -1,23 +1,29 @@
-import hashlib
+import base64
+import hmac
 import json
 import os
 import random
-import subprocess
+import time
 import urllib.request
 import urllib.error
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 
-from PIL import Image
-import shutil
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count, Q
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.exceptions import ValidationError
+from django.db.models import Case, F, Q, Value, When
 from django.db.utils import OperationalError, ProgrammingError
+from django.urls import NoReverseMatch, reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
 
 from .models import (
     Annotation,
@@ -33,189 +39,269 @@ from .models import (
     PdfCommentReplyVote,
     PdfCommentVote,
     Notification,
+    SiteStats,
 )
+from .indexing import (
+    _identity_changed,
+    _list_pdfs_on_disk,
+    _pdf_identity_fields,
+    _refresh_site_stats,
+    _search_name,
+    _sync_pdf_index,
+)
+from .rendering import (
+    PAGE_CONTENT_TYPES,
+    RENDER_DPI,
+    RenderBusy,
+    TILE_DPIS,
+    TILE_SIZE,
+    _cache_disabled,
+    _cache_key_for_path,
+    _file_identity,
+    _iter_rendered_pages,
+    _page_manifest,
+    _read_thumbnail,
+    _render_admission_stats,
+    _pdf_cache_dir,
+    _render_page_tile,
+    _render_pdf_page,
+    _render_stats,
+    _reset_pdf_cache,
+)
+from .fulltext import (
+    ANNOTATION_SEARCH_PAGE_SIZE,
+    TEXT_SEARCH_PAGE_SIZE,
+    _search_entries,
+    _search_pdf_text,
+)
+from .suggest import _suggest_index
+from .votes import _own_vote, _own_vote_prefetch, _toggle_vote
+
+# Page URLs carry the document's cache key, so a response to one never changes.
+PAGE_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# nginx `internal` location aliased to MEDIA_ROOT, used with PDF_PAGE_SENDFILE=nginx.
+PAGE_ACCEL_PREFIX = os.environ.get("PDF_PAGE_ACCEL_PREFIX", "/_render-cache/")
+# Ranked filenames returned by search-pdf/ alongside the opened match.
+SEARCH_MATCH_LIMIT = 10
+SUGGESTION_LIMIT = 12
+# browse-list/ sort -> (sort key, descending); filename and id break ties.
+# Each has a pdfdoc_<sort>_idx index in the same order (see models.py).
+BROWSE_SORTS = {
+    "name": (None, False),
+    "promising": ("vote_score", True),
+    "least": ("vote_score", False),
+    "ann_most": ("annotation_count", True),
+    "ann_least": ("annotation_count", False),
+    "longest": ("page_count", True),
+    "largest": ("file_size", True),
+    "newest": ("file_mtime", True),
+}
+BROWSE_PAGE_SIZE = 50
+BROWSE_EXACT_COUNT_LIMIT = 10000
+# Seconds each worker reuses the start page numbers before reading them again.
+START_STATS_TTL = 30
+_start_stats = None
+_start_stats_at = 0.0
+# random-pdf/?mode=...; each has a partial random_key index with the same condition.
+RANDOM_PDF_MODES = {
+    "unannotated": Q(annotation_count=0),
+    "promising": Q(vote_score__gt=0),
+    "unrendered": Q(rendered=False),
+}
 
-DATA_DIR = Path(os.environ.get("DATA_DIR", Path(__file__).resolve().parents[3] / "data"))
-
-
-def _list_pdfs_on_disk() -> list[Path]:
-    """Return all PDF paths under the shared data directory."""
-    if not DATA_DIR.exists():
-        return []
-    return [p for p in DATA_DIR.rglob("*.pdf") if p.is_file()]
 
+def _sync_pdf_index_on_request() -> None:
+    """Optional indexing on request; disabled by default for performance."""
+    if os.environ.get("PDF_INDEX_SYNC_ON_REQUEST", "").strip().lower() in {"1", "true", "yes"}:
+        _sync_pdf_index()
 
-def _sync_pdf_index() -> list[PdfDocument]:
-    """Sync the PdfDocument table with PDFs on disk."""
-    pdf_paths = _list_pdfs_on_disk()
-    if not pdf_paths:
-        try:
-            PdfDocument.objects.all().delete()
-        except (OperationalError, ProgrammingError):
-            pass
-        return []
 
-    seen_paths = {str(p) for p in pdf_paths}
+def _pdf_cache_key(pdf_doc: PdfDocument) -> str:
+    """Render cache key for an indexed PDF, re-keying it if the file changed on disk."""
+    pdf_path = Path(pdf_doc.path)
+    try:
+        identity = _file_identity(pdf_path)
+        if not _identity_changed(pdf_doc, identity):
+            return pdf_doc.cache_key
+        fields = _pdf_identity_fields(pdf_path)
+    except OSError:
+        return pdf_doc.cache_key
     try:
-        existing = {doc.path: doc for doc in PdfDocument.objects.all()}
+        PdfDocument.objects.filter(id=pdf_doc.id).update(rendered=False, **fields)
     except (OperationalError, ProgrammingError):
-        return []
-
-    to_create = []
-    for path in pdf_paths:
-        path_str = str(path)
-        if path_str not in existing:
-            to_create.append(PdfDocument(path=path_str, filename=path.name))
-    if to_create:
-        PdfDocument.objects.bulk_create(to_create, ignore_conflicts=True)
-
-    stale = set(existing.keys()) - seen_paths
-    if stale:
-        PdfDocument.objects.filter(path__in=stale).delete()
+        pass
+    return fields["cache_key"]
 
-    return list(PdfDocument.objects.filter(path__in=seen_paths))
 
+def _resolve_pdf(filename: str):
+    """Find (path, cache key) for an indexed PDF filename.
 
-def _sync_pdf_index_on_request() -> None:
-    """Optional indexing on request; disabled by default for performance."""
-    if os.environ.get("PDF_INDEX_SYNC_ON_REQUEST", "").strip().lower() in {"1", "true", "yes"}:
-        _sync_pdf_index()
+    Names missing from the index resolve to None. The disk scan is only a
+    fallback for when the index can't be read.
+    """
+    try:
+        pdf_doc = PdfDocument.objects.filter(filename=filename).first()
+    except (OperationalError, ProgrammingError):
+        for path in _list_pdfs_on_disk():
+            if path.name == filename:
+                return path, _cache_key_for_path(path)
+        return None
+    if pdf_doc is None:
+        return None
+    return Path(pdf_doc.path), _pdf_cache_key(pdf_doc)
 
 
-def _sync_pdf_index_on_request() -> None:
-    """Optional indexing on request; disabled by default for performance."""
-    if os.environ.get("PDF_INDEX_SYNC_ON_REQUEST", "").strip().lower() in {"1", "true", "yes"}:
-        _sync_pdf_index()
+def _pdf_page_metadata(pdf_path: Path, cache_key: str) -> list[dict]:
+    """Page URLs and sizes for a PDF, served from its page manifest.
 
-def _get_pdf_pages(pdf_path: Path) -> int:
-    """Best-effort page count using pdfinfo (falls back to 1)."""
-    pdfinfo = shutil.which("pdfinfo")
-    if pdfinfo is None:
-        return 1
-    result = subprocess.run(
-        [pdfinfo, str(pdf_path)],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
-    if result.returncode != 0:
-        return 1
-    for line in result.stdout.splitlines():
-        if line.lower().startswith("pages:"):
-            parts = line.split(":", 1)
-            if len(parts) == 2:
-                try:
-                    return int(parts[1].strip())
-                except ValueError:
-                    return 1
-    return 1
-
-
-def _cache_disabled() -> bool:
-    return os.environ.get("DISABLE_PDF_CACHE", "").strip().lower() in {"1", "true", "yes"}
-
-def _extract_pdf_images(pdf_path: Path, out_dir: Path) -> list[Path]:
-    """Try to extract embedded images from the PDF. Returns list of PNG paths."""
-    out_base = out_dir / "img"
-    cmd = [
-        "pdfimages",
-        "-png",
-        str(pdf_path),
-        str(out_base),
+    Nothing is rendered here. URLs carry the cache key, so a changed file
+    never reuses browser-cached pages.
+    """
+    out_dir = _pdf_cache_dir(pdf_path, cache_key)
+    if _cache_disabled():
+        _reset_pdf_cache(out_dir)
+    manifest = _page_manifest(pdf_path, out_dir)
+    slug = pdf_path.name.replace(".pdf", "")
+    return [
+        {
+            "url": f"{reverse('pdf_page', args=[slug, page_num])}?v={cache_key}",
+            "width": page["width"],
+            "height": page["height"],
+        }
+        for page_num, page in enumerate(manifest["pages"], start=1)
     ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if result.returncode != 0:
-        return []
-    return sorted(out_dir.glob("img-*.png"))
 
 
-def _render_pdf_pages(pdf_path: Path) -> list[Path]:
-    """Render PDF pages into cached PNGs under MEDIA_ROOT."""
-    media_dir = Path(settings.MEDIA_ROOT)
-    media_dir.mkdir(parents=True, exist_ok=True)
-    digest = hashlib.sha256(str(pdf_path).encode("utf-8")).hexdigest()[:16]
-    out_dir = media_dir / f"pdf_{digest}"
-    out_dir.mkdir(parents=True, exist_ok=True)
-    out_base = out_dir / "page"
+def _pdf_tile_scheme(pdf_path: Path, cache_key: str) -> dict:
+    """Zoom tile levels and URL template for a document's pages.
 
-    if _cache_disabled():
-        for cached in media_dir.glob("pdf_*"):
-            if cached == out_dir:
-                continue
-            shutil.rmtree(cached, ignore_errors=True)
-        for png in out_dir.glob("page-*.png"):
-            png.unlink()
-    else:
-        existing = sorted(out_dir.glob("page-*.png"))
-        if existing:
-            return existing
-
-    extracted = _extract_pdf_images(pdf_path, out_dir)
-    if extracted:
-        return extracted
-
-    cmd = [
-        "pdftoppm",
-        "-r",
-        "150",
-        "-png",
-        str(pdf_path),
-        str(out_base),
-    ]
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(result.stderr.strip() or "pdftoppm failed")
-    rendered = sorted(out_dir.glob("page-*.png"))
-    if not rendered:
-        raise RuntimeError("pdftoppm produced no pages")
-    return rendered
+    At each DPI a page of layout size w x h (at layout_dpi) spans
+    ceil(w * dpi / layout_dpi / size) columns, and likewise rows.
+    """
+    slug = pdf_path.name.replace(".pdf", "")
+    # The quoted document prefix of the tile route; the client fills in the rest.
+    base = reverse("pdf_page_tile", args=[slug, 0, 0, 0, 0]).rsplit("/", 5)[0]
+    return {
+        "size": TILE_SIZE,
+        "layout_dpi": RENDER_DPI,
+        "dpis": list(TILE_DPIS),
+        "url": f"{base}/{{page}}/tile/{{dpi}}/{{col}}/{{row}}?v={cache_key}",
+    }
 
 
-def start_page(request):
-    """Render the landing page with project stats."""
-    try:
-        total_pdfs = PdfDocument.objects.count()
-        annotated_pdfs = PdfDocument.objects.filter(annotation_count__gt=0).count()
-        total_annotations = Annotation.objects.count()
-        total_users = User.objects.count()
-        total_comments = PdfComment.objects.count() + AnnotationComment.objects.count()
+def _stream_pdf_pages(pdf_path: Path, cache_key: str, pages: list[dict], extra: Optional[dict] = None):
+    """Yield NDJSON lines: document info first, then each page once it is rendered.
 
-        coverage_pct = round((annotated_pdfs / total_pdfs * 100) if total_pdfs > 0 else 0)
+    Pages render in order in a background thread and each line goes out as
+    its page appears in the manifest, so page 1 arrives after one pdftoppm
+    run however long the document is.
+    """
+    yield json.dumps({
+        "pdf": pdf_path.name,
+        "page_count": len(pages),
+        "tiles": _pdf_tile_scheme(pdf_path, cache_key),
+        **(extra or {}),
+    }) + "\n"
+    rendered = _iter_rendered_pages(pdf_path, cache_key)
+    page_num = 1
+    while True:
+        try:
+            page_num, entry = next(rendered)
+        except StopIteration:
+            return
+        except RenderBusy as exc:
+            yield json.dumps({"page": page_num, "error": "busy", "retry_after": exc.retry_after}) + "\n"
+            return
+        except Exception as exc:
+            yield json.dumps({"page": page_num, "error": str(exc)}) + "\n"
+            return
+        page = {**pages[page_num - 1], "width": entry["width"], "height": entry["height"]}
+        yield json.dumps({"page": page_num, **page}) + "\n"
+        page_num += 1
+
+
+def _pdf_pages_response(
+    request, pdf_path: Path, cache_key: Optional[str], extra: Optional[dict] = None
+):
+    """Page metadata as JSON, or as an NDJSON stream with ?stream=1.
+
+    extra is merged into the JSON body, or into the stream's first line.
+    """
+    cache_key = cache_key or _cache_key_for_path(pdf_path)
+    try:
+        pages = _pdf_page_metadata(pdf_path, cache_key)
+    except Exception as exc:
+        return JsonResponse({"error": str(exc)}, status=500)
 
-        most_discussed = list(
-            PdfDocument.objects.annotate(
-                discussion_count=Count("comments")
-            )
-            .filter(discussion_count__gt=0)
-            .order_by("-discussion_count")[:5]
-            .values("filename", "discussion_count")
+    if request.GET.get("stream", "").strip().lower() in {"1", "true", "yes"}:
+        response = StreamingHttpResponse(
+            _stream_pdf_pages(pdf_path, cache_key, pages, extra),
+            content_type="application/x-ndjson",
         )
+        # Ask nginx not to buffer, or the client sees nothing until the end.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    return JsonResponse({
+        "pages": pages,
+        "pdf": pdf_path.name,
+        "tiles": _pdf_tile_scheme(pdf_path, cache_key),
+        **(extra or {}),
+    })
+
 
-        most_promising = list(
+def _start_page_stats() -> dict:
+    """Start page numbers, cached in this process for START_STATS_TTL seconds.
+
+    A refresh is one primary-key read of SiteStats and two top-5 index
+    scans. The row is recounted here only if index_pdfs hasn't created it.
+    """
+    global _start_stats, _start_stats_at
+    now = time.monotonic()
+    if _start_stats is not None and now - _start_stats_at < START_STATS_TTL:
+        return _start_stats
+    stats = SiteStats.objects.filter(id=SiteStats.ROW_ID).first() or _refresh_site_stats()
+    _start_stats = {
+        "total_pdfs": stats.total_pdfs,
+        "annotated_pdfs": stats.annotated_pdfs,
+        "total_annotations": stats.total_annotations,
+        "total_users": stats.total_users,
+        "total_comments": stats.total_comments,
+        "coverage_pct": round(
+            (stats.annotated_pdfs / stats.total_pdfs * 100) if stats.total_pdfs > 0 else 0
+        ),
+        # Served by pdfdoc_discussed_idx and pdfdoc_promising_idx.
+        "most_discussed": list(
+            PdfDocument.objects.filter(comment_count__gt=0)
+            .order_by("-comment_count", "filename")[:5]
+            .values("filename", discussion_count=F("comment_count"))
+        ),
+        "most_promising": list(
             PdfDocument.objects.filter(vote_score__gt=0)
-            .order_by("-vote_score")[:5]
+            .order_by("-vote_score", "filename")[:5]
             .values("filename", "vote_score")
-        )
+        ),
+    }
+    _start_stats_at = now
+    return _start_stats
+
+
+def start_page(request):
+    """Render the landing page with project stats."""
+    try:
+        context = _start_page_stats()
     except (OperationalError, ProgrammingError):
-        total_pdfs = 0
-        annotated_pdfs = 0
-        total_annotations = 0
-        total_users = 0
-        total_comments = 0
-        coverage_pct = 0
-        most_discussed = []
-        most_promising = []
-
-    return render(request, "epstein_ui/start.html", {
-        "total_pdfs": total_pdfs,
-        "annotated_pdfs": annotated_pdfs,
-        "total_annotations": total_annotations,
-        "total_users": total_users,
-        "total_comments": total_comments,
-        "coverage_pct": coverage_pct,
-        "most_discussed": most_discussed,
-        "most_promising": most_promising,
-    })
+        context = {
+            "total_pdfs": 0,
+            "annotated_pdfs": 0,
+            "total_annotations": 0,
+            "total_users": 0,
+            "total_comments": 0,
+            "coverage_pct": 0,
+            "most_discussed": [],
+            "most_promising": [],
+        }
+    return render(request, "epstein_ui/start.html", context)
 
 
 def index(request, pdf_slug=None, target_hash=None):
@@ -293,55 +379,94 @@ def feature_request(request):
         return JsonResponse({"error": "Failed to create issue"}, status=502)
 
 
+def _random_pdf_document(mode: str = "") -> Optional[PdfDocument]:
+    """Pick a random indexed document with one index probe.
+
+    Takes the first document at or after a random point in random_key
+    order, wrapping around to the lowest key. Cost doesn't grow with the
+    table. Falls back to any document when the mode matches none.
+    """
+    docs = PdfDocument.objects.order_by("random_key")
+    if mode in RANDOM_PDF_MODES:
+        pick = _random_pdf_document_from(docs.filter(RANDOM_PDF_MODES[mode]))
+        if pick is not None:
+            return pick
+    return _random_pdf_document_from(docs)
+
+
+def _random_pdf_document_from(docs) -> Optional[PdfDocument]:
+    return docs.filter(random_key__gte=random.random()).first() or docs.first()
+
+
 def random_pdf(request):
-    """Pick a random PDF and return rendered page metadata."""
+    """Pick a random PDF and return its page metadata (streamed with ?stream=1).
+
+    ?mode=unannotated|promising|unrendered narrows the pick.
+    """
     try:
         _sync_pdf_index_on_request()
+        pdf_doc = _random_pdf_document((request.GET.get("mode") or "").strip().lower())
     except (OperationalError, ProgrammingError):
-        pass
-    pdfs = list(PdfDocument.objects.all())
-    if not pdfs:
+        pdf_doc = None
+    if pdf_doc is None:
         pdf_paths = _list_pdfs_on_disk()
         if not pdf_paths:
             return JsonResponse({"error": "No PDFs found"}, status=404)
         pdf_path = random.choice(pdf_paths)
+        cache_key = None
     else:
-        pdf_doc = random.choice(pdfs)
         pdf_path = Path(pdf_doc.path)
-    try:
-        png_paths = _render_pdf_pages(pdf_path)
-    except Exception as exc:
-        return JsonResponse({"error": str(exc)}, status=500)
-
-    pages = []
-    for path in png_paths:
-        with Image.open(path) as img:
-            width, height = img.size
-        rel = os.path.relpath(path, settings.MEDIA_ROOT)
-        pages.append({
-            "url": f"{settings.MEDIA_URL}{rel}",
-            "width": width,
-            "height": height,
-        })
-
-    return JsonResponse({
-        "pages": pages,
-        "pdf": pdf_path.name,
-    })
+        cache_key = _pdf_cache_key(pdf_doc)
+    return _pdf_pages_response(request, pdf_path, cache_key)
+
+
+def _search_pdf_documents(query: str):
+    """Documents whose filename matches query, best first.
+
+    Candidates come from the trigram index on search_name: substring
+    matches, plus word-similarity matches that tolerate typos
+    ("efat0001" finds "EFTA0001.pdf"). Exact names rank first, then
+    prefixes, then other substrings, then the rest by similarity.
+    """
+    term = _search_name(query)
+    if not term:
+        return PdfDocument.objects.none()
+    return (
+        PdfDocument.objects.filter(
+            Q(search_name__contains=term) | Q(search_name__trigram_word_similar=term)
+        )
+        .annotate(
+            match_rank=Case(
+                When(search_name=term, then=Value(0)),
+                When(search_name__startswith=term, then=Value(1)),
+                When(search_name__contains=term, then=Value(2)),
+                default=Value(3),
+            ),
+            similarity=TrigramWordSimilarity(term, "search_name"),
+        )
+        .order_by("match_rank", "-similarity", "filename")
+    )
 
 
 def search_pdf(request):
-    """Return rendered page metadata for the first filename match."""
+    """Return page metadata for the best filename match (streamed with ?stream=1).
+
+    The response also lists the top-ranked filenames under "matches".
+    """
     query = (request.GET.get("q") or "").strip()
     if not query:
         return JsonResponse({"error": "Missing query"}, status=400)
 
     pdf_path = None
+    cache_key = None
+    matches = []
     try:
         _sync_pdf_index_on_request()
-        match = PdfDocument.objects.filter(filename__icontains=query).first()
-        if match:
-            pdf_path = Path(match.path)
+        candidates = list(_search_pdf_documents(query)[:SEARCH_MATCH_LIMIT])
+        if candidates:
+            pdf_path = Path(candidates[0].path)
+            cache_key = _pdf_cache_key(candidates[0])
+            matches = [doc.filename for doc in candidates]
     except (OperationalError, ProgrammingError):
         pdf_path = None
 
@@ -351,87 +476,448 @@ def search_pdf(request):
         if not matches:
             return JsonResponse({"error": "No match"}, status=404)
         pdf_path = matches[0]
+        matches = [path.name for path in matches[:SEARCH_MATCH_LIMIT]]
+    return _pdf_pages_response(request, pdf_path, cache_key, {"matches": matches})
+
+
+def search_text(request):
+    """Return documents whose page text matches the query, with highlighted snippets.
+
+    Paginated like browse-list/. Each result lists the matching page
+    numbers and their snippets, so the viewer can open the right page.
+    """
+    query = (request.GET.get("q") or "").strip()
+    if not query:
+        return JsonResponse({"error": "Missing query"}, status=400)
     try:
-        png_paths = _render_pdf_pages(pdf_path)
+        page_num = max(1, int(request.GET.get("page") or "1"))
+    except ValueError:
+        page_num = 1
+    results, total = _search_pdf_text(query, page_num)
+    for result in results:
+        result["slug"] = result["filename"].replace(".pdf", "")
+    has_more = page_num * TEXT_SEARCH_PAGE_SIZE < total
+    return JsonResponse(
+        {"results": results, "page": page_num, "has_more": has_more, "total": total}
+    )
+
+
+def search_annotations(request):
+    """Search annotation notes, text overlays and both kinds of discussion.
+
+    Paginated like search-text/; ?pdf=<filename> limits it to one
+    document. Each hit links to its annotation or comment thread, and to
+    the reply within it where there is one.
+    """
+    query = (request.GET.get("q") or "").strip()
+    if not query:
+        return JsonResponse({"error": "Missing query"}, status=400)
+    try:
+        page_num = max(1, int(request.GET.get("page") or "1"))
+    except ValueError:
+        page_num = 1
+    entries, total = _search_entries(query, page_num, (request.GET.get("pdf") or "").strip())
+    results = []
+    for entry in entries:
+        slug = entry.pdf_key.replace(".pdf", "")
+        url = f"/{slug}"
+        if entry.target_hash:
+            try:
+                url = reverse("index_pdf_comment", args=[slug, entry.target_hash])
+            except NoReverseMatch:
+                # The discussion route only takes slug-safe names; open the document instead.
+                pass
+            else:
+                if entry.reply_id:
+                    url = f"{url}?reply={entry.reply_id}"
+        results.append(
+            {
+                "kind": entry.kind,
+                "pdf": entry.pdf_key,
+                "slug": slug,
+                "url": url,
+                "user": entry.user.username if entry.user_id else "",
+                "snippet": entry.snippet,
+                "created_at": entry.created_at.isoformat(),
+            }
+        )
+    has_more = page_num * ANNOTATION_SEARCH_PAGE_SIZE < total
+    return JsonResponse(
+        {"results": results, "page": page_num, "has_more": has_more, "total": total}
+    )
+
+
+def _page_sendfile_mode() -> str:
+    """PDF_PAGE_SENDFILE=nginx|apache hands page bytes to the front server."""
+    mode = os.environ.get("PDF_PAGE_SENDFILE", "").strip().lower()
+    return mode if mode in {"nginx", "apache"} else ""
+
+
+def _parse_byte_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """Inclusive (start, end) of a single "bytes=" range.
+
+    Returns None when the header should be ignored (other units, several
+    ranges, malformed) and raises ValueError when it can't be satisfied.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, dash, end = spec.strip().partition("-")
+    if not dash or not (start or end) or not all(part.isdigit() for part in (start, end) if part):
+        return None
+    if not start:
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - suffix), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or last < first:
+        raise ValueError("Range not satisfiable")
+    return first, last
+
+
+def _page_body_response(request, page_path: Path, etag: str, stat) -> HttpResponse:
+    content_type = PAGE_CONTENT_TYPES[page_path.suffix]
+    mode = _page_sendfile_mode()
+    if mode == "nginx":
+        # nginx serves the file itself, including Range and its own validators.
+        response = HttpResponse(content_type=content_type)
+        relative = page_path.relative_to(settings.MEDIA_ROOT).as_posix()
+        response["X-Accel-Redirect"] = f"{PAGE_ACCEL_PREFIX.rstrip('/')}/{relative}"
+        return response
+    if mode == "apache":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(page_path)
+        return response
+
+    range_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range", "")
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(stat.st_mtime):
+        range_header = ""
+    try:
+        byte_range = _parse_byte_range(range_header, stat.st_size) if range_header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+    if byte_range is None:
+        response = FileResponse(open(page_path, "rb"), content_type=content_type)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    first, last = byte_range
+    with open(page_path, "rb") as handle:
+        handle.seek(first)
+        body = handle.read(last - first + 1)
+    response = HttpResponse(body, status=206, content_type=content_type)
+    response["Content-Range"] = f"bytes {first}-{last}/{stat.st_size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def _with_page_headers(response: HttpResponse, etag: str, immutable: bool, mtime=None) -> HttpResponse:
+    if response.status_code not in (200, 206, 304):
+        return response
+    response["ETag"] = etag
+    response["Cache-Control"] = PAGE_IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"
+    if mtime is not None:
+        response["Last-Modified"] = http_date(mtime)
+    return response
+
+
+def _render_busy_response(exc: RenderBusy) -> JsonResponse:
+    response = JsonResponse({"error": "Renderer busy, retry shortly"}, status=503)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+def _rendered_image_response(request, cache_key: str, etag: str, render, not_found: str):
+    """Serve a cached render with validators, rendering it only when needed.
+
+    The ETag is derived from the cache key, so a revalidation that matches
+    is answered with 304 before the file is even looked up on disk.
+    """
+    etag = quote_etag(f"{cache_key}-{etag}")
+    immutable = request.GET.get("v") == cache_key
+    if request.headers.get("If-None-Match"):
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return _with_page_headers(not_modified, etag, immutable)
+
+    try:
+        path = render()
+    except RenderBusy as exc:
+        return _render_busy_response(exc)
+    except ValueError:
+        return JsonResponse({"error": not_found}, status=404)
     except Exception as exc:
         return JsonResponse({"error": str(exc)}, status=500)
 
-    pages = []
-    for path in png_paths:
-        with Image.open(path) as img:
-            width, height = img.size
-        rel = os.path.relpath(path, settings.MEDIA_ROOT)
-        pages.append({
-            "url": f"{settings.MEDIA_URL}{rel}",
-            "width": width,
-            "height": height,
-        })
+    stat = path.stat()
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        # Scanned pages are the original JPEG even though the URL says .png.
+        response = _page_body_response(request, path, etag, stat)
+    return _with_page_headers(response, etag, immutable, stat.st_mtime)
 
-    return JsonResponse({
-        "pages": pages,
-        "pdf": pdf_path.name,
-    })
+
+def pdf_page(request, pdf_slug, page_num):
+    """Serve one rendered page, rendering it on first request."""
+    resolved = _resolve_pdf(f"{pdf_slug}.pdf")
+    if resolved is None:
+        return JsonResponse({"error": "Unknown pdf"}, status=404)
+    pdf_path, cache_key = resolved
+    return _rendered_image_response(
+        request,
+        cache_key,
+        str(page_num),
+        lambda: _render_pdf_page(pdf_path, page_num, cache_key=cache_key),
+        "Unknown page",
+    )
+
+
+def pdf_page_tile(request, pdf_slug, page_num, dpi, col, row):
+    """Serve one zoom tile of a page, rendering it on first request."""
+    resolved = _resolve_pdf(f"{pdf_slug}.pdf")
+    if resolved is None:
+        return JsonResponse({"error": "Unknown pdf"}, status=404)
+    pdf_path, cache_key = resolved
+    return _rendered_image_response(
+        request,
+        cache_key,
+        f"{page_num}-{dpi}-{col}-{row}",
+        lambda: _render_page_tile(pdf_path, page_num, dpi, col, row, cache_key=cache_key),
+        "Unknown tile",
+    )
+
+
+def pdf_thumbnail(request, pdf_slug):
+    """Serve a document's browse thumbnail out of its shard file."""
+    try:
+        doc = (
+            PdfDocument.objects.filter(filename=f"{pdf_slug}.pdf", thumb_length__isnull=False)
+            .values("thumb_shard", "thumb_offset", "thumb_length", "thumb_key")
+            .first()
+        )
+    except (OperationalError, ProgrammingError):
+        doc = None
+    if doc is None:
+        return JsonResponse({"error": "No thumbnail"}, status=404)
+    etag = quote_etag(f"thumb-{doc['thumb_key']}")
+    immutable = request.GET.get("v") == doc["thumb_key"]
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return _with_page_headers(not_modified, etag, immutable)
+    try:
+        data = _read_thumbnail(doc["thumb_shard"], doc["thumb_offset"], doc["thumb_length"])
+    except (OSError, ValueError):
+        return JsonResponse({"error": "No thumbnail"}, status=404)
+    return _with_page_headers(HttpResponse(data, content_type="image/jpeg"), etag, immutable)
+
+
+def render_cache_stats(request):
+    """Expose render cache counters and render queue state for monitoring.
+
+    Only for staff users, or scrapers sending PDF_CACHE_STATS_TOKEN as
+    "Authorization: Bearer <token>".
+    """
+    token = os.environ.get("PDF_CACHE_STATS_TOKEN", "").strip()
+    authorization = request.headers.get("Authorization", "")
+    if not request.user.is_staff and not (
+        token and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    ):
+        return JsonResponse({"error": "Staff only"}, status=403)
+    return JsonResponse({**_render_stats(), "admission": _render_admission_stats()})
 
 
 def search_suggestions(request):
-    """Return filename suggestions for the search box."""
+    """Return filename suggestions for the search box.
+
+    Answered from the memory-mapped index that index_pdfs builds. The
+    database is only queried when there is no index yet, or when the
+    index has no substring match and typo matches are worth a look.
+    """
     query = (request.GET.get("q") or "").strip()
+    term = _search_name(query)
+    index = _suggest_index()
+    if index is not None and (term or not query):
+        suggestions = index.lookup(term, SUGGESTION_LIMIT)
+        if suggestions:
+            return JsonResponse({"suggestions": suggestions})
     suggestions = []
     try:
         _sync_pdf_index_on_request()
-        qs = PdfDocument.objects.all()
-        if query:
-            qs = qs.filter(filename__icontains=query)
-        suggestions = list(qs.order_by("filename").values_list("filename", flat=True)[:12])
+        qs = _search_pdf_documents(query) if query else PdfDocument.objects.order_by("filename")
+        suggestions = list(qs.values_list("filename", flat=True)[:SUGGESTION_LIMIT])
     except (OperationalError, ProgrammingError):
         pdfs = _list_pdfs_on_disk()
         if query:
             pdfs = [p for p in pdfs if query.lower() in p.name.lower()]
-        suggestions = [p.name for p in sorted(pdfs, key=lambda p: p.name)[:12]]
+        suggestions = [p.name for p in sorted(pdfs, key=lambda p: p.name)[:SUGGESTION_LIMIT]]
     return JsonResponse({"suggestions": suggestions})
 
 
+def _encode_browse_cursor(sort: str, key, filename: str, doc_id: int) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    raw = json.dumps([sort, key, filename, doc_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_browse_cursor(cursor: str, sort: str) -> tuple:
+    """(key, filename, id) from a cursor made for this sort; ValueError if it isn't one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, key, filename, doc_id = json.loads(raw)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor") from None
+    if cursor_sort != sort or not isinstance(filename, str) or not isinstance(doc_id, int):
+        raise ValueError("Invalid cursor")
+    field = BROWSE_SORTS[sort][0]
+    if field is None or key is None:
+        # Only the NULL group of a nullable key has no key.
+        if field is not None and not PdfDocument._meta.get_field(field).null:
+            raise ValueError("Invalid cursor")
+        return None, filename, doc_id
+    try:
+        key = PdfDocument._meta.get_field(field).to_python(key)
+    except (TypeError, ValueError, ValidationError):
+        raise ValueError("Invalid cursor") from None
+    return key, filename, doc_id
+
+
+def _browse_segments(qs, sort: str, cursor: Optional[tuple]) -> list:
+    """Querysets that, read in order, continue the listing after cursor.
+
+    Each is one index range scan on the pdfdoc_<sort>_idx index: the rest
+    of the cursor's sort-key group, then the following keys, then (for
+    nullable keys) the NULL group. Row comparisons are avoided because the
+    sort key and filename may run in opposite directions.
+    """
+    field, descending = BROWSE_SORTS[sort]
+    if field is None:
+        ordering = ["filename", "id"]
+    elif descending:
+        # Only nullable keys say NULLS LAST, so the rest match their plain DESC index.
+        nulls_last = True if PdfDocument._meta.get_field(field).null else None
+        ordering = [F(field).desc(nulls_last=nulls_last), "filename", "id"]
+    else:
+        ordering = [F(field).asc(), "filename", "id"]
+    if cursor is None:
+        return [qs.order_by(*ordering)]
+    key, filename, doc_id = cursor
+    after = Q(filename__gt=filename) | Q(filename=filename, id__gt=doc_id)
+    if field is None:
+        return [qs.filter(after, filename__gte=filename).order_by(*ordering)]
+    if key is None:
+        return [qs.filter(after, filename__gte=filename, **{f"{field}__isnull": True}).order_by("filename", "id")]
+    segments = [
+        qs.filter(after, filename__gte=filename, **{field: key}).order_by("filename", "id"),
+        qs.filter(**{f"{field}__{'lt' if descending else 'gt'}": key}).order_by(*ordering),
+    ]
+    if PdfDocument._meta.get_field(field).null:
+        segments.append(qs.filter(**{f"{field}__isnull": True}).order_by("filename", "id"))
+    return segments
+
+
+def _browse_total(qs) -> tuple[int, bool]:
+    """(count, approximate) for a browse listing.
+
+    Large listings use the planner's row estimate instead of counting;
+    anything estimated under BROWSE_EXACT_COUNT_LIMIT is counted exactly.
+    """
+    try:
+        plan = json.loads(qs.explain(format="json"))
+        # psycopg 3 returns the plan object, psycopg 2 a list holding it.
+        if isinstance(plan, list):
+            plan = plan[0]
+        estimate = int(plan["Plan"]["Plan Rows"])
+    except (KeyError, IndexError, TypeError, ValueError):
+        estimate = 0
+    if estimate >= BROWSE_EXACT_COUNT_LIMIT:
+        return estimate, True
+    return qs.count(), False
+
+
 def browse_list(request):
-    """Return paginated PDF filenames for browsing."""
-    page = request.GET.get("page") or "1"
+    """Return PDF filenames for browsing, one cursor page at a time.
+
+    Pass the previous response's next_cursor as ?cursor= to continue; every
+    page costs the same index seek however deep it is. The total is only
+    computed when asked for with ?count=1.
+    """
     sort = (request.GET.get("sort") or "name").lower()
+    if sort not in BROWSE_SORTS:
+        sort = "name"
     query = (request.GET.get("q") or "").strip()
-    try:
-        page_num = max(1, int(page))
-    except ValueError:
-        page_num = 1
-    page_size = 50
     qs = PdfDocument.objects.all()
     if query:
-        qs = qs.filter(filename__icontains=query)
-    if sort == "promising":
-        qs = qs.order_by("-vote_score", "filename")
-    elif sort == "least":
-        qs = qs.order_by("vote_score", "filename")
-    elif sort == "ann_most":
-        qs = qs.order_by("-annotation_count", "filename")
-    elif sort == "ann_least":
-        qs = qs.order_by("annotation_count", "filename")
-    else:
-        qs = qs.order_by("filename")
-
-    total = qs.count()
-    start = (page_num - 1) * page_size
-    end = start + page_size
-    docs = list(qs.values("filename", "vote_score", "annotation_count")[start:end])
+        # Substring match on the trigram-indexed column, not ILIKE over filename.
+        qs = qs.filter(search_name__contains=_search_name(query))
+    text = (request.GET.get("text") or "").strip().lower()
+    if text in {"1", "true", "yes"}:
+        qs = qs.filter(has_text=True)
+    elif text in {"0", "false", "no"}:
+        qs = qs.filter(has_text=False)
+    for param, lookup in (("min_pages", "page_count__gte"), ("max_pages", "page_count__lte")):
+        try:
+            qs = qs.filter(**{lookup: int(request.GET[param])})
+        except (KeyError, ValueError):
+            pass
+    cursor = None
+    if request.GET.get("cursor"):
+        try:
+            cursor = _decode_browse_cursor(request.GET["cursor"], sort)
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    field = BROWSE_SORTS[sort][0]
+    columns = [
+        "id",
+        "filename",
+        "vote_score",
+        "annotation_count",
+        "thumb_length",
+        "thumb_key",
+        "page_count",
+        "file_size",
+    ]
+    if field and field not in columns:
+        columns.append(field)
+    docs = []
+    for segment in _browse_segments(qs, sort, cursor):
+        docs.extend(segment.values(*columns)[: BROWSE_PAGE_SIZE + 1 - len(docs)])
+        if len(docs) > BROWSE_PAGE_SIZE:
+            break
+    has_more = len(docs) > BROWSE_PAGE_SIZE
+    docs = docs[:BROWSE_PAGE_SIZE]
     items = [
         {
             "filename": doc["filename"],
             "slug": doc["filename"].replace(".pdf", ""),
             "upvotes": doc["vote_score"] or 0,
             "annotations": doc["annotation_count"] or 0,
+            "pages": doc["page_count"],
+            "bytes": doc["file_size"],
+            "thumb": (
+                f"{reverse('pdf_thumbnail', args=[doc['filename'].replace('.pdf', '')])}?v={doc['thumb_key']}"
+                if doc["thumb_length"]
+                else None
+            ),
         }
         for doc in docs
     ]
-    has_more = end < total
-    return JsonResponse(
-        {"items": items, "page": page_num, "has_more": has_more, "total": total}
-    )
+    next_cursor = None
+    if has_more:
+        last = docs[-1]
+        next_cursor = _encode_browse_cursor(
+            sort, last[field] if field else None, last["filename"], last["id"]
+        )
+    payload = {"items": items, "has_more": has_more, "next_cursor": next_cursor}
+    if request.GET.get("count") == "1":
+        payload["total"], payload["total_approximate"] = _browse_total(qs)
+    return JsonResponse(payload)
 
 
 @csrf_exempt
@@ -448,8 +934,7 @@ def pdf_votes(request):
         pdf_doc = PdfDocument.objects.filter(filename=pdf_name).first()
         if pdf_doc is None:
             return JsonResponse({"error": "Unknown pdf"}, status=404)
-        upvotes = PdfVote.objects.filter(pdf=pdf_doc, value=1).count()
-        downvotes = PdfVote.objects.filter(pdf=pdf_doc, value=-1).count()
+        upvotes, downvotes = pdf_doc.upvotes, pdf_doc.downvotes
         user_vote = 0
         if request.user.is_authenticated:
             try:
@@ -477,25 +962,10 @@ def pdf_votes(request):
     pdf_doc = PdfDocument.objects.filter(filename=pdf_name).first()
     if pdf_doc is None:
         return JsonResponse({"error": "Unknown pdf"}, status=404)
-    vote, created = PdfVote.objects.get_or_create(
-        pdf=pdf_doc,
-        user=request.user,
-        defaults={"value": value},
-    )
-    if not created:
-        if vote.value == value:
-            vote.delete()
-        else:
-            vote.value = value
-            vote.save(update_fields=["value"])
-    upvotes = PdfVote.objects.filter(pdf=pdf_doc, value=1).count()
-    downvotes = PdfVote.objects.filter(pdf=pdf_doc, value=-1).count()
-    PdfDocument.objects.filter(id=pdf_doc.id).update(vote_score=upvotes - downvotes)
-    user_vote = 0
-    try:
-        user_vote = PdfVote.objects.get(pdf=pdf_doc, user=request.user).value
-    except PdfVote.DoesNotExist:
-        user_vote = 0
+    result = _toggle_vote(PdfVote, pdf_doc, request.user, value)
+    if result is None:
+        return JsonResponse({"error": "Unknown pdf"}, status=404)
+    upvotes, downvotes, user_vote = result
     return JsonResponse({"upvotes": upvotes, "downvotes": downvotes, "user_vote": user_vote})
 
 
@@ -553,17 +1023,9 @@ def username_check(request):
 
 def _annotation_to_dict(annotation: Annotation, request=None) -> dict:
     """Serialize Annotation and child items for the frontend."""
-    votes = list(annotation.votes.all())
-    upvotes = sum(1 for v in votes if v.value == 1)
-    downvotes = sum(1 for v in votes if v.value == -1)
-    user_vote = 0
     is_owner = False
     if request is not None and request.user.is_authenticated:
         is_owner = request.user.id == annotation.user_id
-        for vote in votes:
-            if vote.user_id == request.user.id:
-                user_vote = vote.value
-                break
     return {
         "id": annotation.client_id,
         "server_id": annotation.id,
@@ -573,9 +1035,9 @@ def _annotation_to_dict(annotation: Annotation, request=None) -> dict:
         "y": annotation.y,
         "note": annotation.note or "",
         "is_owner": is_owner,
-        "upvotes": upvotes,
-        "downvotes": downvotes,
-        "user_vote": user_vote,
+        "upvotes": annotation.upvotes,
+        "downvotes": annotation.downvotes,
+        "user_vote": _own_vote(annotation, request),
         "hash": str(annotation.hash) if annotation.hash else "",
         "created_at": annotation.created_at.isoformat() if annotation.created_at else None,
         "textItems": [
@@ -602,6 +1064,43 @@ def _annotation_to_dict(annotation: Annotation, request=None) -> dict:
 
 
 @csrf_exempt
+def _text_item_fields(item: dict) -> dict:
+    return {
+        "x": float(item.get("x", 0)),
+        "y": float(item.get("y", 0)),
+        "text": item.get("text", "") or "",
+        "font_family": item.get("fontFamily", "") or "",
+        "font_size": item.get("fontSize", "") or "",
+        "font_weight": item.get("fontWeight", "") or "",
+        "font_style": item.get("fontStyle", "") or "",
+        "font_kerning": item.get("fontKerning", "") or "",
+        "font_feature_settings": item.get("fontFeatureSettings", "") or "",
+        "color": item.get("color", "") or "",
+        "opacity": float(item.get("opacity", 1) or 1),
+    }
+
+
+def _sync_text_items(annotation: Annotation, items: list) -> None:
+    """Make an annotation's text overlays match the saved payload, in order.
+
+    Existing rows are updated in place, and only in the fields that changed,
+    so an unchanged overlay costs no write and keeps its SearchEntry; see
+    signals._text_item_saved.
+    """
+    existing = list(TextItem.objects.filter(annotation=annotation).order_by("id"))
+    for text_item, item in zip(existing, items):
+        fields = _text_item_fields(item)
+        changed = [name for name, value in fields.items() if getattr(text_item, name) != value]
+        if changed:
+            for name in changed:
+                setattr(text_item, name, fields[name])
+            text_item.save(update_fields=changed)
+    for item in items[len(existing):]:
+        TextItem.objects.create(annotation=annotation, **_text_item_fields(item))
+    if len(existing) > len(items):
+        TextItem.objects.filter(id__in=[text_item.id for text_item in existing[len(items):]]).delete()
+
+
 def annotations_api(request):
     """List or persist annotations for a PDF (auth required for writes)."""
     if request.method == "GET":
@@ -612,7 +1111,7 @@ def annotations_api(request):
         annotations = (
             Annotation.objects.filter(pdf_key=pdf_key)
             .select_related("user")
-            .prefetch_related("text_items", "arrow_items", "votes")
+            .prefetch_related("text_items", "arrow_items", _own_vote_prefetch(AnnotationVote, request))
         )
         payload = [_annotation_to_dict(a, request=request) for a in annotations]
         pdf_comments = []
@@ -621,7 +1120,7 @@ def annotations_api(request):
                 _pdf_comment_to_dict(c, request=request)
                 for c in PdfComment.objects.filter(pdf=pdf_doc)
                 .select_related("user")
-                .prefetch_related("votes")
+                .prefetch_related(_own_vote_prefetch(PdfCommentVote, request))
                 .order_by("created_at")
             ]
         return JsonResponse({"annotations": payload, "pdf_comments": pdf_comments})
@@ -679,24 +1178,8 @@ def annotations_api(request):
                 "server_id": annotation_obj.id,
                 "hash": str(annotation_obj.hash) if annotation_obj.hash else "",
             })
-            TextItem.objects.filter(annotation=annotation_obj).delete()
+            _sync_text_items(annotation_obj, ann.get("textItems", []))
             ArrowItem.objects.filter(annotation=annotation_obj).delete()
-
-            for item in ann.get("textItems", []):
-                TextItem.objects.create(
-                    annotation=annotation_obj,
-                    x=float(item.get("x", 0)),
-                    y=float(item.get("y", 0)),
-                    text=item.get("text", "") or "",
-                    font_family=item.get("fontFamily", "") or "",
-                    font_size=item.get("fontSize", "") or "",
-                    font_weight=item.get("fontWeight", "") or "",
-                    font_style=item.get("fontStyle", "") or "",
-                    font_kerning=item.get("fontKerning", "") or "",
-                    font_feature_settings=item.get("fontFeatureSettings", "") or "",
-                    color=item.get("color", "") or "",
-                    opacity=float(item.get("opacity", 1) or 1),
-                )
             for arrow in ann.get("arrows", []):
                 ArrowItem.objects.create(
                     annotation=annotation_obj,
@@ -742,38 +1225,14 @@ def annotation_votes(request):
     if annotation.user_id == request.user.id:
         return JsonResponse({"error": "Cannot vote own annotation"}, status=403)
 
-    vote, created = AnnotationVote.objects.get_or_create(
-        annotation=annotation,
-        user=request.user,
-        defaults={"value": value},
-    )
-    if not created:
-        if vote.value == value:
-            vote.delete()
-        else:
-            vote.value = value
-            vote.save(update_fields=["value"])
-
-    upvotes = AnnotationVote.objects.filter(annotation=annotation, value=1).count()
-    downvotes = AnnotationVote.objects.filter(annotation=annotation, value=-1).count()
-    user_vote = 0
-    try:
-        user_vote = AnnotationVote.objects.get(annotation=annotation, user=request.user).value
-    except AnnotationVote.DoesNotExist:
-        user_vote = 0
+    result = _toggle_vote(AnnotationVote, annotation, request.user, value)
+    if result is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    upvotes, downvotes, user_vote = result
     return JsonResponse({"upvotes": upvotes, "downvotes": downvotes, "user_vote": user_vote})
 
 
 def _comment_to_dict(comment, request=None):
-    votes = list(comment.votes.all())
-    upvotes = sum(1 for v in votes if v.value == 1)
-    downvotes = sum(1 for v in votes if v.value == -1)
-    user_vote = 0
-    if request is not None and request.user.is_authenticated:
-        for vote in votes:
-            if vote.user_id == request.user.id:
-                user_vote = vote.value
-                break
     return {
         "id": comment.id,
         "annotation_id": comment.annotation_id,
@@ -781,22 +1240,13 @@ def _comment_to_dict(comment, request=None):
         "user": comment.user.username,
         "body": comment.body,
         "created_at": comment.created_at.isoformat() if comment.created_at else None,
-        "upvotes": upvotes,
-        "downvotes": downvotes,
-        "user_vote": user_vote,
+        "upvotes": comment.upvotes,
+        "downvotes": comment.downvotes,
+        "user_vote": _own_vote(comment, request),
     }
 
 
 def _pdf_comment_to_dict(comment, request=None):
-    votes = list(comment.votes.all())
-    upvotes = sum(1 for v in votes if v.value == 1)
-    downvotes = sum(1 for v in votes if v.value == -1)
-    user_vote = 0
-    if request is not None and request.user.is_authenticated:
-        for vote in votes:
-            if vote.user_id == request.user.id:
-                user_vote = vote.value
-                break
     return {
         "id": comment.id,
         "hash": str(comment.hash) if comment.hash else "",
@@ -804,22 +1254,13 @@ def _pdf_comment_to_dict(comment, request=None):
         "user": comment.user.username,
         "body": comment.body,
         "created_at": comment.created_at.isoformat() if comment.created_at else None,
-        "upvotes": upvotes,
-        "downvotes": downvotes,
-        "user_vote": user_vote,
+        "upvotes": comment.upvotes,
+        "downvotes": comment.downvotes,
+        "user_vote": _own_vote(comment, request),
     }
 
 
 def _pdf_reply_to_dict(reply, request=None):
-    votes = list(reply.votes.all())
-    upvotes = sum(1 for v in votes if v.value == 1)
-    downvotes = sum(1 for v in votes if v.value == -1)
-    user_vote = 0
-    if request is not None and request.user.is_authenticated:
-        for vote in votes:
-            if vote.user_id == request.user.id:
-                user_vote = vote.value
-                break
     return {
         "id": reply.id,
         "comment_id": reply.comment_id,
@@ -827,9 +1268,9 @@ def _pdf_reply_to_dict(reply, request=None):
         "user": reply.user.username,
         "body": reply.body,
         "created_at": reply.created_at.isoformat() if reply.created_at else None,
-        "upvotes": upvotes,
-        "downvotes": downvotes,
-        "user_vote": user_vote,
+        "upvotes": reply.upvotes,
+        "downvotes": reply.downvotes,
+        "user_vote": _own_vote(reply, request),
     }
 
 
@@ -846,7 +1287,9 @@ def pdf_comments(request):
         body = (payload.get("body") or "").strip()
         if not pdf_key or not body:
             return JsonResponse({"error": "Missing fields"}, status=400)
-        pdf_doc, _ = PdfDocument.objects.get_or_create(filename=pdf_key, defaults={"path": pdf_key})
+        pdf_doc, _ = PdfDocument.objects.get_or_create(
+            filename=pdf_key, defaults={"path": pdf_key, "search_name": _search_name(pdf_key)}
+        )
         comment = PdfComment.objects.create(pdf=pdf_doc, user=request.user, body=body)
         return JsonResponse({"comment": _pdf_comment_to_dict(comment, request=request)})
 
@@ -874,25 +1317,10 @@ def pdf_comment_votes(request):
     if comment.user_id == request.user.id:
         return JsonResponse({"error": "Cannot vote own comment"}, status=403)
 
-    vote, created = PdfCommentVote.objects.get_or_create(
-        comment=comment,
-        user=request.user,
-        defaults={"value": value},
-    )
-    if not created:
-        if vote.value == value:
-            vote.delete()
-        else:
-            vote.value = value
-            vote.save(update_fields=["value"])
-
-    upvotes = PdfCommentVote.objects.filter(comment=comment, value=1).count()
-    downvotes = PdfCommentVote.objects.filter(comment=comment, value=-1).count()
-    user_vote = 0
-    try:
-        user_vote = PdfCommentVote.objects.get(comment=comment, user=request.user).value
-    except PdfCommentVote.DoesNotExist:
-        user_vote = 0
+    result = _toggle_vote(PdfCommentVote, comment, request.user, value)
+    if result is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    upvotes, downvotes, user_vote = result
     return JsonResponse({"upvotes": upvotes, "downvotes": downvotes, "user_vote": user_vote})
 
 
@@ -905,7 +1333,7 @@ def pdf_comment_replies(request):
         replies = (
             PdfCommentReply.objects.filter(comment_id=comment_id)
             .select_related("user")
-            .prefetch_related("votes")
+            .prefetch_related(_own_vote_prefetch(PdfCommentReplyVote, request))
             .order_by("created_at")
         )
         payload = [_pdf_reply_to_dict(r, request=request) for r in replies]
@@ -989,25 +1417,10 @@ def pdf_reply_votes(request):
     if reply.user_id == request.user.id:
         return JsonResponse({"error": "Cannot vote own reply"}, status=403)
 
-    vote, created = PdfCommentReplyVote.objects.get_or_create(
-        reply=reply,
-        user=request.user,
-        defaults={"value": value},
-    )
-    if not created:
-        if vote.value == value:
-            vote.delete()
-        else:
-            vote.value = value
-            vote.save(update_fields=["value"])
-
-    upvotes = PdfCommentReplyVote.objects.filter(reply=reply, value=1).count()
-    downvotes = PdfCommentReplyVote.objects.filter(reply=reply, value=-1).count()
-    user_vote = 0
-    try:
-        user_vote = PdfCommentReplyVote.objects.get(reply=reply, user=request.user).value
-    except PdfCommentReplyVote.DoesNotExist:
-        user_vote = 0
+    result = _toggle_vote(PdfCommentReplyVote, reply, request.user, value)
+    if result is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    upvotes, downvotes, user_vote = result
     return JsonResponse({"upvotes": upvotes, "downvotes": downvotes, "user_vote": user_vote})
 
 
@@ -1097,7 +1510,7 @@ def annotation_comments(request):
         comments = (
             AnnotationComment.objects.filter(annotation_id=annotation_id)
             .select_related("user")
-            .prefetch_related("votes")
+            .prefetch_related(_own_vote_prefetch(CommentVote, request))
             .order_by("created_at")
         )
         payload = [_comment_to_dict(c, request=request) for c in comments]
@@ -1181,23 +1594,8 @@ def comment_votes(request):
     if comment.user_id == request.user.id:
         return JsonResponse({"error": "Cannot vote own comment"}, status=403)
 
-    vote, created = CommentVote.objects.get_or_create(
-        comment=comment,
-        user=request.user,
-        defaults={"value": value},
-    )
-    if not created:
-        if vote.value == value:
-            vote.delete()
-        else:
-            vote.value = value
-            vote.save(update_fields=["value"])
-
-    upvotes = CommentVote.objects.filter(comment=comment, value=1).count()
-    downvotes = CommentVote.objects.filter(comment=comment, value=-1).count()
-    user_vote = 0
-    try:
-        user_vote = CommentVote.objects.get(comment=comment, user=request.user).value
-    except CommentVote.DoesNotExist:
-        user_vote = 0
+    result = _toggle_vote(CommentVote, comment, request.user, value)
+    if result is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    upvotes, downvotes, user_vote = result
     return JsonResponse({"upvotes": upvotes, "downvotes": downvotes, "user_vote": user_vote})
@@ -0,0 +1,132 @@
+"""Vote toggling with tallies kept on the voted-on rows."""
+from typing import Optional
+
+from django.db import IntegrityError, connection
+from django.db.models import F, Prefetch
+
+from .models import (
+    AnnotationVote,
+    CommentVote,
+    PdfCommentReplyVote,
+    PdfCommentVote,
+    PdfVote,
+)
+
+# Vote model -> foreign key to the row carrying its upvotes/downvotes.
+VOTE_TARGETS = {
+    AnnotationVote: "annotation",
+    CommentVote: "comment",
+    PdfVote: "pdf",
+    PdfCommentVote: "comment",
+    PdfCommentReplyVote: "reply",
+}
+VOTE_TALLY_FIELDS = {1: "upvotes", -1: "downvotes"}
+
+
+def _keeps_vote_score(target_model) -> bool:
+    """Whether target_model also keeps the net score (PdfDocument, for the browse sorts)."""
+    return any(field.name == "vote_score" for field in target_model._meta.fields)
+
+
+def _bump_vote_tally(vote_model, target_id: int, old: int, new: int) -> dict:
+    """Move one vote from old to new (0 = none) in the target's tallies.
+
+    Returns the F() changes applied, keyed by field.
+    """
+    target_model = vote_model._meta.get_field(VOTE_TARGETS[vote_model]).related_model
+    deltas = {}
+    if old:
+        deltas[VOTE_TALLY_FIELDS[old]] = -1
+    if new:
+        deltas[VOTE_TALLY_FIELDS[new]] = deltas.get(VOTE_TALLY_FIELDS[new], 0) + 1
+    if _keeps_vote_score(target_model):
+        deltas["vote_score"] = new - old
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        target_model.objects.filter(id=target_id).update(**changes)
+    return changes
+
+
+# One statement per click. removed retracts a repeated vote; otherwise
+# upserted inserts the vote or switches its side (xmax = 0 only for fresh
+# rows). Both lock the vote row, so clicks from one user serialize.
+# change holds the (old, new) move for the target's tallies. If a
+# concurrent click already left the vote at this value, nothing changes
+# and the stored tallies are returned as they are.
+_TOGGLE_VOTE_SQL = """
+WITH removed AS (
+    DELETE FROM {vote}
+    WHERE {target_column} = %(target)s AND user_id = %(user)s AND value = %(value)s
+    RETURNING value
+), upserted AS (
+    INSERT INTO {vote} AS vote ({target_column}, user_id, value)
+    SELECT %(target)s, %(user)s, %(value)s WHERE NOT EXISTS (SELECT 1 FROM removed)
+    ON CONFLICT ({target_column}, user_id) DO UPDATE SET value = EXCLUDED.value
+    WHERE vote.value <> EXCLUDED.value
+    RETURNING (vote.xmax = 0) AS inserted, vote.value
+), change AS (
+    SELECT value AS old, 0 AS new FROM removed
+    UNION ALL
+    SELECT CASE WHEN inserted THEN 0 ELSE -value END, value FROM upserted
+), tallied AS (
+    UPDATE {target} AS target
+    SET upvotes = target.upvotes + (change.new = 1)::int - (change.old = 1)::int,
+        downvotes = target.downvotes + (change.new = -1)::int - (change.old = -1)::int{score}
+    FROM change WHERE target.id = %(target)s
+    RETURNING target.upvotes, target.downvotes, change.new
+)
+SELECT upvotes, downvotes, new FROM tallied
+UNION ALL
+SELECT upvotes, downvotes, %(value)s FROM {target}
+WHERE id = %(target)s AND NOT EXISTS (SELECT 1 FROM change)
+"""
+_toggle_vote_sql = {}
+
+
+def _toggle_vote(vote_model, target, user, value: int) -> Optional[tuple]:
+    """Record a vote click: a new vote, a switch of sides, or a retracted repeat.
+
+    The vote row and the target's tallies change in a single statement.
+    Returns (upvotes, downvotes, user_vote) as they stand afterwards, or
+    None when the target no longer exists.
+    """
+    sql = _toggle_vote_sql.get(vote_model)
+    if sql is None:
+        field = vote_model._meta.get_field(VOTE_TARGETS[vote_model])
+        target_model = field.related_model
+        score = ""
+        if _keeps_vote_score(target_model):
+            score = ",\n        vote_score = target.vote_score + change.new - change.old"
+        sql = _toggle_vote_sql[vote_model] = _TOGGLE_VOTE_SQL.format(
+            vote=connection.ops.quote_name(vote_model._meta.db_table),
+            target=connection.ops.quote_name(target_model._meta.db_table),
+            target_column=connection.ops.quote_name(field.column),
+            score=score,
+        )
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {"target": target.id, "user": user.id, "value": value})
+            return cursor.fetchone()
+    except IntegrityError:
+        # A new vote for a target deleted since the caller looked it up.
+        return None
+
+
+def _own_vote_prefetch(vote_model, request) -> Prefetch:
+    """Prefetch "votes" limited to the requesting user's own vote."""
+    votes = vote_model.objects.all()
+    if request.user.is_authenticated:
+        votes = votes.filter(user_id=request.user.id)
+    else:
+        votes = votes.none()
+    return Prefetch("votes", queryset=votes)
+
+
+def _own_vote(target, request) -> int:
+    """The requesting user's vote on target, from its (prefetched) votes."""
+    if request is None or not request.user.is_authenticated:
+        return 0
+    for vote in target.votes.all():
+        if vote.user_id == request.user.id:
+            return vote.value
+    return 0